@@ -0,0 +1,13 @@
+"""
+Benchmarks and local stand-ins for the bot's external services.
+
+Run modules from the repository root, e.g. `python -m benchmarks.stand_in_backend`.
+"""
+
+import os
+import sys
+
+# the bot's modules import each other relative to src/, as when running src/app.py
+_SRC = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+if _SRC not in sys.path:
+    sys.path.insert(0, _SRC)
@@ -0,0 +1,106 @@
+"""
+Agent event payloads shaped like the ones the OpenDevin fork sends over /ws.
+
+The mix follows a typical PlannerAgent task: mostly RUN actions/observations with
+large command output, some file writes and reads, browsing with screenshots, a few
+thoughts, messages and agent state changes.
+
+The events are synthetic, not recorded from a real agent; benchmarks/corpora/events.jsonl.gz
+is generated from them with `python -m benchmarks.micro --record`.
+"""
+
+import json
+import random
+from typing import Any, Dict, List
+
+from devin.action_type import ActionType
+from devin.agent_state import AgentState
+from devin.observation_type import ObservationType
+
+
+def _state(event_id: int, state: str) -> Dict[str, Any]:
+    return {
+        "id": event_id,
+        "observation": ObservationType.AGENT_STATE_CHANGED.value,
+        "content": "",
+        "extras": {"agent_state": state},
+        "message": "",
+    }
+
+
+def build_events(count: int = 500, seed: int = 7) -> List[Dict[str, Any]]:
+    rng = random.Random(seed)
+    events: List[Dict[str, Any]] = [_state(0, AgentState.RUNNING.value)]
+    for event_id in range(1, count):
+        kind = rng.choices(
+            ["run", "run_output", "write", "read", "browse", "thought", "message", "state"],
+            weights=[25, 25, 10, 10, 5, 15, 5, 5],
+        )[0]
+        lines = rng.randint(5, 400)
+        if kind == "run":
+            events.append({
+                "id": event_id,
+                "action": ActionType.RUN.value,
+                "args": {"command": "pytest -q tests/", "background": False, "thought": "Running the tests to see what fails."},
+                "message": "Running command: pytest -q tests/",
+            })
+        elif kind == "run_output":
+            events.append({
+                "id": event_id,
+                "observation": ObservationType.RUN.value,
+                "content": "\n".join(f"tests/test_{i}.py::test_case PASSED \"ok\" [{i}%]" for i in range(lines)),
+                "extras": {"command_id": event_id, "command": "pytest -q tests/", "exit_code": 0},
+                "message": "Command `pytest -q tests/` executed with exit code 0.",
+            })
+        elif kind == "write":
+            events.append({
+                "id": event_id,
+                "observation": ObservationType.WRITE.value,
+                "content": "",
+                "extras": {"path": "/workspace/app.py"},
+                "message": "I wrote to the file /workspace/app.py.",
+            })
+        elif kind == "read":
+            events.append({
+                "id": event_id,
+                "observation": ObservationType.READ.value,
+                "content": "\n".join(f"def function_{i}(x):\n    return x * {i}" for i in range(lines)),
+                "extras": {"path": "/workspace/app.py"},
+                "message": "I read the file /workspace/app.py.",
+            })
+        elif kind == "browse":
+            events.append({
+                "id": event_id,
+                "observation": ObservationType.BROWSE.value,
+                "content": "<html><body>" + "<p>docs</p>" * lines + "</body></html>",
+                "url": "https://docs.python.org/3/",
+                "screenshot": "iVBORw0KGgo" + "A" * 40000,
+                "status_code": 200,
+                "error": False,
+                "extras": {},
+                "message": "Visited https://docs.python.org/3/",
+            })
+        elif kind == "thought":
+            events.append({
+                "id": event_id,
+                "action": ActionType.ADD_TASK.value,
+                "args": {"parent": "0", "goal": "Fix the failing test", "subtasks": [], "thought": "The failure is in the parser, I'll fix it first."},
+                "message": "Added task: Fix the failing test",
+            })
+        elif kind == "message":
+            events.append({
+                "id": event_id,
+                "action": ActionType.MESSAGE.value,
+                "args": {"content": "Should I also update the docs?", "wait_for_response": rng.random() < 0.5},
+                "message": "Should I also update the docs?",
+            })
+        else:
+            events.append(_state(event_id, rng.choice([AgentState.RUNNING.value, AgentState.AWAITING_USER_INPUT.value])))
+    events.append({"id": count, "action": ActionType.FINISH.value, "args": {"outputs": {}}, "message": "All tests pass."})
+    events.append(_state(count + 1, AgentState.FINISHED.value))
+    return events
+
+
+def build_frames(count: int = 500, seed: int = 7) -> List[str]:
+    """The events serialised the way they arrive on the websocket."""
+    return [json.dumps(event) for event in build_events(count, seed)]
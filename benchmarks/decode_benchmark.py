@@ -0,0 +1,74 @@
+"""
+Per-event CPU time and allocations of socket frame decoding.
+
+Compares a plain `json.loads` + buildSocketMessageFromDict decode (what every frame
+used to cost) with buildSocketMessage, which leaves large observation content in the
+frame and drops screenshots.
+
+    python -m benchmarks.decode_benchmark
+"""
+
+import argparse
+import json
+import time
+import tracemalloc
+from typing import Callable, Dict, List
+
+from benchmarks.corpus import build_frames
+from devin.response_type import buildSocketMessage, buildSocketMessageFromDict
+
+
+def full_decode(frame: str):
+    return buildSocketMessageFromDict(json.loads(frame))
+
+
+def measure(decode: Callable[[str], object], frames: List[str], rounds: int) -> Dict[str, float]:
+    for frame in frames:
+        decode(frame)
+
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for frame in frames:
+            decode(frame)
+    elapsed = time.perf_counter() - start
+
+    # bytes allocated per event: the peak while decoding, and what the decoded message keeps
+    # alive (a lazily decoded message holds on to its frame, which is not counted here)
+    tracemalloc.start()
+    peak = retained = 0
+    for frame in frames:
+        tracemalloc.reset_peak()
+        baseline = tracemalloc.get_traced_memory()[0]
+        message = decode(frame)
+        current, highest = tracemalloc.get_traced_memory()
+        peak += highest - baseline
+        retained += current - baseline
+        del message
+    tracemalloc.stop()
+
+    events = rounds * len(frames)
+    return {
+        "us_per_event": elapsed / events * 1e6,
+        "events_per_sec": events / elapsed,
+        "peak_bytes": peak / len(frames),
+        "retained_bytes": retained / len(frames),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--events", type=int, default=500)
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+
+    frames = build_frames(args.events)
+    average_size = sum(len(frame) for frame in frames) / len(frames)
+    print(f"{len(frames)} frames, {average_size:.0f} bytes on average")
+    print(f"{'decoder':<22}{'us/event':>12}{'events/s':>14}{'peak B/event':>14}{'kept B/event':>14}")
+    for name, decode in (("json.loads + dict", full_decode), ("buildSocketMessage", buildSocketMessage)):
+        result = measure(decode, frames, args.rounds)
+        print(f"{name:<22}{result['us_per_event']:>12.2f}{result['events_per_sec']:>14.0f}{result['peak_bytes']:>14.0f}{result['retained_bytes']:>14.0f}")
+
+
+if __name__ == "__main__":
+    main()
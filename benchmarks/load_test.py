@@ -0,0 +1,284 @@
+"""
+Load test for DevinConversationHandler against the stand-in backend.
+
+Starts benchmarks.stand_in_backend in a subprocess replaying a synthetic event stream,
+then drives N users x M conversations through the bot's handler code. Proactive sends
+go to a fake Bot Connector that records when each agent event first shows up on a
+card. Reports event-to-card latency percentiles, events per second, peak threads and
+peak RSS of the bot process.
+
+    python -m benchmarks.load_test --users 20 --conversations 2 --events 200 --rate 50
+    python -m benchmarks.load_test --users 10 --tasks 3 --init-delay 1 --warm
+"""
+
+import argparse
+import asyncio
+import contextlib
+import itertools
+import json
+import os
+import re
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from typing import Dict, List, Optional, Set, Tuple
+
+import aiohttp
+from botbuilder.core import BotAdapter, TurnContext
+from botbuilder.schema import (
+    Activity,
+    ActivityTypes,
+    ChannelAccount,
+    ConversationAccount,
+    ConversationReference,
+    ResourceResponse,
+)
+
+from devin.backend_pool import DevinBackendPool
+from devin.devin_api import DevinAPI, DevinAPIOptions
+from devin.agent_scheduler import AgentScheduler, AgentSchedulerOptions
+from devin.tracing import Tracer, TracerOptions
+from devin.warm_pool import WarmAgentPool, WarmPoolOptions
+from devin.devin_conversation_handler import DevinConversationHandler
+from devin.socket_manager import DevinSocketManager
+
+_MARKER = re.compile(r"⟨ev (\d+) ([\d.]+)⟩")
+
+
+class FakeConnector(BotAdapter):
+    """
+    Stands in for the Bot Connector. Every activity sent or updated is scanned for
+    event markers; the first time a marker appears in a conversation is its card time.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.__ids = itertools.count(1)
+        self.latencies: List[float] = []
+        self.sends = 0
+        self.updates = 0
+        self.finished: Dict[str, asyncio.Event] = {}
+        self.__seen: Dict[str, Set[str]] = {}
+
+    async def send_activities(self, context: TurnContext, activities: List[Activity]) -> List[ResourceResponse]:
+        responses = []
+        for activity in activities:
+            self.sends += 1
+            self.__record(context, activity)
+            responses.append(ResourceResponse(id=str(next(self.__ids))))
+        return responses
+
+    async def update_activity(self, context: TurnContext, activity: Activity):
+        self.updates += 1
+        self.__record(context, activity)
+        return ResourceResponse(id=activity.id)
+
+    async def delete_activity(self, context: TurnContext, reference: ConversationReference):
+        pass
+
+    def __record(self, context: TurnContext, activity: Activity):
+        now = time.time()
+        conversation_id = context.activity.conversation.id
+        seen = self.__seen.setdefault(conversation_id, set())
+        payload = json.dumps([attachment.content for attachment in activity.attachments or []], ensure_ascii=False)
+        for event_id, sent_at in _MARKER.findall(payload):
+            if event_id not in seen:
+                seen.add(event_id)
+                self.latencies.append(now - float(sent_at))
+        if "CheckboxChecked" in payload and conversation_id in self.finished:
+            self.finished[conversation_id].set()
+
+
+def build_context(adapter: FakeConnector, user: int, conversation: int, text: str) -> TurnContext:
+    return TurnContext(adapter, Activity(
+        type=ActivityTypes.message,
+        id=f"{user}-{conversation}",
+        text=text,
+        channel_id="msteams",
+        service_url="https://smba.example.invalid/",
+        from_property=ChannelAccount(id=f"user-{user}", aad_object_id=f"aad-{user}"),
+        recipient=ChannelAccount(id="bot"),
+        conversation=ConversationAccount(id=f"conversation-{user}-{conversation}"),
+    ))
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def current_rss_bytes() -> int:
+    with open("/proc/self/statm") as statm:
+        return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+
+async def wait_for_backend(base_url: str, timeout: float = 15):
+    deadline = time.monotonic() + timeout
+    async with aiohttp.ClientSession() as session:
+        while True:
+            try:
+                async with session.get(f"{base_url}/api/auth", params={"uid": "probe"}):
+                    return
+            except aiohttp.ClientConnectionError:
+                if time.monotonic() > deadline:
+                    raise
+                await asyncio.sleep(0.1)
+
+
+async def run(args) -> Dict[str, float]:
+    adapter = FakeConnector()
+    base_url = f"http://localhost:{args.port}"
+    DevinBackendPool.configure([base_url])
+    DevinAPI.configure(DevinAPIOptions(limit_per_host=args.users * 2))
+    max_running = args.max_running_agents or args.users * args.conversations
+    AgentScheduler.configure(AgentSchedulerOptions(max_running=max_running, max_running_per_backend=max_running))
+    Tracer.configure(TracerOptions(directory=args.trace_dir))
+    WarmAgentPool.configure(WarmPoolOptions(enabled=args.warm, max_warm=args.users))
+    await wait_for_backend(base_url)
+
+    received = 0
+
+    async def count_event(_socket, _event):
+        nonlocal received
+        received += 1
+
+    peak_threads = threading.active_count()
+    peak_rss = current_rss_bytes()
+    sampling = True
+
+    async def sample():
+        nonlocal peak_threads, peak_rss
+        while sampling:
+            peak_threads = max(peak_threads, threading.active_count())
+            peak_rss = max(peak_rss, current_rss_bytes())
+            await asyncio.sleep(0.05)
+
+    sampler = asyncio.create_task(sample())
+    handlers: List[DevinConversationHandler] = []
+
+    async def start_conversation(user: int, conversation: int):
+        context = build_context(adapter, user, conversation, f"task {user}-{conversation}")
+        reference = TurnContext.get_conversation_reference(context.activity)
+        adapter.finished[reference.conversation.id] = asyncio.Event()
+        handler = DevinConversationHandler(context, reference, None, "bot", progress_debounce=args.progress_debounce)
+        handlers.append(handler)
+        await handler.initialize()
+        # only the first conversation of a user starts the agent, the others follow it
+        if conversation != 0:
+            return
+        finished = adapter.finished[reference.conversation.id]
+        for task in range(args.tasks):
+            if task > 0:
+                await finished.wait()
+                await asyncio.sleep(args.think_time)
+                finished.clear()
+            await handler.handle_message(context, f"task {user}-{conversation}-{task}")
+
+    sockets = []
+    for user in range(args.users):
+        socket = DevinSocketManager.instance().acquire(f"aad-{user}")
+        socket.register_callback("receive", count_event)
+        sockets.append(socket)
+
+    started = time.monotonic()
+    conversations = asyncio.gather(*(
+        start_conversation(user, conversation)
+        for user in range(args.users)
+        for conversation in range(args.conversations)
+    ))
+    try:
+        await asyncio.wait_for(conversations, timeout=args.timeout)
+        await asyncio.wait_for(
+            asyncio.gather(*(event.wait() for event in adapter.finished.values())),
+            timeout=max(0, args.timeout - (time.monotonic() - started)),
+        )
+        timed_out = 0
+    except asyncio.TimeoutError:
+        timed_out = sum(1 for event in adapter.finished.values() if not event.is_set())
+    elapsed = time.monotonic() - started
+
+    sampling = False
+    await sampler
+    for handler in handlers:
+        await handler.close()
+    for user in range(args.users):
+        await DevinSocketManager.instance().release(f"aad-{user}")
+    await DevinSocketManager.instance().close()
+    await DevinAPI.close()
+
+    latencies = adapter.latencies
+    warm = WarmAgentPool.instance().stats()
+    return {
+        "conversations": len(handlers),
+        "timed_out": timed_out,
+        "seconds": elapsed,
+        "events": received,
+        "events_per_sec": received / elapsed,
+        "cards_sent": adapter.sends,
+        "cards_updated": adapter.updates,
+        "latency_p50_ms": percentile(latencies, 0.5) * 1000,
+        "latency_p95_ms": percentile(latencies, 0.95) * 1000,
+        "latency_p99_ms": percentile(latencies, 0.99) * 1000,
+        "latency_max_ms": max(latencies, default=float("nan")) * 1000,
+        "warm_hit_pct": warm["hit_rate"] * 100,
+        "first_card_cold_ms": warm["first_card_cold_seconds"] * 1000,
+        "first_card_warm_ms": warm["first_card_warm_seconds"] * 1000,
+        "peak_threads": peak_threads,
+        "peak_rss_mb": peak_rss / 2 ** 20,
+        "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--conversations", type=int, default=1, help="conversations per user, sharing the user's agent")
+    parser.add_argument("--events", type=int, default=200, help="events replayed per task")
+    parser.add_argument("--rate", type=float, default=50, help="events per second per user")
+    parser.add_argument("--tasks", type=int, default=1, help="tasks per user, one after the other")
+    parser.add_argument("--think-time", type=float, default=0.5, help="seconds between a task finishing and the next one")
+    parser.add_argument("--init-delay", type=float, default=0, help="seconds the stand-in agent takes to initialise")
+    parser.add_argument("--warm", action="store_true", help="keep agents initialised between tasks")
+    parser.add_argument("--port", type=int, default=3101)
+    parser.add_argument("--progress-debounce", type=float, default=3.0)
+    parser.add_argument("--max-running-agents", type=int, default=0, help="agent slots; tasks beyond that queue (default: one per task)")
+    parser.add_argument("--trace-dir", type=os.path.abspath, default=None, help="write task traces here (default: off)")
+    parser.add_argument("--timeout", type=float, default=300)
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    parser.add_argument("--verbose", action="store_true", help="keep the bot's own logging")
+    args = parser.parse_args(argv)
+
+    repo_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    backend = subprocess.Popen(
+        [sys.executable, "-m", "benchmarks.stand_in_backend", "--port", str(args.port),
+         "--replay", str(args.events), "--rate", str(args.rate), "--mark",
+         "--init-delay", str(args.init_delay)],
+        cwd=repo_root,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        with tempfile.TemporaryDirectory() as workdir, open(os.devnull, "w") as devnull:
+            # the token store is created in the working directory
+            os.chdir(workdir)
+            quiet = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(devnull)
+            with quiet:
+                report = asyncio.run(run(args))
+    finally:
+        backend.terminate()
+        backend.wait()
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+    for key, value in report.items():
+        print(f"{key:<16}{value:>12.1f}" if isinstance(value, float) else f"{key:<16}{value:>12}")
+
+
+if __name__ == "__main__":
+    main()
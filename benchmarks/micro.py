@@ -0,0 +1,301 @@
+"""
+Micro-benchmarks for the per-event hot path, with stored baselines and regression gates.
+
+Each benchmark runs over a corpus of agent events (benchmarks/corpora) and reports
+operations per second (best of several repeats) and bytes allocated per operation (mean
+traced peak). The committed corpus is synthetic, generated by benchmarks.corpus with
+--record; --record-from replaces it with the history of a live backend. Results are
+compared with benchmarks/baselines/micro.json; --check exits non-zero when speed drops
+or allocations grow past the thresholds.
+
+    python -m benchmarks.micro                      # run and compare
+    python -m benchmarks.micro --check              # fail on regressions
+    python -m benchmarks.micro --save-baseline      # accept the current numbers
+    python -m benchmarks.micro --record             # regenerate the synthetic corpus
+    python -m benchmarks.micro --record-from http://localhost:3001 --token <jwt>
+
+Speed is gated relative to a fixed calibration loop timed alternately with each
+benchmark, so a baseline saved on one machine also holds on a faster or slower one.
+Allocations depend on the Python version; save a new baseline after upgrading it.
+"""
+
+import argparse
+import asyncio
+import gzip
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import jwt
+
+from benchmarks.corpus import build_events
+from devin.commands import clear_messages, initialize_agent, send_message, start_message, stop_task
+from devin.devin_auth import SqlitePersistentTokenStorage, TokenStorage
+from devin.devin_conversation_handler import build_adaptive_card, build_progress_card, card_for_message
+from devin.response_type import buildSocketMessage
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+CORPUS = os.path.join(HERE, "corpora", "events.jsonl.gz")
+BASELINE = os.path.join(HERE, "baselines", "micro.json")
+
+
+class Benchmark:
+    def __init__(self, name: str, items: List[Any], op: Callable[[Any], Any], is_async: bool = False):
+        self.name = name
+        self.items = items
+        self.op = op
+        self.is_async = is_async
+
+
+def load_corpus(path: str = CORPUS) -> List[str]:
+    """Frames, one JSON event per line, as they arrive on the websocket."""
+    with gzip.open(path, "rt", encoding="utf-8") as file:
+        return [line.rstrip("\n") for line in file if line.strip()]
+
+
+def save_corpus(frames: List[str], path: str = CORPUS):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # mtime=0 keeps the file byte-identical across recordings of the same events
+    with open(path, "wb") as raw, gzip.GzipFile(fileobj=raw, mode="wb", compresslevel=9, mtime=0) as file:
+        file.write("".join(frame + "\n" for frame in frames).encode("utf-8"))
+
+
+async def record_from(base_url: str, token: str) -> List[str]:
+    from devin.backend_pool import DevinBackendPool
+    from devin.devin_api import DevinAPI
+    DevinBackendPool.configure([base_url])
+    frames: List[str] = []
+    try:
+        async with DevinAPI.stream_messages(token, after=None) as stream:
+            async for message in stream:
+                payload = message.get("payload")
+                if payload:
+                    frames.append(json.dumps(payload))
+    finally:
+        await DevinAPI.close()
+    return frames
+
+
+def build_benchmarks(frames: List[str], workdir: str) -> List[Benchmark]:
+    messages = [buildSocketMessage(frame) for frame in frames]
+    cards = [card for card in (card_for_message(message) for message in messages) if card is not None]
+    progress = [cards[max(0, i - 20):i + 1] for i in range(len(cards))]
+    tasks = [card[0] for card in cards if card[1] == "Lightbulb"] or ["Fix the failing tests"]
+    builders: List[Callable[[], Any]] = [
+        initialize_agent, clear_messages, stop_task,
+        *(lambda text=text: start_message(text) for text in tasks[:10]),
+        *(lambda text=text: send_message(text) for text in tasks[:10]),
+    ]
+
+    # token paths: warm is the in-memory cache, cold misses it and reads the persisted store
+    token = jwt.encode({"sid": "benchmark", "exp": int(time.time()) + 24 * 3600}, "benchmark-signing-key-not-verified-by-the-bot", algorithm="HS256")
+    persisted = SqlitePersistentTokenStorage(os.path.join(workdir, "tokens.db"))
+    users = [f"user-{i}" for i in range(50)]
+    for user in users:
+        persisted.save_token(user, token)
+    tokens = TokenStorage(persisted)
+
+    async def warm_token(user):
+        return await tokens.get_token(user)
+
+    async def cold_token(user):
+        tokens.invalidate(user)
+        return await tokens.get_token(user)
+
+    return [
+        Benchmark("decode_frame", frames, buildSocketMessage),
+        Benchmark("dispatch_card", messages, card_for_message),
+        Benchmark("build_adaptive_card", cards, lambda card: build_adaptive_card(card[0], card[1])),
+        Benchmark("build_progress_card", progress, lambda entries: build_progress_card(entries, 0)),
+        Benchmark("serialise_command", builders, lambda build: json.dumps(build())),
+        Benchmark("get_token_warm", users, warm_token, is_async=True),
+        Benchmark("get_token_cold", users, cold_token, is_async=True),
+    ]
+
+
+async def _time_async(op: Callable[[Any], Awaitable[Any]], items: List[Any], rounds: int) -> float:
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for item in items:
+            await op(item)
+    return time.perf_counter() - start
+
+
+def _time_sync(op: Callable[[Any], Any], items: List[Any], rounds: int) -> float:
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for item in items:
+            op(item)
+    return time.perf_counter() - start
+
+
+async def _allocations_async(op: Callable[[Any], Awaitable[Any]], items: List[Any]) -> float:
+    total = 0
+    for item in items:
+        tracemalloc.reset_peak()
+        baseline = tracemalloc.get_traced_memory()[0]
+        result = await op(item)
+        total += tracemalloc.get_traced_memory()[1] - baseline
+        del result
+    return total / len(items)
+
+
+def _allocations_sync(op: Callable[[Any], Any], items: List[Any]) -> float:
+    total = 0
+    for item in items:
+        tracemalloc.reset_peak()
+        baseline = tracemalloc.get_traced_memory()[0]
+        result = op(item)
+        total += tracemalloc.get_traced_memory()[1] - baseline
+        del result
+    return total / len(items)
+
+
+def calibration() -> Benchmark:
+    """Plain interpreter work that no change to the bot affects, to tell machine speed apart."""
+    documents = [{"id": i, "text": f"event {i}", "tags": ["a", "b"], "extras": {"n": i * 3}} for i in range(50)]
+    return Benchmark("calibration", documents, lambda document: json.loads(json.dumps(document)))
+
+
+def _timer(benchmark: Benchmark, min_time: float) -> Callable[[], float]:
+    """A function that runs about `min_time` seconds of `benchmark` and returns its ops/sec."""
+    items = benchmark.items
+
+    def timed(rounds: int) -> float:
+        if benchmark.is_async:
+            return asyncio.run(_time_async(benchmark.op, items, rounds))
+        return _time_sync(benchmark.op, items, rounds)
+
+    rounds = 1
+    while True:
+        elapsed = timed(rounds)
+        if elapsed >= min_time / 4 or rounds >= 1 << 16:
+            break
+        rounds *= 2
+    rounds = max(1, int(rounds * min_time / max(elapsed, 1e-9)))
+    return lambda: rounds * len(items) / timed(rounds)
+
+
+def measure(benchmark: Benchmark, reference: Benchmark, min_time: float, repeats: int) -> Dict[str, float]:
+    items = benchmark.items
+    run, run_reference = _timer(benchmark, min_time), _timer(reference, min_time)
+    speeds: List[float] = []
+    relative: List[float] = []
+    for _ in range(repeats):
+        # back to back, so both see the same clock speed and the same neighbours
+        reference_speed = run_reference()
+        speed = run()
+        speeds.append(speed)
+        relative.append(speed / reference_speed)
+
+    tracemalloc.start()
+    try:
+        if benchmark.is_async:
+            allocated = asyncio.run(_allocations_async(benchmark.op, items))
+        else:
+            allocated = _allocations_sync(benchmark.op, items)
+    finally:
+        tracemalloc.stop()
+    return {
+        "ops_per_sec": max(speeds),
+        # ops per calibration op; what --check compares
+        "relative_speed": statistics.median(relative),
+        "alloc_bytes_per_op": allocated,
+    }
+
+
+def compare(results: Dict[str, Dict[str, float]], baseline: Dict[str, Dict[str, float]],
+            max_slowdown: float, max_alloc_growth: float, alloc_slack: float) -> List[str]:
+    failures = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        # baselines saved before calibration only have machine-specific ops/sec
+        if "relative_speed" in base and result["relative_speed"] < base["relative_speed"] * (1 - max_slowdown):
+            failures.append(f"{name}: relative speed {result['relative_speed']:.4g} is more than {max_slowdown:.0%} below the baseline {base['relative_speed']:.4g}")
+        if result["alloc_bytes_per_op"] > base["alloc_bytes_per_op"] * (1 + max_alloc_growth) + alloc_slack:
+            failures.append(f"{name}: {result['alloc_bytes_per_op']:.0f} B/op is more than {max_alloc_growth:.0%} above the baseline {base['alloc_bytes_per_op']:.0f}")
+    return failures
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--only", action="append", default=[], help="run only this benchmark, may repeat")
+    parser.add_argument("--min-time", type=float, default=0.2, help="seconds per timed repeat")
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--baseline", default=BASELINE)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--check", action="store_true", help="exit 1 on a regression past the thresholds")
+    parser.add_argument("--max-slowdown", type=float, default=0.2, help="allowed drop in speed relative to the calibration loop")
+    parser.add_argument("--max-alloc-growth", type=float, default=0.1, help="allowed growth in bytes per op")
+    parser.add_argument("--alloc-slack", type=float, default=64, help="bytes per op always allowed on top")
+    parser.add_argument("--record", type=int, metavar="EVENTS", nargs="?", const=200,
+                        help="write a synthetic corpus of this many events and exit")
+    parser.add_argument("--record-from", metavar="BASE_URL", help="record the history of a live backend and exit")
+    parser.add_argument("--token", help="token for --record-from")
+    parser.add_argument("--json", action="store_true", help="print the results as JSON")
+    args = parser.parse_args(argv)
+
+    if args.record is not None or args.record_from:
+        if args.record_from:
+            if not args.token:
+                parser.error("--record-from needs --token")
+            frames = asyncio.run(record_from(args.record_from, args.token))
+        else:
+            frames = [json.dumps(event) for event in build_events(args.record)]
+        save_corpus(frames)
+        print(f"Recorded {len(frames)} events to {os.path.relpath(CORPUS)}")
+        return 0
+
+    frames = load_corpus()
+    with tempfile.TemporaryDirectory() as workdir:
+        benchmarks = build_benchmarks(frames, workdir)
+        if args.only:
+            benchmarks = [benchmark for benchmark in benchmarks if benchmark.name in args.only]
+        reference = calibration()
+        results = {benchmark.name: measure(benchmark, reference, args.min_time, args.repeats) for benchmark in benchmarks}
+
+    baseline: Dict[str, Dict[str, float]] = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding="utf-8") as file:
+            baseline = json.load(file)["results"]
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print(f"{len(frames)} events in the corpus")
+        print(f"{'benchmark':<22}{'ops/s':>14}{'relative':>10}{'base rel':>10}{'B/op':>10}{'base B/op':>11}")
+        for name, result in results.items():
+            base = baseline.get(name)
+            base_relative = f"{base['relative_speed']:.4g}" if base and "relative_speed" in base else "-"
+            base_alloc = f"{base['alloc_bytes_per_op']:.0f}" if base else "-"
+            print(f"{name:<22}{result['ops_per_sec']:>14.0f}{result['relative_speed']:>10.4g}{base_relative:>10}"
+                  f"{result['alloc_bytes_per_op']:>10.0f}{base_alloc:>11}")
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, "w", encoding="utf-8") as file:
+            json.dump({
+                "python": platform.python_version(),
+                "machine": platform.machine(),
+                "results": {**baseline, **results},
+            }, file, indent=2, sort_keys=True)
+            file.write("\n")
+        print(f"Saved baseline to {os.path.relpath(args.baseline)}")
+        return 0
+
+    failures = compare(results, baseline, args.max_slowdown, args.max_alloc_growth, args.alloc_slack)
+    for failure in failures:
+        print(f"REGRESSION {failure}", file=sys.stderr)
+    return 1 if failures and args.check else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
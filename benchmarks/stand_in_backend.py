@@ -0,0 +1,219 @@
+"""
+Local stand-in for the OpenDevin backend fork used by the bot.
+
+Serves /api/auth, /api/messages and /ws with the same shapes as the fork, so the bot
+can be run and measured offline. The "agent" is scripted: `start` produces a short
+burst of thoughts and observations followed by FINISH, or, with --replay, replays a
+synthetic event stream from benchmarks.corpus at --rate events per second.
+
+With --mark, text the bot turns into cards carries a `⟨ev id sent_at⟩` marker so the
+load test can measure event-to-card latency.
+
+    python -m benchmarks.stand_in_backend --port 3001
+    python -m benchmarks.stand_in_backend --port 3001 --replay 200 --rate 50 --mark
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import time
+import uuid
+from typing import Any, Dict, List, Optional
+
+import jwt
+from aiohttp import web
+
+from benchmarks.corpus import build_events
+from devin.action_type import ActionType
+from devin.agent_state import AgentState
+from devin.devin_api import MESSAGES_AFTER_HEADER
+from devin.observation_type import ObservationType
+
+_SECRET = "stand-in-backend-secret-key-0123456789"
+
+
+class Session:
+    def __init__(self, sid: str):
+        self.sid = sid
+        self.history: List[Dict[str, Any]] = []
+        self.sockets: List[web.WebSocketResponse] = []
+        self.agent_state = AgentState.LOADING.value
+        self.task: "asyncio.Task[None] | None" = None
+
+
+class StandInBackend:
+    def __init__(self,
+                 honour_cursor: bool = True,
+                 steps: int = 3,
+                 step_delay: float = 0.05,
+                 replay: Optional[List[Dict[str, Any]]] = None,
+                 rate: float = 50,
+                 mark: bool = False,
+                 init_delay: float = 0):
+        self.honour_cursor = honour_cursor
+        self.steps = steps
+        self.step_delay = step_delay
+        self.replay = None
+        if replay is not None:
+            # state changes of the replayed stream are driven by the task instead
+            self.replay = [event for event in replay if event.get("observation") != ObservationType.AGENT_STATE_CHANGED.value]
+        self.rate = rate
+        self.mark = mark
+        # time the agent spends LOADING after initialize_agent, like loading the LLM and agent
+        self.init_delay = init_delay
+        self.sessions: Dict[str, Session] = {}
+        self.auth_calls = 0
+        self.__ids = itertools.count(1)
+
+    def session_for(self, request: web.Request) -> Session:
+        token = request.query.get("token") or request.headers.get("Authorization", "").removeprefix("Bearer ")
+        try:
+            sid = jwt.decode(token, _SECRET, algorithms=["HS256"])["sid"]
+        except jwt.PyJWTError as e:
+            raise web.HTTPUnauthorized() from e
+        return self.sessions.setdefault(sid, Session(sid))
+
+    async def emit(self, session: Session, event: Dict[str, Any]):
+        event = {**event, "id": next(self.__ids)}
+        if self.mark:
+            event = self.__marked(event)
+        session.history.append({"id": event["id"], "role": "assistant", "payload": event})
+        data = json.dumps(event)
+        # the fork broadcasts every event to all attached clients
+        for ws in list(session.sockets):
+            if not ws.closed:
+                await ws.send_str(data)
+
+    async def set_state(self, session: Session, state: str):
+        session.agent_state = state
+        await self.emit(session, {
+            "observation": ObservationType.AGENT_STATE_CHANGED.value,
+            "content": "",
+            "extras": {"agent_state": state},
+            "message": "",
+        })
+
+    async def run_task(self, session: Session, task: str):
+        await self.set_state(session, AgentState.RUNNING.value)
+        for step in range(self.steps):
+            await asyncio.sleep(self.step_delay)
+            await self.emit(session, {
+                "action": ActionType.RUN.value,
+                "args": {"command": "ls", "thought": f"Step {step} of {task}"},
+                "message": f"Running command: ls",
+            })
+            await self.emit(session, {
+                "observation": ObservationType.RUN.value,
+                "content": "file.txt\n" * 200,
+                "extras": {"command_id": step, "command": "ls", "exit_code": 0},
+                "message": "Command `ls` executed with exit code 0.",
+            })
+        await self.emit(session, {"action": ActionType.FINISH.value, "args": {}, "message": f"Finished {task}"})
+        await self.set_state(session, AgentState.FINISHED.value)
+
+    async def replay_task(self, session: Session):
+        assert self.replay is not None
+        await self.set_state(session, AgentState.RUNNING.value)
+        interval = 1 / self.rate if self.rate > 0 else 0
+        next_at = time.monotonic()
+        for event in self.replay:
+            next_at += interval
+            await asyncio.sleep(max(0, next_at - time.monotonic()))
+            await self.emit(session, event)
+        await self.set_state(session, AgentState.FINISHED.value)
+
+    def __marked(self, event: Dict[str, Any]) -> Dict[str, Any]:
+        marker = f" ⟨ev {event['id']} {time.time():.6f}⟩"
+        if "action" in event:
+            args = dict(event.get("args") or {})
+            for key in ("thought", "content"):
+                if args.get(key):
+                    args[key] += marker
+            event["args"] = args
+        if event.get("message"):
+            event["message"] += marker
+        return event
+
+    async def handle_command(self, session: Session, command: Dict[str, Any]):
+        action = command.get("action")
+        args = command.get("args") or {}
+        if action == ActionType.INIT.value:
+            if self.init_delay > 0:
+                await self.set_state(session, AgentState.LOADING.value)
+                await asyncio.sleep(self.init_delay)
+            await self.set_state(session, AgentState.INIT.value)
+        elif action == ActionType.CLEAR_MESSAGES.value:
+            session.history.clear()
+        elif action == ActionType.START.value:
+            if self.replay is not None:
+                session.task = asyncio.create_task(self.replay_task(session))
+            else:
+                session.task = asyncio.create_task(self.run_task(session, args.get("task", "")))
+        elif action == ActionType.CHANGE_AGENT_STATE.value:
+            if session.task is not None:
+                session.task.cancel()
+            await self.set_state(session, args.get("agent_state", AgentState.STOPPED.value))
+
+    async def on_auth(self, request: web.Request) -> web.Response:
+        self.auth_calls += 1
+        sid = str(uuid.uuid5(uuid.NAMESPACE_OID, request.query.get("uid", str(uuid.uuid4()))))
+        return web.json_response({"token": jwt.encode({"sid": sid}, _SECRET, algorithm="HS256")})
+
+    async def on_messages(self, request: web.Request) -> web.Response:
+        session = self.session_for(request)
+        messages = session.history
+        headers = {}
+        after = request.query.get("after")
+        if after is not None and self.honour_cursor:
+            messages = [message for message in messages if message["id"] > int(after)]
+            headers[MESSAGES_AFTER_HEADER] = after
+        return web.json_response({"messages": messages}, headers=headers)
+
+    async def on_ws(self, request: web.Request) -> web.WebSocketResponse:
+        session = self.session_for(request)
+        ws = web.WebSocketResponse(heartbeat=20)
+        await ws.prepare(request)
+        session.sockets.append(ws)
+        try:
+            async for msg in ws:
+                if msg.type == web.WSMsgType.TEXT:
+                    await self.handle_command(session, json.loads(msg.data))
+        finally:
+            session.sockets.remove(ws)
+        return ws
+
+    def create_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get("/api/auth", self.on_auth)
+        app.router.add_get("/api/messages", self.on_messages)
+        app.router.add_get("/ws", self.on_ws)
+        return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=3001)
+    parser.add_argument("--steps", type=int, default=3, help="thought/observation pairs per task")
+    parser.add_argument("--step-delay", type=float, default=0.05)
+    parser.add_argument("--ignore-cursor", action="store_true", help="ignore `after` like the upstream fork")
+    parser.add_argument("--replay", type=int, default=None, metavar="EVENTS", help="replay a synthetic stream of this many events per task")
+    parser.add_argument("--rate", type=float, default=50, help="replayed events per second per user")
+    parser.add_argument("--mark", action="store_true", help="tag card text with event id and send time")
+    parser.add_argument("--init-delay", type=float, default=0, help="seconds the agent spends loading after initialize_agent")
+    args = parser.parse_args()
+    backend = StandInBackend(
+        honour_cursor=not args.ignore_cursor,
+        steps=args.steps,
+        step_delay=args.step_delay,
+        replay=build_events(args.replay) if args.replay is not None else None,
+        rate=args.rate,
+        mark=args.mark,
+        init_delay=args.init_delay,
+    )
+    web.run_app(backend.create_app(), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
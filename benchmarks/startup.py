@@ -0,0 +1,153 @@
+"""
+Startup time of the bot: import time by package and time to the first 200 on /api/messages.
+
+Import times come from `python -X importtime`, summed per top-level package, for the
+modules loaded before the port is bound (api) and for the bot stack loaded after it
+(bot). Time to first 200 starts src/app.py on a free port and posts a typing activity,
+with auth disabled and replies going to a local stand-in Bot Connector, until it is
+accepted (any 2xx). --eager loads the bot before binding, as the bot did before startup was
+deferred, for comparison.
+
+    python -m benchmarks.startup
+    python -m benchmarks.startup --runs 5 --eager
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+import aiohttp
+from aiohttp import web
+
+SRC = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+# loads the bot stack first, then runs app.py as usual
+EAGER = "import bot, runpy; runpy.run_path('app.py', run_name='__main__')"
+
+
+def bot_environment(port: int) -> Dict[str, str]:
+    return {
+        **os.environ,
+        "PORT": str(port),
+        # empty credentials turn off Bot Framework auth
+        "BOT_ID": "",
+        "BOT_PASSWORD": "",
+        "CONVERSATION_STATE_BACKEND": "memory",
+        "TRACE_DIR": "",
+        "OUTBOX_DIR": "",
+    }
+
+
+def import_times(module: str) -> Tuple[float, Counter]:
+    """Seconds to import `module` in a fresh interpreter, and self time per top-level package."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=SRC, env=bot_environment(0), capture_output=True, text=True, check=True,
+    )
+    total = 0.0
+    by_package: Counter = Counter()
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = (part.strip() for part in line[len("import time:"):].split("|"))
+        by_package[name.split(".")[0]] += int(self_us) / 1e6
+        if name == module:
+            total = int(cumulative_us) / 1e6
+    return total, by_package
+
+
+def typing_activity(service_url: str) -> Dict[str, object]:
+    return {
+        "type": "typing",
+        "id": "startup",
+        "channelId": "msteams",
+        "serviceUrl": service_url,
+        "from": {"id": "startup-user"},
+        "recipient": {"id": "bot"},
+        "conversation": {"id": "startup-conversation"},
+    }
+
+
+async def on_activity(req: web.Request) -> web.Response:
+    return web.json_response({"id": "1"})
+
+
+async def time_to_first_200(port: int, service_url: str, eager: bool, timeout: float) -> Dict[str, Optional[float]]:
+    command = [sys.executable, "-c", EAGER] if eager else [sys.executable, "app.py"]
+    with tempfile.TemporaryDirectory() as workdir:
+        env = {**bot_environment(port), "PYTHONPATH": SRC, "ARTIFACT_DIR": os.path.join(workdir, "artifacts")}
+        started = time.perf_counter()
+        process = subprocess.Popen(command, cwd=SRC, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        bound: Optional[float] = None
+        first_200: Optional[float] = None
+        try:
+            async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=timeout)) as session:
+                while time.perf_counter() - started < timeout and process.poll() is None:
+                    try:
+                        if bound is None:
+                            async with session.get(f"http://localhost:{port}/metrics"):
+                                bound = time.perf_counter() - started
+                        async with session.post(f"http://localhost:{port}/api/messages", json=typing_activity(service_url)) as response:
+                            # the adapter acknowledges some activities with 201
+                            if 200 <= response.status < 300:
+                                first_200 = time.perf_counter() - started
+                                break
+                    except aiohttp.ClientConnectionError:
+                        await asyncio.sleep(0.005)
+        finally:
+            process.terminate()
+            process.wait()
+    return {"bound": bound, "first_200": first_200}
+
+
+async def measure_runs(runs: int, port: int, eager: bool, timeout: float) -> List[Dict[str, Optional[float]]]:
+    connector = web.Application()
+    connector.router.add_post("/v3/conversations/{conversation}/activities/{activity}", on_activity)
+    connector.router.add_post("/v3/conversations/{conversation}/activities", on_activity)
+    runner = web.AppRunner(connector)
+    await runner.setup()
+    site = web.TCPSite(runner, "localhost", port + 1)
+    await site.start()
+    try:
+        return [await time_to_first_200(port, f"http://localhost:{port + 1}/", eager, timeout) for _ in range(runs)]
+    finally:
+        await runner.cleanup()
+
+
+def median(results: List[Dict[str, Optional[float]]], key: str) -> Optional[float]:
+    values = [result[key] for result in results if result[key] is not None]
+    return statistics.median(values) if values else None
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--port", type=int, default=3990, help="the bot listens here, the stand-in connector on the next port")
+    parser.add_argument("--top", type=int, default=8, help="packages listed per module")
+    parser.add_argument("--timeout", type=float, default=30)
+    parser.add_argument("--eager", action="store_true", help="also measure loading the bot before binding")
+    args = parser.parse_args(argv)
+
+    for module in ("api", "bot"):
+        total, by_package = import_times(module)
+        print(f"import {module:<10}{total * 1000:>10.1f} ms")
+        for package, seconds in by_package.most_common(args.top):
+            print(f"  {package:<24}{seconds * 1000:>10.1f} ms")
+
+    modes = [("deferred", False)] + ([("eager", True)] if args.eager else [])
+    for name, eager in modes:
+        results = asyncio.run(measure_runs(args.runs, args.port, eager, args.timeout))
+        bound, first_200 = median(results, "bound"), median(results, "first_200")
+        print(f"{name} start, median of {args.runs}")
+        print(f"  {'port_bound_ms':<24}{bound * 1000 if bound is not None else float('nan'):>10.1f}")
+        print(f"  {'first_200_ms':<24}{first_200 * 1000 if first_200 is not None else float('nan'):>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
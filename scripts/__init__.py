@@ -3,6 +3,7 @@ Copyright (c) Microsoft Corporation. All rights reserved.
 Licensed under the MIT License.
 """
 
+from .bench import *
 from .ci import *
 from .clean import *
 from .fmt import *
@@ -0,0 +1,12 @@
+"""
+Copyright (c) Microsoft Corporation. All rights reserved.
+Licensed under the MIT License.
+"""
+
+import subprocess
+import sys
+
+
+def bench():
+    result = subprocess.run(["poetry", "run", "python", "-m", "benchmarks.micro", "--check"], check=False)
+    return sys.exit(result.returncode)
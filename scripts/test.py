@@ -3,8 +3,8 @@ Copyright (c) Microsoft Corporation. All rights reserved.
 Licensed under the MIT License.
 """
 
-import sys
+import subprocess
 
 
 def test():
-    return sys.exit()
+    subprocess.run(["poetry", "run", "pytest"], check=True)
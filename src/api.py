@@ -6,19 +6,69 @@ Description: initialize the api and route incoming messages
 to our app
 """
 
+import asyncio
+import importlib
+import time
+import traceback
+from collections import Counter
 from http import HTTPStatus
+from types import ModuleType
 
 from aiohttp import web
-from botbuilder.core.integration import aiohttp_error_middleware
 
-from bot import app
+from devin.devin_api import DevinAPI
+from devin.backend_pool import DevinBackendPool
+from devin.socket_manager import DevinSocketManager
+from devin.artifact_store import ArtifactStore
+from devin.agent_scheduler import AgentScheduler
+from devin.tracing import Tracer
+from devin.warm_pool import WarmAgentPool
+from devin.metrics import MESSAGE_HANDLING, MetricsRegistry
 
 routes = web.RouteTableDef()
 
+# bot.py loads the teams and botbuilder stack and builds the adapter, which takes most of
+# the startup time. It loads in the background once the port is bound; these third-party
+# modules are imported on a thread first, so the loop keeps serving meanwhile.
+BOT_DEPENDENCIES = ("botbuilder.core", "botbuilder.core.integration", "teams")
+
+bot_loader = web.AppKey("bot_loader", asyncio.Task[ModuleType])
+
+
+async def load_bot() -> ModuleType:
+    started = time.perf_counter()
+    loop = asyncio.get_running_loop()
+    for name in BOT_DEPENDENCIES:
+        await loop.run_in_executor(None, importlib.import_module, name)
+    # configuring the agent modules and building the app happen on the loop, as before
+    bot = importlib.import_module("bot")
+    register_bot_gauges(bot)
+    print(f"Bot loaded in {time.perf_counter() - started:.2f}s")
+    return bot
+
+
+def bot_loaded(app: web.Application) -> bool:
+    loader = app.get(bot_loader)
+    return loader is not None and loader.done() and not loader.cancelled() and loader.exception() is None
+
+
+async def bot_for(req: web.Request) -> ModuleType:
+    try:
+        return await asyncio.shield(req.app[bot_loader])
+    except Exception:
+        raise web.HTTPServiceUnavailable(text="The bot failed to start.")
+
 
 @routes.post("/api/messages")
 async def on_messages(req: web.Request) -> web.Response:
-    res = await app.process(req)
+    started = time.perf_counter()
+    try:
+        bot = await bot_for(req)
+        # loaded with the bot; maps botbuilder errors, e.g. a failed auth check to 401
+        from botbuilder.core.integration import aiohttp_error_middleware
+        res = await aiohttp_error_middleware(req, bot.app.process)
+    finally:
+        MESSAGE_HANDLING.observe(time.perf_counter() - started)
 
     if res is not None:
         return res
@@ -26,5 +76,106 @@ async def on_messages(req: web.Request) -> web.Response:
     return web.Response(status=HTTPStatus.OK)
 
 
-api = web.Application(middlewares=[aiohttp_error_middleware])
+@routes.get("/metrics")
+async def on_metrics(_req: web.Request) -> web.Response:
+    return web.Response(
+        text=MetricsRegistry.instance().render(),
+        content_type="text/plain",
+        headers={"X-Content-Type-Options": "nosniff"},
+    )
+
+
+@routes.get("/artifacts/{digest}")
+async def on_artifact(req: web.Request) -> web.StreamResponse:
+    # the store is configured by bot.py
+    await bot_for(req)
+    path = await ArtifactStore.instance().find(req.match_info["digest"])
+    if path is None:
+        raise web.HTTPNotFound()
+    # FileResponse answers conditional (ETag) and Range requests itself
+    return web.FileResponse(path, headers={
+        "Content-Type": "text/plain; charset=utf-8",
+        # content addressed, so the bytes behind a digest never change
+        "Cache-Control": "public, max-age=31536000, immutable",
+    })
+
+
+api = web.Application()
 api.add_routes(routes)
+
+# gauges are read from live state when /metrics is scraped
+metrics = MetricsRegistry.instance()
+metrics.gauge("bot_ready", "1 once the bot has loaded and can handle messages.", lambda: 1 if bot_loaded(api) else 0)
+
+
+def register_bot_gauges(bot: ModuleType):
+    conversation_registry = bot.conversation_registry
+    metrics.gauge("bot_active_handlers", "Conversation handlers in the registry.", lambda: len(conversation_registry))
+    metrics.gauge("devin_open_sockets", "Agent websockets open, connected or not.",
+                  lambda: DevinSocketManager.instance().stats()["open_sockets"])
+    metrics.gauge("devin_connected_sockets", "Agent websockets currently connected.",
+                  lambda: DevinSocketManager.instance().stats()["connected_sockets"])
+    metrics.gauge("devin_outbox_commands", "Agent commands waiting for a connection, all users.",
+                  lambda: DevinSocketManager.instance().stats()["outbox_commands"])
+    metrics.gauge("devin_backend_healthy", "1 if the backend passes health checks.",
+                  lambda: {url: stats["healthy"] for url, stats in DevinBackendPool.instance().stats().items()},
+                  label="backend")
+    metrics.gauge("devin_backend_users", "Users assigned to each backend.",
+                  lambda: {url: stats["users"] for url, stats in DevinBackendPool.instance().stats().items()},
+                  label="backend")
+    metrics.gauge("devin_agents", "Conversations by the last known agent state.",
+                  lambda: dict(Counter(handler.agent_state or "unknown" for handler in conversation_registry.handlers())),
+                  label="state")
+    metrics.gauge("devin_agent_slots_used", "Agent slots held by running tasks, per backend.",
+                  lambda: AgentScheduler.instance().running_by_backend(),
+                  label="backend")
+    metrics.gauge("devin_agent_queue_length", "Tasks waiting for a free agent slot.",
+                  lambda: AgentScheduler.instance().stats()["queued"])
+    metrics.gauge("devin_warm_agents", "Idle agents kept initialised for the next task.",
+                  lambda: WarmAgentPool.instance().stats()["warm"])
+    metrics.gauge("devin_warm_agent_hit_ratio", "Share of new tasks that found a warm agent.",
+                  lambda: WarmAgentPool.instance().stats()["hit_rate"])
+    metrics.gauge("devin_warm_agent_first_card_saved_seconds", "Mean time to the first card, cold minus warm starts.",
+                  lambda: WarmAgentPool.instance().stats()["first_card_saved_seconds"])
+    metrics.gauge("bot_outbound_queue_depth", "Proactive activities waiting for delivery, all conversations.",
+                  lambda: sum(handler.outbound.depth for handler in conversation_registry.handlers()))
+
+
+resume_task = web.AppKey("resume_task", asyncio.Task[None])
+
+
+async def start_resuming_conversations(_app: web.Application):
+    # don't hold up serving while the bot loads and sockets reconnect
+    _app[bot_loader] = asyncio.create_task(load_bot())
+    _app[resume_task] = asyncio.create_task(resume_conversations(_app[bot_loader]))
+
+
+async def resume_conversations(loader: asyncio.Task[ModuleType]):
+    try:
+        bot = await asyncio.shield(loader)
+    except Exception:
+        print("The bot failed to load, requests will be refused")
+        traceback.print_exc()
+        return
+    DevinBackendPool.instance().start(DevinAPI.session)
+    await bot.resume_conversations()
+    await asyncio.gather(bot.expire_stale_state_forever(), bot.release_lost_conversations_forever())
+
+
+async def close_devin_session(_app: web.Application):
+    _app[resume_task].cancel()
+    if not bot_loaded(_app):
+        _app[bot_loader].cancel()
+        await DevinAPI.close()
+        return
+    bot = _app[bot_loader].result()
+    await bot.conversation_registry.close()
+    await DevinSocketManager.instance().close()
+    await DevinBackendPool.instance().close()
+    await DevinAPI.close()
+    bot.conversation_state_store.close()
+    Tracer.instance().close()
+
+
+api.on_startup.append(start_resuming_conversations)
+api.on_cleanup.append(close_devin_session)
@@ -5,18 +5,80 @@ Licensed under the MIT License.
 Description: initialize the app and listen for `message` activitys
 """
 
+import asyncio
 import sys
+import time
 import traceback
+from typing import Optional
 
 from botbuilder.core import TurnContext
+from botbuilder.core.conversation_reference_extension import get_continuation_activity
 from teams import Application, ApplicationOptions, TeamsAdapter
 from teams.state import TurnState
-from typing import Dict
-from devin.devin_conversation_handler import DevinConversationHandler
+from devin.devin_conversation_handler import DevinConversationHandler, TERMINAL_STATES
+from devin.conversation_registry import ConversationRegistry
+from devin.devin_api import DevinAPI, DevinAPIOptions
+from devin.backend_pool import DevinBackendPool, DevinBackendPoolOptions
+from devin.socket_manager import DevinSocketManager, SocketLimitExceeded
+from devin.devin_socket import DevinSocket, DevinSocketOptions
+from devin.outbox import Outbox, OutboxOptions
+from devin.event_log import EventLog, EventLogOptions
+from devin.artifact_store import ArtifactStore, ArtifactStoreOptions
+from devin.agent_scheduler import AgentScheduler, AgentSchedulerOptions
+from devin.tracing import Tracer, TracerOptions
+from devin.warm_pool import WarmAgentPool, WarmPoolOptions
+from devin.conversation_state import (
+    ConversationState,
+    ConversationStateStore,
+    InMemoryConversationStateStore,
+    SqliteConversationStateStore,
+)
+from devin.hash_ring import HashRing
 
 from config import Config
 
 config = Config()
+DevinAPI.configure(DevinAPIOptions(
+    limit_per_host=config.DEVIN_LIMIT_PER_HOST,
+    total_timeout=config.DEVIN_TIMEOUT,
+    max_retries=config.DEVIN_MAX_RETRIES,
+))
+DevinBackendPool.configure(config.DEVIN_BASE_URLS or [config.DEVIN_BASE_URL], DevinBackendPoolOptions(
+    probe_interval=config.DEVIN_PROBE_INTERVAL,
+    probe_path=config.DEVIN_PROBE_PATH,
+))
+DevinSocket.configure(DevinSocketOptions(
+    heartbeat=config.DEVIN_HEARTBEAT,
+    reconnect_max_delay=config.DEVIN_RECONNECT_MAX_DELAY,
+))
+EventLog.configure(EventLogOptions(
+    capacity=config.EVENT_LOG_CAPACITY,
+    spill_directory=config.EVENT_LOG_SPILL_DIR,
+))
+Outbox.configure(OutboxOptions(
+    # each worker replays its own users' commands, restarted workers keep their port
+    directory=f"{config.OUTBOX_DIR}/{config.PORT}" if config.OUTBOX_DIR and config.WORKER_ID else config.OUTBOX_DIR,
+))
+DevinSocketManager.configure(max_sockets=config.MAX_DEVIN_SOCKETS)
+AgentScheduler.configure(AgentSchedulerOptions(
+    max_running=config.MAX_RUNNING_AGENTS,
+    max_running_per_backend=config.MAX_RUNNING_AGENTS_PER_BACKEND,
+))
+WarmAgentPool.configure(WarmPoolOptions(
+    enabled=config.WARM_AGENTS,
+    max_warm=config.WARM_AGENTS_MAX,
+    demand_window=config.WARM_AGENTS_WINDOW,
+))
+Tracer.configure(TracerOptions(
+    directory=config.TRACE_DIR,
+    # one file per worker, a rotating file can't be shared between processes
+    filename=f"spans-{config.PORT}.jsonl" if config.WORKER_ID else "spans.jsonl",
+    max_bytes=config.TRACE_MAX_BYTES,
+))
+ArtifactStore.configure(ArtifactStoreOptions(
+    directory=config.ARTIFACT_DIR,
+    base_url=config.ARTIFACT_BASE_URL,
+))
 app = Application[TurnState](
     ApplicationOptions(
         bot_app_id=config.APP_ID,
@@ -26,27 +88,130 @@ app = Application[TurnState](
   
 def build_storage_key(conversation_id: str):
     return f"conversation_reference-{conversation_id}"
+
+def build_state_store() -> ConversationStateStore:
+    match config.CONVERSATION_STATE_BACKEND:
+        case "sqlite":
+            return SqliteConversationStateStore(config.CONVERSATION_STATE_DB)
+        case "memory":
+            return InMemoryConversationStateStore()
+        case backend:
+            raise ValueError(f"Unknown CONVERSATION_STATE_BACKEND {backend}")
+
+conversation_state_store = build_state_store()
+# same ring as the launcher's router, so a worker knows which conversations are its own. It
+# always holds every node: while one is down the router sends its conversations elsewhere,
+# and the worker taking them over claims them in the state store (see claimed_elsewhere)
+worker_ring = HashRing(config.WORKER_NODES)
+
+def owns_conversation(conversation_id: str) -> bool:
+    if config.WORKER_ID is None or len(worker_ring) == 0:
+        return True
+    return worker_ring.get(conversation_id) == config.WORKER_ID
+
+def claimed_elsewhere(conversation_id: str) -> bool:
+    """Whether another worker has saved the conversation as its own since this one did."""
+    if config.WORKER_ID is None:
+        return False
+    try:
+        owner = conversation_state_store.owner(conversation_id)
+    except Exception as e:
+        print(f"Could not read the owner of conversation {conversation_id}: {e}")
+        return False
+    return owner is not None and owner != config.WORKER_ID
+
+def build_handler(context: TurnContext, saved: Optional[ConversationState]) -> DevinConversationHandler:
+    return DevinConversationHandler(
+        context,
+        TurnContext.get_conversation_reference(context.activity),
+        saved.agent_state if saved is not None else None,
+        config.APP_ID,
+        progress_debounce=config.PROGRESS_DEBOUNCE,
+        outbound_queue_size=config.OUTBOUND_QUEUE_SIZE,
+        original_message=saved.original_message if saved is not None else None,
+        seen_events=saved.seen_events if saved is not None else (),
+        state_store=conversation_state_store,
+        owner=config.WORKER_ID,
+    )
         
-in_memory_conversation_dict: Dict[str, DevinConversationHandler] = {}    
+conversation_registry = ConversationRegistry(
+    max_size=config.MAX_CONVERSATIONS,
+    idle_ttl=config.CONVERSATION_IDLE_TTL,
+)
 
 @app.activity("message")
 async def on_message(context: TurnContext, _state: TurnState):
     conversation_reference = TurnContext.get_conversation_reference(context.activity)
-    conversation_id = conversation_reference.conversation.id # type: ignore
-    storage = in_memory_conversation_dict.get(build_storage_key(conversation_id))
+    conversation_id = conversation_reference.conversation.id
+    storage = conversation_registry.get(build_storage_key(conversation_id))
+    if storage and claimed_elsewhere(conversation_id):
+        # the router sends this conversation here again; take it back from the saved state
+        conversation_registry.release(build_storage_key(conversation_id))
+        storage = None
     if not storage:
-        storage = DevinConversationHandler(
-            context,
-            conversation_reference,
-            None,
-            config.APP_ID
-        )
-        in_memory_conversation_dict[build_storage_key(conversation_id)] = storage
+        try:
+            # another worker may have handled this conversation before
+            storage = build_handler(context, conversation_state_store.load(conversation_id))
+        except SocketLimitExceeded:
+            await context.send_activity("The agent is at capacity right now. Please try again in a few minutes.")
+            return True
+        conversation_registry.add(build_storage_key(conversation_id), storage)
+        # connect in the background, so the webhook is acknowledged right away
+        storage.start()
 
     await storage.handle_message(context, context.activity.text)
     return True
 
 
+def expire_stale_state():
+    try:
+        expired = conversation_state_store.expire(time.time() - config.CONVERSATION_STATE_TTL)
+    except Exception as e:
+        print(f"Could not expire conversation state: {e}")
+        return
+    if expired:
+        print(f"Expired the state of {expired} conversations")
+
+
+async def expire_stale_state_forever():
+    while True:
+        await asyncio.sleep(min(config.CONVERSATION_STATE_TTL, 3600))
+        expire_stale_state()
+
+
+async def release_lost_conversations_forever():
+    """Drop handlers of conversations another worker has taken over, so only one of them sends cards."""
+    if config.WORKER_ID is None:
+        return
+    while True:
+        await asyncio.sleep(config.OWNERSHIP_CHECK_INTERVAL)
+        for handler in conversation_registry.handlers():
+            if handler.conversation_id is not None and claimed_elsewhere(handler.conversation_id):
+                print(f"Conversation {handler.conversation_id} moved to another worker, dropping it here")
+                conversation_registry.release(build_storage_key(handler.conversation_id))
+
+
+async def resume_conversations():
+    """Pick up this worker's conversations whose agent was still running."""
+    expire_stale_state()
+    for saved in conversation_state_store.list():
+        reference = saved.reference()
+        # a task that had not started yet is queued again once the handler has caught up
+        pending = saved.original_message is not None
+        if reference is None or (saved.agent_state in TERMINAL_STATES and not pending) or not owns_conversation(saved.conversation_id):
+            continue
+        if conversation_registry.get(build_storage_key(saved.conversation_id)) is not None:
+            continue
+        context = TurnContext(app.adapter, get_continuation_activity(reference))
+        try:
+            handler = build_handler(context, saved)
+        except SocketLimitExceeded:
+            print("Socket limit reached, not resuming further conversations")
+            return
+        conversation_registry.add(build_storage_key(saved.conversation_id), handler)
+        handler.start()
+
+
 @app.error
 async def on_error(context: TurnContext, error: Exception):
     # This check writes out errors to console log .vs. app insights.
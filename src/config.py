@@ -5,14 +5,83 @@ Licensed under the MIT License.
 
 import os
 
-from dotenv import load_dotenv
 
-load_dotenv()
+class _Setting:
+    """A setting read from the environment (and .env) on first access, then kept."""
+
+    def __init__(self, read):
+        self.read = read
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def __get__(self, instance, owner):
+        load_environment()
+        value = self.read()
+        # later reads find the plain value on the class
+        setattr(owner, self.name, value)
+        return value
+
+
+_environment_loaded = False
+
+
+def load_environment():
+    """Load .env into the environment, once; settings do this on first access."""
+    global _environment_loaded
+    if not _environment_loaded:
+        from dotenv import load_dotenv
+        load_dotenv()
+        _environment_loaded = True
 
 
 class Config:
-    """Bot Configuration"""
+    """Bot Configuration, read lazily so importing it does no I/O"""
 
-    PORT = 3978
-    APP_ID = os.environ["BOT_ID"]
-    APP_PASSWORD = os.environ["BOT_PASSWORD"]
+    PORT = _Setting(lambda: int(os.environ.get("PORT", "3978")))
+    APP_ID = _Setting(lambda: os.environ["BOT_ID"])
+    APP_PASSWORD = _Setting(lambda: os.environ["BOT_PASSWORD"])
+    DEVIN_BASE_URL = _Setting(lambda: os.environ.get("DEVIN_BASE_URL", "http://localhost:3001"))
+    # comma separated pool of backends; users are spread over them
+    DEVIN_BASE_URLS = _Setting(lambda: [url for url in os.environ.get("DEVIN_BASE_URLS", "").split(",") if url])
+    DEVIN_PROBE_INTERVAL = _Setting(lambda: float(os.environ.get("DEVIN_PROBE_INTERVAL", "10")))
+    DEVIN_PROBE_PATH = _Setting(lambda: os.environ.get("DEVIN_PROBE_PATH", "/"))
+    DEVIN_LIMIT_PER_HOST = _Setting(lambda: int(os.environ.get("DEVIN_LIMIT_PER_HOST", "20")))
+    DEVIN_TIMEOUT = _Setting(lambda: float(os.environ.get("DEVIN_TIMEOUT", "30")))
+    DEVIN_MAX_RETRIES = _Setting(lambda: int(os.environ.get("DEVIN_MAX_RETRIES", "2")))
+    MAX_CONVERSATIONS = _Setting(lambda: int(os.environ.get("MAX_CONVERSATIONS", "500")))
+    CONVERSATION_IDLE_TTL = _Setting(lambda: float(os.environ.get("CONVERSATION_IDLE_TTL", "3600")))
+    # recent agent events kept per conversation for `status` and `last N`, older ones
+    # optionally spill to a fixed-size memory-mapped file per conversation
+    EVENT_LOG_CAPACITY = _Setting(lambda: int(os.environ.get("EVENT_LOG_CAPACITY", "256")))
+    EVENT_LOG_SPILL_DIR = _Setting(lambda: os.environ.get("EVENT_LOG_SPILL_DIR") or None)
+    PROGRESS_DEBOUNCE = _Setting(lambda: float(os.environ.get("PROGRESS_DEBOUNCE", "3")))
+    OUTBOUND_QUEUE_SIZE = _Setting(lambda: int(os.environ.get("OUTBOUND_QUEUE_SIZE", "50")))
+    # agents running at once, in total and per backend; further tasks wait in line
+    MAX_RUNNING_AGENTS = _Setting(lambda: int(os.environ.get("MAX_RUNNING_AGENTS", "20")))
+    MAX_RUNNING_AGENTS_PER_BACKEND = _Setting(lambda: int(os.environ.get("MAX_RUNNING_AGENTS_PER_BACKEND", "10")))
+    # keep agents of recently active users initialised between tasks
+    WARM_AGENTS = _Setting(lambda: os.environ.get("WARM_AGENTS", "false").lower() in ("1", "true", "yes"))
+    WARM_AGENTS_MAX = _Setting(lambda: int(os.environ.get("WARM_AGENTS_MAX", "10")))
+    WARM_AGENTS_WINDOW = _Setting(lambda: float(os.environ.get("WARM_AGENTS_WINDOW", "900")))
+    MAX_DEVIN_SOCKETS = _Setting(lambda: int(os.environ.get("MAX_DEVIN_SOCKETS", "1000")))
+    DEVIN_HEARTBEAT = _Setting(lambda: float(os.environ.get("DEVIN_HEARTBEAT", "20")))
+    DEVIN_RECONNECT_MAX_DELAY = _Setting(lambda: float(os.environ.get("DEVIN_RECONNECT_MAX_DELAY", "30")))
+    # agent commands sent while disconnected are kept here until delivered; empty keeps them in memory
+    OUTBOX_DIR = _Setting(lambda: os.environ.get("OUTBOX_DIR", "outbox") or None)
+    # "memory" or "sqlite"; sqlite lets other workers take conversations over
+    CONVERSATION_STATE_BACKEND = _Setting(lambda: os.environ.get("CONVERSATION_STATE_BACKEND", "memory"))
+    CONVERSATION_STATE_DB = _Setting(lambda: os.environ.get("CONVERSATION_STATE_DB", "conversations.db"))
+    # state of conversations not updated for this long is deleted, seconds
+    CONVERSATION_STATE_TTL = _Setting(lambda: float(os.environ.get("CONVERSATION_STATE_TTL", "86400")))
+    # set by launcher.py: this worker's url and every worker's url, comma separated
+    WORKER_ID = _Setting(lambda: os.environ.get("WORKER_ID"))
+    WORKER_NODES = _Setting(lambda: [node for node in os.environ.get("WORKER_NODES", "").split(",") if node])
+    # seconds between checks for conversations another worker has taken over
+    OWNERSHIP_CHECK_INTERVAL = _Setting(lambda: float(os.environ.get("OWNERSHIP_CHECK_INTERVAL", "2")))
+    ARTIFACT_DIR = _Setting(lambda: os.environ.get("ARTIFACT_DIR", "artifacts"))
+    # public url of this bot; when unset long messages are cut without a link
+    ARTIFACT_BASE_URL = _Setting(lambda: os.environ.get("ARTIFACT_BASE_URL"))
+    # task traces are appended to TRACE_DIR/spans.jsonl; empty disables tracing
+    TRACE_DIR = _Setting(lambda: os.environ.get("TRACE_DIR", "traces") or None)
+    TRACE_MAX_BYTES = _Setting(lambda: int(os.environ.get("TRACE_MAX_BYTES", str(10 * 1024 * 1024))))
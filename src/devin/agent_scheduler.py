@@ -0,0 +1,219 @@
+import asyncio, time
+from collections import deque
+from dataclasses import dataclass
+from typing import Callable, Deque, Dict, List, Optional, Set
+
+from .backend_pool import DevinBackendPool
+
+@dataclass
+class AgentSchedulerOptions:
+    max_running: int = 20
+    max_running_per_backend: int = 10
+    # run time assumed for ETAs until some runs have finished
+    expected_run_seconds: float = 300
+    # a slot is reclaimed after this long even if no terminal state was seen
+    max_run_seconds: float = 2 * 60 * 60
+
+# called with (position, eta_seconds) whenever a queued ticket moves
+QueueListener = Callable[[int, float], None]
+
+class AgentTicket:
+    __slots__ = ("user_id", "future", "on_update", "backend_url", "queued_at", "granted_at", "position", "saw_running")
+
+    def __init__(self, user_id: str, on_update: Optional[QueueListener]):
+        self.user_id = user_id
+        self.future: asyncio.Future = asyncio.get_running_loop().create_future()
+        self.on_update = on_update
+        self.backend_url: Optional[str] = None
+        self.queued_at = time.monotonic()
+        self.granted_at: Optional[float] = None
+        self.position = 0
+        # whether the agent left INIT since the slot was granted
+        self.saw_running = False
+
+    @property
+    def granted(self) -> bool:
+        return self.granted_at is not None
+
+class AgentScheduler:
+    """
+    Admission control for agent runs.
+
+    At most `max_running` agents run at once, and at most `max_running_per_backend` on
+    any one backend. Tasks beyond that wait in per-user queues; a free slot goes to the
+    waiting user with the fewest running agents, round-robin among equals, so one user
+    queueing many tasks cannot starve others. Waiting tickets are told their position
+    and an ETA based on the average duration of recent runs.
+    """
+
+    __instance: Optional["AgentScheduler"] = None
+    options = AgentSchedulerOptions()
+
+    def __init__(self, options: Optional[AgentSchedulerOptions] = None) -> None:
+        self.options = options or AgentScheduler.options
+        self.__queues: Dict[str, Deque[AgentTicket]] = {}
+        # users with waiting tickets, in round-robin order
+        self.__turns: Deque[str] = deque()
+        self.__running: Set[AgentTicket] = set()
+        self.__average_run_seconds = self.options.expected_run_seconds
+        self.granted = 0
+        self.completed = 0
+        self.reclaimed = 0
+
+    @staticmethod
+    def instance() -> "AgentScheduler":
+        if AgentScheduler.__instance is None:
+            AgentScheduler.__instance = AgentScheduler()
+        return AgentScheduler.__instance
+
+    @staticmethod
+    def configure(options: AgentSchedulerOptions):
+        AgentScheduler.options = options
+        AgentScheduler.__instance = None
+
+    def request(self, user_id, on_update: Optional[QueueListener] = None) -> AgentTicket:
+        """Queue a run; `ticket.future` resolves once the run may start."""
+        ticket = AgentTicket(str(user_id), on_update)
+        queue = self.__queues.get(ticket.user_id)
+        if queue is None:
+            queue = self.__queues[ticket.user_id] = deque()
+            self.__turns.append(ticket.user_id)
+        queue.append(ticket)
+        self.__dispatch()
+        return ticket
+
+    def adopt(self, user_id) -> AgentTicket:
+        """Count a run that is already going, e.g. one taken over after a restart."""
+        for ticket in self.__running:
+            # a user has one agent, seen by each of their conversations
+            if ticket.user_id == str(user_id):
+                return ticket
+        ticket = AgentTicket(str(user_id), None)
+        ticket.saw_running = True
+        self.__grant(ticket)
+        return ticket
+
+    def release(self, ticket: AgentTicket):
+        """Free the ticket's slot, or take it out of the queue if it is still waiting."""
+        if ticket in self.__running:
+            self.__running.discard(ticket)
+            assert ticket.granted_at is not None
+            duration = time.monotonic() - ticket.granted_at
+            # moving average, so ETAs follow the current workload
+            self.__average_run_seconds = 0.8 * self.__average_run_seconds + 0.2 * duration
+            self.completed += 1
+        else:
+            queue = self.__queues.get(ticket.user_id)
+            if queue is not None and ticket in queue:
+                queue.remove(ticket)
+                if not queue:
+                    self.__drop_user(ticket.user_id)
+            if not ticket.future.done():
+                ticket.future.cancel()
+        self.__dispatch()
+
+    def is_waiting(self, user_id) -> bool:
+        """Whether a task of the user is in line for a slot."""
+        return bool(self.__queues.get(str(user_id)))
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "running": len(self.__running),
+            "queued": sum(len(queue) for queue in self.__queues.values()),
+            "max_running": self.options.max_running,
+            "average_run_seconds": self.__average_run_seconds,
+            "granted": self.granted,
+            "completed": self.completed,
+            "reclaimed": self.reclaimed,
+        }
+
+    def running_by_backend(self) -> Dict[str, int]:
+        counts: Dict[str, int] = {}
+        for ticket in self.__running:
+            if ticket.backend_url is not None:
+                counts[ticket.backend_url] = counts.get(ticket.backend_url, 0) + 1
+        return counts
+
+    def __reclaim_expired(self):
+        now = time.monotonic()
+        for ticket in list(self.__running):
+            assert ticket.granted_at is not None
+            if now - ticket.granted_at > self.options.max_run_seconds:
+                print(f"Reclaiming agent slot of {ticket.user_id} after {self.options.max_run_seconds}s")
+                self.__running.discard(ticket)
+                self.reclaimed += 1
+
+    def __grant(self, ticket: AgentTicket):
+        ticket.granted_at = time.monotonic()
+        self.__running.add(ticket)
+        self.granted += 1
+        if not ticket.future.done():
+            ticket.future.set_result(ticket)
+
+    def __drop_user(self, user_id: str):
+        del self.__queues[user_id]
+        self.__turns.remove(user_id)
+
+    def __running_by_user(self) -> Dict[str, int]:
+        counts: Dict[str, int] = {}
+        for ticket in self.__running:
+            counts[ticket.user_id] = counts.get(ticket.user_id, 0) + 1
+        return counts
+
+    def __turn_order(self, by_user: Dict[str, int]) -> List[str]:
+        # stable, so users with the same number of running agents keep their turns
+        return sorted(self.__turns, key=lambda user_id: by_user.get(user_id, 0))
+
+    def __dispatch(self):
+        self.__reclaim_expired()
+        pool = DevinBackendPool.instance()
+        by_backend = self.running_by_backend()
+        by_user = self.__running_by_user()
+        while len(self.__running) < self.options.max_running:
+            for user_id in self.__turn_order(by_user):
+                backend_url = pool.backend_for(user_id)
+                if by_backend.get(backend_url, 0) < self.options.max_running_per_backend:
+                    break
+            else:
+                # nobody waiting, or every waiting user's backend is full
+                break
+            self.__turns.remove(user_id)
+            self.__turns.append(user_id)
+            queue = self.__queues[user_id]
+            ticket = queue.popleft()
+            if not queue:
+                self.__drop_user(user_id)
+            if ticket.future.done():
+                # cancelled while waiting
+                continue
+            ticket.backend_url = backend_url
+            by_backend[backend_url] = by_backend.get(backend_url, 0) + 1
+            by_user[user_id] = by_user.get(user_id, 0) + 1
+            self.__grant(ticket)
+        self.__notify_positions()
+
+    def __waiting_order(self) -> List[AgentTicket]:
+        # the order tickets would be granted in if slots freed one by one
+        order: List[AgentTicket] = []
+        turns = self.__turn_order(self.__running_by_user())
+        depth = 0
+        while True:
+            layer = [self.__queues[user_id][depth] for user_id in turns if depth < len(self.__queues[user_id])]
+            if not layer:
+                return order
+            order.extend(layer)
+            depth += 1
+
+    def __notify_positions(self):
+        slots = max(1, self.options.max_running)
+        for index, ticket in enumerate(self.__waiting_order()):
+            position = index + 1
+            if ticket.position == position or ticket.on_update is None:
+                continue
+            ticket.position = position
+            # runs finish roughly evenly spread, one batch of `slots` per average run
+            eta = self.__average_run_seconds * (index // slots + 1)
+            try:
+                ticket.on_update(position, eta)
+            except Exception as e:
+                print(f"Error reporting queue position: {e}")
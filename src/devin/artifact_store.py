@@ -0,0 +1,134 @@
+import asyncio, hashlib, os, re, tempfile, threading
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+_DIGEST = re.compile(r"^[0-9a-f]{64}$")
+
+@dataclass
+class ArtifactStoreOptions:
+    directory: str = "artifacts"
+    # public base url of this bot, artifacts are linked as {base_url}/artifacts/{digest}
+    base_url: Optional[str] = None
+    # oldest artifacts are removed once the store grows past this
+    max_total_bytes: int = 512 * 1024 * 1024
+
+class ArtifactStore:
+    """
+    Content-addressed store for agent output too large to put in a card.
+
+    Text is saved under its sha256 digest, so storing the same output twice is free and
+    a digest always refers to the same bytes. api.py serves the files at /artifacts/.
+    File access runs on worker threads, off the event loop.
+    """
+
+    __instance: Optional["ArtifactStore"] = None
+    options = ArtifactStoreOptions()
+
+    def __init__(self, options: Optional[ArtifactStoreOptions] = None) -> None:
+        self.options = options or ArtifactStore.options
+        self.__total_bytes: Optional[int] = None
+        # digest -> write still running on a worker thread
+        self.__pending: Dict[str, asyncio.Task] = {}
+        self.__lock = threading.Lock()
+
+    @staticmethod
+    def instance() -> "ArtifactStore":
+        if ArtifactStore.__instance is None:
+            ArtifactStore.__instance = ArtifactStore()
+        return ArtifactStore.__instance
+
+    @staticmethod
+    def configure(options: ArtifactStoreOptions):
+        ArtifactStore.options = options
+        ArtifactStore.__instance = None
+
+    @property
+    def enabled(self) -> bool:
+        # without a public url nobody could open what we store
+        return bool(self.options.base_url)
+
+    async def find(self, digest: str) -> Optional[str]:
+        """The file of `digest`, once a pending write of it has finished."""
+        pending = self.__pending.get(digest)
+        if pending is not None:
+            await asyncio.wait([pending])
+        return await asyncio.to_thread(self.path, digest)
+
+    def path(self, digest: str) -> Optional[str]:
+        if not _DIGEST.match(digest):
+            return None
+        path = os.path.join(self.options.directory, f"{digest}.txt")
+        return path if os.path.isfile(path) else None
+
+    def url(self, digest: str) -> str:
+        assert self.options.base_url is not None
+        return f"{self.options.base_url.rstrip('/')}/artifacts/{digest}"
+
+    def put_soon(self, text: str) -> str:
+        """
+        Return the digest of `text` right away and write it on a worker thread; `find`
+        waits for the write. Without a running loop the text is written before returning.
+        """
+        data = text.encode("utf-8")
+        digest = hashlib.sha256(data).hexdigest()
+        if digest in self.__pending:
+            return digest
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.__write(digest, data)
+            return digest
+        task = loop.create_task(asyncio.to_thread(self.__write, digest, data))
+        self.__pending[digest] = task
+        task.add_done_callback(lambda t: self.__on_written(digest, t))
+        return digest
+
+    def __on_written(self, digest: str, task: asyncio.Task):
+        del self.__pending[digest]
+        if not task.cancelled() and task.exception() is not None:
+            print(f"Could not store artifact {digest}: {task.exception()}")
+
+    def __write(self, digest: str, data: bytes):
+        # one writer at a time keeps the size accounting right
+        with self.__lock:
+            self.__write_locked(digest, data)
+
+    def __write_locked(self, digest: str, data: bytes):
+        path = os.path.join(self.options.directory, f"{digest}.txt")
+        if os.path.exists(path):
+            return
+        os.makedirs(self.options.directory, exist_ok=True)
+        self.__make_room(len(data))
+        # write then rename, so a concurrent reader never sees a partial artifact
+        fd, temp_path = tempfile.mkstemp(dir=self.options.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as file:
+                file.write(data)
+            os.replace(temp_path, path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+        self.__total_bytes = (self.__total_bytes or 0) + len(data)
+
+    def __make_room(self, size: int):
+        total = self.__total_bytes
+        if total is None:
+            total = sum(entry.stat().st_size for entry in self.__artifacts())
+        try:
+            if total + size <= self.options.max_total_bytes:
+                return
+            for entry in sorted(self.__artifacts(), key=lambda entry: entry.stat().st_mtime):
+                stat = entry.stat()
+                try:
+                    os.unlink(entry.path)
+                except FileNotFoundError:
+                    continue
+                total -= stat.st_size
+                if total + size <= self.options.max_total_bytes:
+                    return
+        finally:
+            self.__total_bytes = total
+
+    def __artifacts(self):
+        with os.scandir(self.options.directory) as entries:
+            return [entry for entry in entries if entry.name.endswith(".txt") and entry.is_file()]
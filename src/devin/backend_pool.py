@@ -0,0 +1,191 @@
+import asyncio, time
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Set
+
+import aiohttp
+
+from .hash_ring import HashRing
+
+@dataclass
+class DevinBackendPoolOptions:
+    probe_interval: float = 10
+    probe_timeout: float = 5
+    # any response below 500 counts as alive; the fork has no dedicated health route
+    probe_path: str = "/"
+    # consecutive failed probes or connects before a backend is drained
+    failure_threshold: int = 3
+    # a new user goes to the least loaded of this many backends in its ring order
+    candidates: int = 2
+
+class _Backend:
+    __slots__ = ("url", "healthy", "failures", "users", "latency")
+
+    def __init__(self, url: str):
+        self.url = url
+        self.healthy = True
+        self.failures = 0
+        self.users: Set[str] = set()
+        self.latency: Optional[float] = None
+
+# called with (user_id, old_url, new_url) when a user is moved to another backend
+BackendMoveListener = Callable[[str, str, str], None]
+
+class DevinBackendPool:
+    """
+    Assigns each user to one of several OpenDevin backends.
+
+    The assignment is sticky: the agent session lives on the backend, so a user only
+    moves when their backend is drained. New users are placed on the least loaded of
+    their first `candidates` healthy backends in consistent-hash order, which keeps
+    placement stable across restarts while spreading load. Backends are probed
+    periodically and are also reported failing by connection errors; after
+    `failure_threshold` failures a backend is drained and its users move elsewhere.
+    """
+
+    __instance: Optional["DevinBackendPool"] = None
+    urls: List[str] = ["http://localhost:3001"]
+    options = DevinBackendPoolOptions()
+
+    def __init__(self, urls: Optional[List[str]] = None, options: Optional[DevinBackendPoolOptions] = None) -> None:
+        self.options = options or DevinBackendPool.options
+        urls = [url.rstrip("/") for url in urls or DevinBackendPool.urls]
+        self.__backends: Dict[str, _Backend] = {url: _Backend(url) for url in urls}
+        self.__ring = HashRing(urls)
+        self.__assignments: Dict[str, str] = {}
+        self.__listeners: List[BackendMoveListener] = []
+        self.__prober: Optional[asyncio.Task] = None
+        self.moves = 0
+
+    @staticmethod
+    def instance() -> "DevinBackendPool":
+        if DevinBackendPool.__instance is None:
+            DevinBackendPool.__instance = DevinBackendPool()
+        return DevinBackendPool.__instance
+
+    @staticmethod
+    def configure(urls: List[str], options: Optional[DevinBackendPoolOptions] = None):
+        DevinBackendPool.urls = urls
+        if options is not None:
+            DevinBackendPool.options = options
+        previous = DevinBackendPool.__instance
+        DevinBackendPool.__instance = None
+        if previous is not None:
+            # keep subscribers such as the socket manager across reconfiguration
+            for listener in previous.__listeners:
+                DevinBackendPool.instance().add_listener(listener)
+
+    @property
+    def default_url(self) -> str:
+        """Backend for calls that are not made on behalf of a user."""
+        return next(iter(self.__backends))
+
+    def add_listener(self, listener: BackendMoveListener):
+        self.__listeners.append(listener)
+
+    def backend_for(self, user_id) -> str:
+        key = str(user_id)
+        current = self.__assignments.get(key)
+        if current is not None and self.__backends[current].healthy:
+            return current
+        target = self.__place(key)
+        if target is None:
+            # nothing is known to work; stay put and let the caller retry
+            target = current if current is not None else self.__ring.get(key)
+            assert target is not None
+        self.__assign(key, target)
+        return target
+
+    def report_failure(self, url: str):
+        backend = self.__backends.get(url.rstrip("/"))
+        if backend is None:
+            return
+        backend.failures += 1
+        if backend.healthy and backend.failures >= self.options.failure_threshold:
+            self.__drain(backend)
+
+    def report_success(self, url: str):
+        backend = self.__backends.get(url.rstrip("/"))
+        if backend is None:
+            return
+        backend.failures = 0
+        if not backend.healthy:
+            print(f"Backend {backend.url} is healthy again")
+            # users stay where they are; the backend takes new users from now on
+            backend.healthy = True
+
+    def start(self, session: Callable[[], aiohttp.ClientSession]):
+        if self.__prober is None and len(self.__backends) > 1:
+            self.__prober = asyncio.create_task(self.__probe_forever(session))
+
+    async def close(self):
+        if self.__prober is not None:
+            self.__prober.cancel()
+            self.__prober = None
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        return {
+            backend.url: {
+                "healthy": int(backend.healthy),
+                "users": len(backend.users),
+                "failures": backend.failures,
+                "latency": backend.latency if backend.latency is not None else float("nan"),
+            }
+            for backend in self.__backends.values()
+        }
+
+    def __place(self, key: str) -> Optional[str]:
+        healthy = [url for url in self.__ring.preference(key) if self.__backends[url].healthy]
+        if not healthy:
+            return None
+        candidates = healthy[:max(1, self.options.candidates)]
+        return min(candidates, key=lambda url: len(self.__backends[url].users))
+
+    def __assign(self, key: str, target: str):
+        previous = self.__assignments.get(key)
+        if previous == target:
+            return
+        if previous is not None:
+            self.__backends[previous].users.discard(key)
+        self.__assignments[key] = target
+        self.__backends[target].users.add(key)
+        if previous is not None:
+            self.moves += 1
+            print(f"Moving user {key} from backend {previous} to {target}")
+            for listener in list(self.__listeners):
+                try:
+                    listener(key, previous, target)
+                except Exception as e:
+                    print(f"Error handling backend move: {e}")
+
+    def __drain(self, backend: _Backend):
+        print(f"Backend {backend.url} is unhealthy, draining {len(backend.users)} user(s)")
+        backend.healthy = False
+        if not any(other.healthy for other in self.__backends.values()):
+            # moving users between dead backends only restarts their agents; they move once one recovers
+            print("No healthy backend to drain to, users stay where they are")
+            return
+        for key in list(backend.users):
+            target = self.__place(key)
+            if target is not None:
+                self.__assign(key, target)
+
+    async def __probe_forever(self, session: Callable[[], aiohttp.ClientSession]):
+        while True:
+            await asyncio.gather(*(self.__probe(session(), backend) for backend in list(self.__backends.values())))
+            await asyncio.sleep(self.options.probe_interval)
+
+    async def __probe(self, session: aiohttp.ClientSession, backend: _Backend):
+        started = time.perf_counter()
+        try:
+            async with session.get(
+                f"{backend.url}{self.options.probe_path}",
+                timeout=aiohttp.ClientTimeout(total=self.options.probe_timeout),
+            ) as response:
+                alive = response.status < 500
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            alive = False
+        if alive:
+            backend.latency = time.perf_counter() - started
+            self.report_success(backend.url)
+        else:
+            self.report_failure(backend.url)
@@ -0,0 +1,33 @@
+import re
+from dataclasses import dataclass
+from typing import Optional
+
+from .action_type import ActionType
+from .observation_type import ObservationType
+
+STATUS = "status"
+LAST = "last"
+
+# `last` with an optional count and event type, e.g. "last", "last 10", "last 5 run"
+_LAST = re.compile(r"^last(?:\s+(\d+))?(?:\s+(\w+))?$")
+DEFAULT_LAST = 5
+MAX_LAST = 50
+# event types `last` can filter on; anything else is an ordinary task message
+EVENT_KINDS = {e.value for e in ActionType} | {e.value for e in ObservationType}
+
+@dataclass
+class ChatCommand:
+    name: str
+    count: int = 0
+    kind: Optional[str] = None
+
+def parse_chat_command(message: str) -> Optional[ChatCommand]:
+    """Commands answered by the bot itself from local state, next to the agent state commands."""
+    text = message.strip().lower()
+    if text == STATUS:
+        return ChatCommand(STATUS)
+    match = _LAST.match(text)
+    if match is None or (match.group(2) is not None and match.group(2) not in EVENT_KINDS):
+        return None
+    count = min(int(match.group(1)), MAX_LAST) if match.group(1) else DEFAULT_LAST
+    return ChatCommand(LAST, count, match.group(2))
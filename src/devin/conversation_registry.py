@@ -0,0 +1,97 @@
+import asyncio, time
+from collections import OrderedDict
+from typing import Any, Coroutine, Dict, List, Optional, Set
+
+from .devin_conversation_handler import DevinConversationHandler
+
+class ConversationRegistry:
+    """
+    Bounded map of conversation key -> DevinConversationHandler.
+
+    Handlers are evicted least-recently-used first once `max_size` is exceeded, and
+    by a periodic sweep once they have been idle for `idle_ttl` seconds. Evicted
+    handlers have their socket closed; the next message in that conversation simply
+    builds a new handler.
+    """
+
+    def __init__(self, max_size: int = 500, idle_ttl: float = 60 * 60, sweep_interval: float = 60):
+        self.max_size = max_size
+        self.idle_ttl = idle_ttl
+        self.sweep_interval = sweep_interval
+        self.__handlers: "OrderedDict[str, DevinConversationHandler]" = OrderedDict()
+        self.__closing: Set[asyncio.Task] = set()
+        self.__sweeper: Optional[asyncio.Task] = None
+        self.lru_evictions = 0
+        self.idle_evictions = 0
+
+    def __len__(self):
+        return len(self.__handlers)
+
+    def get(self, key: str) -> Optional[DevinConversationHandler]:
+        handler = self.__handlers.get(key)
+        if handler is not None:
+            self.__handlers.move_to_end(key)
+        return handler
+
+    def add(self, key: str, handler: DevinConversationHandler):
+        self.__ensure_sweeper()
+        previous = self.__handlers.pop(key, None)
+        if previous is not None and previous is not handler:
+            self.__close(previous)
+        self.__handlers[key] = handler
+        while len(self.__handlers) > self.max_size:
+            evicted_key, evicted = self.__handlers.popitem(last=False)
+            self.lru_evictions += 1
+            print(f"Evicting least recently used conversation {evicted_key}")
+            self.__close(evicted)
+
+    def release(self, key: str):
+        """Drop a handler whose conversation another worker has taken over, leaving its state alone."""
+        handler = self.__handlers.pop(key, None)
+        if handler is not None:
+            self.__track(handler.release())
+
+    def handlers(self) -> List[DevinConversationHandler]:
+        return list(self.__handlers.values())
+
+    def sweep(self):
+        deadline = time.monotonic() - self.idle_ttl
+        idle_keys = [key for key, handler in self.__handlers.items() if handler.last_activity < deadline]
+        for key in idle_keys:
+            self.idle_evictions += 1
+            print(f"Evicting idle conversation {key}")
+            self.__close(self.__handlers.pop(key))
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "size": len(self.__handlers),
+            "max_size": self.max_size,
+            "lru_evictions": self.lru_evictions,
+            "idle_evictions": self.idle_evictions,
+            "evictions": self.lru_evictions + self.idle_evictions,
+        }
+
+    async def close(self):
+        if self.__sweeper is not None:
+            self.__sweeper.cancel()
+            self.__sweeper = None
+        handlers = list(self.__handlers.values())
+        self.__handlers.clear()
+        await asyncio.gather(*(handler.close() for handler in handlers), *self.__closing, return_exceptions=True)
+
+    def __close(self, handler: DevinConversationHandler):
+        self.__track(handler.close())
+
+    def __track(self, closing: Coroutine[Any, Any, None]):
+        task = asyncio.get_running_loop().create_task(closing)
+        self.__closing.add(task)
+        task.add_done_callback(self.__closing.discard)
+
+    def __ensure_sweeper(self):
+        if self.__sweeper is None or self.__sweeper.done():
+            self.__sweeper = asyncio.get_running_loop().create_task(self.__sweep_forever())
+
+    async def __sweep_forever(self):
+        while True:
+            await asyncio.sleep(self.sweep_interval)
+            self.sweep()
@@ -0,0 +1,164 @@
+import json, sqlite3, time
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+from botbuilder.schema import ConversationReference
+
+@dataclass
+class ConversationState:
+    """What a worker needs to take over a conversation it did not start."""
+    conversation_id: str
+    user_id: Optional[str] = None
+    agent_state: Optional[str] = None
+    original_message: Optional[str] = None
+    # ConversationReference.serialize() output, enough to send proactively
+    conversation_reference: Optional[Dict[str, Any]] = None
+    # keys of the agent events already turned into cards, oldest first
+    seen_events: List[str] = field(default_factory=list)
+    # WORKER_ID of the worker running the conversation; other workers drop their handler
+    owner: Optional[str] = None
+    updated_at: float = field(default_factory=time.time)
+
+    def reference(self) -> Optional[ConversationReference]:
+        if self.conversation_reference is None:
+            return None
+        return ConversationReference.deserialize(self.conversation_reference)
+
+class ConversationStateStore(ABC):
+    @abstractmethod
+    def load(self, conversation_id: str) -> Optional[ConversationState]:
+        pass
+
+    @abstractmethod
+    def save(self, state: ConversationState):
+        pass
+
+    @abstractmethod
+    def delete(self, conversation_id: str):
+        pass
+
+    @abstractmethod
+    def list(self) -> List[ConversationState]:
+        pass
+
+    @abstractmethod
+    def owner(self, conversation_id: str) -> Optional[str]:
+        pass
+
+    @abstractmethod
+    def expire(self, before: float) -> int:
+        """Delete state not updated since `before` and return how many were deleted."""
+        pass
+
+    def close(self):
+        pass
+
+class InMemoryConversationStateStore(ConversationStateStore):
+    """Single-process store; state is lost on restart."""
+
+    def __init__(self):
+        self.__states: Dict[str, ConversationState] = {}
+
+    def load(self, conversation_id):
+        return self.__states.get(conversation_id)
+
+    def save(self, state):
+        state.updated_at = time.time()
+        self.__states[state.conversation_id] = state
+
+    def delete(self, conversation_id):
+        self.__states.pop(conversation_id, None)
+
+    def list(self):
+        return list(self.__states.values())
+
+    def owner(self, conversation_id):
+        state = self.__states.get(conversation_id)
+        return state.owner if state is not None else None
+
+    def expire(self, before):
+        stale = [conversation_id for conversation_id, state in self.__states.items() if state.updated_at < before]
+        for conversation_id in stale:
+            del self.__states[conversation_id]
+        return len(stale)
+
+class SqliteConversationStateStore(ConversationStateStore):
+    """
+    Conversation state in a SQLite database in WAL mode, shared by the worker processes
+    on one host, so any of them can pick up a conversation after a restart or a change
+    in ownership. WAL needs shared memory, so the file must be on a local disk.
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.__connection = sqlite3.connect(filename, timeout=10, isolation_level=None, check_same_thread=False)
+        self.__connection.execute("PRAGMA journal_mode=WAL")
+        self.__connection.execute("PRAGMA synchronous=NORMAL")
+        self.__connection.execute(
+            "CREATE TABLE IF NOT EXISTS conversations ("
+            "conversation_id TEXT PRIMARY KEY, user_id TEXT, agent_state TEXT, "
+            "original_message TEXT, conversation_reference TEXT, seen_events TEXT, owner TEXT, updated_at REAL NOT NULL)"
+        )
+
+    def load(self, conversation_id):
+        row = self.__connection.execute(
+            "SELECT conversation_id, user_id, agent_state, original_message, conversation_reference, seen_events, owner, updated_at "
+            "FROM conversations WHERE conversation_id = ?",
+            (conversation_id,),
+        ).fetchone()
+        return self.__from_row(row) if row is not None else None
+
+    def save(self, state):
+        state.updated_at = time.time()
+        self.__connection.execute(
+            "INSERT INTO conversations (conversation_id, user_id, agent_state, original_message, conversation_reference, seen_events, owner, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT(conversation_id) DO UPDATE SET user_id = excluded.user_id, agent_state = excluded.agent_state, "
+            "original_message = excluded.original_message, conversation_reference = excluded.conversation_reference, "
+            "seen_events = excluded.seen_events, owner = excluded.owner, updated_at = excluded.updated_at",
+            (
+                state.conversation_id,
+                state.user_id,
+                state.agent_state,
+                state.original_message,
+                json.dumps(state.conversation_reference) if state.conversation_reference is not None else None,
+                json.dumps(state.seen_events),
+                state.owner,
+                state.updated_at,
+            ),
+        )
+
+    def delete(self, conversation_id):
+        self.__connection.execute("DELETE FROM conversations WHERE conversation_id = ?", (conversation_id,))
+
+    def list(self):
+        rows = self.__connection.execute(
+            "SELECT conversation_id, user_id, agent_state, original_message, conversation_reference, seen_events, owner, updated_at "
+            "FROM conversations"
+        ).fetchall()
+        return [self.__from_row(row) for row in rows]
+
+    def owner(self, conversation_id):
+        row = self.__connection.execute("SELECT owner FROM conversations WHERE conversation_id = ?", (conversation_id,)).fetchone()
+        return row[0] if row is not None else None
+
+    def expire(self, before):
+        return self.__connection.execute("DELETE FROM conversations WHERE updated_at < ?", (before,)).rowcount
+
+    def close(self):
+        self.__connection.close()
+
+    @staticmethod
+    def __from_row(row) -> ConversationState:
+        conversation_id, user_id, agent_state, original_message, reference, seen_events, owner, updated_at = row
+        return ConversationState(
+            conversation_id=conversation_id,
+            user_id=user_id,
+            agent_state=agent_state,
+            original_message=original_message,
+            conversation_reference=json.loads(reference) if reference is not None else None,
+            seen_events=json.loads(seen_events) if seen_events else [],
+            owner=owner,
+            updated_at=updated_at,
+        )
@@ -1,7 +1,153 @@
-import requests
+import asyncio, codecs, json, random, time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Dict, Optional
+
+import aiohttp
+
 from .response_type import buildSocketMessageFromDict
+from .metrics import FETCH_MESSAGES, FETCH_TOKEN
+from .backend_pool import DevinBackendPool
+
+@dataclass
+class DevinAPIOptions:
+    # backends come from DevinBackendPool; these options apply to every one of them
+    # connection pool shared by every DevinAPI call and DevinSocket
+    limit: int = 100
+    limit_per_host: int = 20
+    keepalive_timeout: float = 30
+    connect_timeout: float = 5
+    total_timeout: float = 30
+    # per-call retries, further capped by the process-wide retry budget
+    max_retries: int = 2
+    retry_backoff: float = 0.2
+    retry_budget: float = 10
+    retry_budget_refill: float = 0.1
+
+class RetryBudget:
+    """Token bucket that caps retries so a failing backend is not hit with a retry storm."""
+
+    def __init__(self, capacity: float, refill_per_success: float):
+        self.capacity = capacity
+        self.refill_per_success = refill_per_success
+        self.tokens = capacity
+
+    def on_success(self):
+        self.tokens = min(self.capacity, self.tokens + self.refill_per_success)
+
+    def try_spend(self) -> bool:
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+class DevinAPIError(Exception):
+    pass
+
+# header a backend sets when it honoured the `after` cursor of /api/messages
+MESSAGES_AFTER_HEADER = "X-Messages-After"
+
+_decoder = json.JSONDecoder()
+_WHITESPACE = " \t\n\r"
+
+class MessageStream:
+    """
+    Incrementally decodes the `messages` array of an /api/messages response, one message
+    at a time, so a long history is never materialised as a whole.
+    """
+
+    def __init__(self, response: aiohttp.ClientResponse, chunk_size: int = 64 * 1024):
+        self.response = response
+        # whether the backend already dropped the messages up to the requested cursor
+        self.filtered = MESSAGES_AFTER_HEADER in response.headers
+        self.__chunk_size = chunk_size
+
+    def __aiter__(self) -> AsyncIterator[Dict[str, Any]]:
+        return self.__iter_messages()
+
+    async def __iter_messages(self) -> AsyncIterator[Dict[str, Any]]:
+        content = self.response.content
+        # incremental so a multi-byte character split across chunks decodes correctly
+        text_decoder = codecs.getincrementaldecoder("utf-8")()
+        buffer = ""
+        eof = False
+
+        async def read_more() -> bool:
+            nonlocal buffer, eof
+            if eof:
+                return False
+            chunk = await content.read(self.__chunk_size)
+            if not chunk:
+                eof = True
+                buffer += text_decoder.decode(b"", final=True)
+                return False
+            buffer += text_decoder.decode(chunk)
+            return True
+
+        # find the start of the array
+        while True:
+            key = buffer.find('"messages"')
+            start = buffer.find("[", key) if key != -1 else -1
+            if start != -1:
+                pos = start + 1
+                break
+            if not await read_more():
+                raise DevinAPIError("Get messages failed: no messages in response.")
+
+        while True:
+            while True:
+                while pos < len(buffer) and buffer[pos] in _WHITESPACE + ",":
+                    pos += 1
+                if pos < len(buffer):
+                    break
+                if not await read_more():
+                    raise DevinAPIError("Get messages failed: truncated response.")
+            if buffer[pos] == "]":
+                return
+            try:
+                message, end = _decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                if not await read_more():
+                    raise
+                continue
+            # drop what has been decoded so memory stays bounded by one message
+            buffer = buffer[end:]
+            pos = 0
+            yield message
 
 class DevinAPI:
+    options = DevinAPIOptions()
+    __session: Optional[aiohttp.ClientSession] = None
+    __retry_budget = RetryBudget(options.retry_budget, options.retry_budget_refill)
+
+    @staticmethod
+    def configure(options: DevinAPIOptions):
+        DevinAPI.options = options
+        DevinAPI.__retry_budget = RetryBudget(options.retry_budget, options.retry_budget_refill)
+
+    @staticmethod
+    def base_url_for(user_id) -> str:
+        return DevinBackendPool.instance().backend_for(user_id)
+
+    @staticmethod
+    def session() -> aiohttp.ClientSession:
+        if DevinAPI.__session is None or DevinAPI.__session.closed:
+            options = DevinAPI.options
+            connector = aiohttp.TCPConnector(
+                limit=options.limit,
+                limit_per_host=options.limit_per_host,
+                keepalive_timeout=options.keepalive_timeout,
+            )
+            timeout = aiohttp.ClientTimeout(total=options.total_timeout, connect=options.connect_timeout)
+            DevinAPI.__session = aiohttp.ClientSession(connector=connector, timeout=timeout)
+        return DevinAPI.__session
+
+    @staticmethod
+    async def close():
+        if DevinAPI.__session is not None:
+            await DevinAPI.__session.close()
+            DevinAPI.__session = None
+
     @staticmethod
     def build_headers(token):
         return {
@@ -10,24 +156,69 @@ class DevinAPI:
         }
 
     @staticmethod
-    def fetch_token(user_id):
+    async def get_json(path: str, headers: Dict[str, str], params: Optional[Dict[str, str]] = None,
+                       base_url: Optional[str] = None) -> Any:
+        options = DevinAPI.options
+        base_url = base_url or DevinBackendPool.instance().default_url
+        attempt = 0
+        while True:
+            try:
+                async with DevinAPI.session().get(f"{base_url}{path}", headers=headers, params=params) as response:
+                    if response.status < 500:
+                        if response.status != 200:
+                            raise DevinAPIError(f"GET {path} failed with status {response.status}.")
+                        data = await response.json(content_type=None)
+                        DevinAPI.__retry_budget.on_success()
+                        return data
+                    error: Exception = DevinAPIError(f"GET {path} failed with status {response.status}.")
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                DevinBackendPool.instance().report_failure(base_url)
+                error = e
+            if attempt >= options.max_retries or not DevinAPI.__retry_budget.try_spend():
+                raise error
+            attempt += 1
+            await asyncio.sleep(options.retry_backoff * (2 ** (attempt - 1)) * (0.5 + random.random()))
+
+    @staticmethod
+    async def fetch_token(user_id):
         headers = DevinAPI.build_headers('.')
         params = {}
         if user_id:
             params['uid'] = user_id
-        response = requests.get(f"http://localhost:3001/api/auth", headers=headers, params=params)
-        if response.status_code != 200:
-            raise Exception("Get token failed.")
-        data = response.json()
-        return data
-    
-    @staticmethod
-    def fetch_messages(token):
+        started = time.perf_counter()
+        try:
+            return await DevinAPI.get_json("/api/auth", headers, params, base_url=DevinAPI.base_url_for(user_id))
+        except DevinAPIError as e:
+            raise DevinAPIError("Get token failed.") from e
+        finally:
+            FETCH_TOKEN.observe(time.perf_counter() - started)
+
+    @staticmethod
+    @asynccontextmanager
+    async def stream_messages(token, after: Optional[str] = None, user_id=None) -> AsyncIterator[MessageStream]:
+        headers = DevinAPI.build_headers(token)
+        params = {"after": after} if after is not None else None
+        started = time.perf_counter()
+        try:
+            base_url = DevinAPI.base_url_for(user_id) if user_id is not None else DevinBackendPool.instance().default_url
+            async with DevinAPI.session().get(f"{base_url}/api/messages", headers=headers, params=params) as response:
+                if response.status != 200:
+                    raise DevinAPIError("Get messages failed.")
+                yield MessageStream(response)
+        finally:
+            FETCH_MESSAGES.observe(time.perf_counter() - started)
+
+    @staticmethod
+    async def fetch_messages(token, user_id=None):
         headers = DevinAPI.build_headers(token)
-        response = requests.get(f"http://localhost:3001/api/messages", headers=headers)
-        if response.status_code != 200:
-            raise Exception("Get messages failed.")
-        data = response.json()
+        started = time.perf_counter()
+        try:
+            base_url = DevinAPI.base_url_for(user_id) if user_id is not None else None
+            data = await DevinAPI.get_json("/api/messages", headers, base_url=base_url)
+        except DevinAPIError as e:
+            raise DevinAPIError("Get messages failed.") from e
+        finally:
+            FETCH_MESSAGES.observe(time.perf_counter() - started)
         messages = data.get('messages')
         assert messages is not None
         assert isinstance(messages, list)
@@ -36,4 +227,4 @@ class DevinAPI:
             assert payload is not None
             return buildSocketMessageFromDict(payload)
         payloads = map(map_to_socket_message, messages)
-        return list(payloads)
\ No newline at end of file
+        return list(payloads)
@@ -1,48 +1,195 @@
-import jwt, json, os
+import jwt, json, os, time, asyncio, sqlite3
+from abc import ABC, abstractmethod
+from typing import Any, Dict, Optional
 from .devin_api import DevinAPI
 
-class FilePersistentTokenStorage:
-    def __init__(self, filename):
+class PersistentTokenStorage(ABC):
+    @abstractmethod
+    def save_token(self, user_id, token):
+        pass
+
+    @abstractmethod
+    def retrieve_token(self, user_id) -> Optional[str]:
+        pass
+
+    def delete_token(self, user_id):
+        # an empty token is treated as missing
+        self.save_token(user_id, "")
+
+class SqlitePersistentTokenStorage(PersistentTokenStorage):
+    """
+    Token store backed by a SQLite database in WAL mode. Reads and writes touch a single
+    primary-key row, and SQLite's file locking lets several worker processes share it.
+    The calls block; TokenStorage runs them on a worker thread.
+    """
+
+    def __init__(self, filename, migrate_from: Optional[str] = None):
         self.filename = filename
+        self.__connection = sqlite3.connect(filename, timeout=10, isolation_level=None, check_same_thread=False)
+        self.__connection.execute("PRAGMA journal_mode=WAL")
+        self.__connection.execute("PRAGMA synchronous=NORMAL")
+        self.__connection.execute("CREATE TABLE IF NOT EXISTS tokens (user_id TEXT PRIMARY KEY, token TEXT NOT NULL)")
+        self.__connection.execute("CREATE TABLE IF NOT EXISTS migrations (name TEXT PRIMARY KEY)")
+        if migrate_from is not None:
+            self.__migrate_json(migrate_from)
+
+    def __migrate_json(self, filename):
+        # one-time import of tokens.json, a {user_id: token} object written by earlier versions
         if not os.path.exists(filename):
-            with open(filename, 'w') as f:
-                json.dump({}, f)
+            return
+        with self.__connection:
+            self.__connection.execute("BEGIN IMMEDIATE")
+            done = self.__connection.execute("SELECT 1 FROM migrations WHERE name = ?", (filename,)).fetchone()
+            if done is not None:
+                return
+            with open(filename, 'r') as f:
+                data = json.load(f)
+            self.__connection.executemany(
+                "INSERT OR IGNORE INTO tokens (user_id, token) VALUES (?, ?)",
+                [(user_id, token) for user_id, token in data.items() if token],
+            )
+            self.__connection.execute("INSERT INTO migrations (name) VALUES (?)", (filename,))
+            print(f"Migrated {len(data)} tokens from {filename} to {self.filename}")
 
     def save_token(self, user_id, token):
-        with open(self.filename, 'r+') as f:
-            data = json.load(f)
-            data[user_id] = token
-            f.seek(0)
-            json.dump(data, f)
-            f.truncate()
+        self.__connection.execute(
+            "INSERT INTO tokens (user_id, token) VALUES (?, ?) "
+            "ON CONFLICT(user_id) DO UPDATE SET token = excluded.token",
+            (user_id, token),
+        )
+
+    def delete_token(self, user_id):
+        self.__connection.execute("DELETE FROM tokens WHERE user_id = ?", (user_id,))
 
     def retrieve_token(self, user_id):
-        with open(self.filename, 'r') as f:
-            data = json.load(f)
-            return data.get(user_id)
+        row = self.__connection.execute("SELECT token FROM tokens WHERE user_id = ?", (user_id,)).fetchone()
+        return row[0] if row is not None else None
+
+    def close(self):
+        self.__connection.close()
+
+class CachedToken:
+    __slots__ = ("token", "expires_at")
+
+    def __init__(self, token: str, expires_at: Optional[float]):
+        self.token = token
+        self.expires_at = expires_at
+
+    def is_expired(self, now: float) -> bool:
+        return self.expires_at is not None and now >= self.expires_at
+
+    def needs_refresh(self, now: float, refresh_ahead: float) -> bool:
+        return self.expires_at is not None and now >= self.expires_at - refresh_ahead
 
 class TokenStorage:
-    def __init__(self):
-        self.__storage = FilePersistentTokenStorage("tokens.json")
+    # refresh tokens this many seconds before their `exp` claim
+    REFRESH_AHEAD_SECONDS = 300
+
+    __instance: Optional["TokenStorage"] = None
+
+    def __init__(self, storage: Optional[PersistentTokenStorage] = None):
+        self.__storage = storage or SqlitePersistentTokenStorage("tokens.db", migrate_from="tokens.json")
+        self.__cache: Dict[str, CachedToken] = {}
+        self.__in_flight: Dict[str, asyncio.Task] = {}
+        # last pending write per user; writes for one user run in order
+        self.__writes: Dict[str, asyncio.Task] = {}
+
+    @staticmethod
+    def instance() -> "TokenStorage":
+        # process-wide storage so every socket and handler shares one cache
+        if TokenStorage.__instance is None:
+            TokenStorage.__instance = TokenStorage()
+        return TokenStorage.__instance
 
     @staticmethod
-    def __validate_token(token):
+    def __decode_token(token) -> Optional[Dict[str, Any]]:
         try:
             claims = jwt.decode(token, options={"verify_signature": False})
-            return not (claims.get('sid') is None or claims.get('sid') == '')
+            if claims.get('sid') is None or claims.get('sid') == '':
+                return None
+            return claims
         except Exception:
-            return False
+            return None
+
+    @staticmethod
+    def __to_cached_token(token) -> Optional[CachedToken]:
+        claims = TokenStorage.__decode_token(token)
+        if claims is None:
+            return None
+        exp = claims.get('exp')
+        cached = CachedToken(token, float(exp) if exp is not None else None)
+        if cached.is_expired(time.time()):
+            return None
+        return cached
+
+    async def get_token(self, user_id):
+        cached = self.__cache.get(user_id)
+        now = time.time()
+        if cached is not None and not cached.is_expired(now):
+            if cached.needs_refresh(now, self.REFRESH_AHEAD_SECONDS):
+                self.__start_fetch(user_id, use_storage=False)
+            return cached.token
+        return await asyncio.shield(self.__start_fetch(user_id, use_storage=cached is None))
+
+    def invalidate(self, user_id, persisted: bool = False):
+        self.__cache.pop(user_id, None)
+        if persisted:
+            # e.g. the user moved to another backend, which won't accept the stored token
+            self.__write(user_id, self.__storage.delete_token)
+
+    def __start_fetch(self, user_id, use_storage: bool) -> asyncio.Task:
+        # single-flight: concurrent callers for the same user share one fetch
+        task = self.__in_flight.get(user_id)
+        if task is None:
+            task = asyncio.create_task(self.__fetch_token(user_id, use_storage))
+            self.__in_flight[user_id] = task
+            task.add_done_callback(lambda t: self.__on_fetch_done(user_id, t))
+        return task
+
+    def __on_fetch_done(self, user_id, task: asyncio.Task):
+        if self.__in_flight.get(user_id) is task:
+            del self.__in_flight[user_id]
+        if not task.cancelled() and task.exception() is not None:
+            print(f"Token fetch failed for {user_id}: {task.exception()}")
+
+    def __write(self, user_id, operation, *args) -> asyncio.Task:
+        previous = self.__writes.get(user_id)
+
+        async def run():
+            if previous is not None:
+                await asyncio.wait([previous])
+            await asyncio.to_thread(operation, user_id, *args)
+
+        task = asyncio.create_task(run())
+        self.__writes[user_id] = task
+        task.add_done_callback(lambda t: self.__on_write_done(user_id, t))
+        return task
+
+    def __on_write_done(self, user_id, task: asyncio.Task):
+        if self.__writes.get(user_id) is task:
+            del self.__writes[user_id]
+        if not task.cancelled() and task.exception() is not None:
+            print(f"Token storage write failed for {user_id}: {task.exception()}")
 
-    def get_token(self, user_id):
-        token = self.__storage.retrieve_token(user_id) or ""
-        if self.__validate_token(token):
-            return token
+    async def __fetch_token(self, user_id, use_storage: bool) -> str:
+        if use_storage:
+            pending = self.__writes.get(user_id)
+            if pending is not None:
+                await asyncio.wait([pending])
+            stored = await asyncio.to_thread(self.__storage.retrieve_token, user_id)
+            cached = self.__to_cached_token(stored or "")
+            if cached is not None:
+                self.__cache[user_id] = cached
+                return cached.token
 
-        data = DevinAPI.fetch_token(user_id)
+        data = await DevinAPI.fetch_token(user_id)
         if data.get('token') is None or data.get('token') == '':
             raise Exception("Get token failed.")
         new_token = data.get('token')
-        if self.__validate_token(new_token):
-            self.__storage.save_token(user_id, new_token)
+        cached = self.__to_cached_token(new_token)
+        if cached is not None:
+            # the cache serves the token while it is written behind
+            self.__write(user_id, self.__storage.save_token, new_token)
+            self.__cache[user_id] = cached
             return new_token
-        raise Exception("Token validation failed.")
\ No newline at end of file
+        raise Exception("Token validation failed.")
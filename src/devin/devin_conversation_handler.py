@@ -3,201 +3,743 @@ from botbuilder.schema import (
     ConversationReference,
     Activity
 )
-from typing import Optional, List, Dict, Any
+from collections import deque
+from typing import Optional, List, Deque, Dict, Any, Iterable, Tuple
 
-from .devin_socket import DevinSocket
+from .socket_manager import DevinSocketManager
 from .agent_state import AgentState, is_agent_state_command
 from .action_type import ActionType
 from .observation_type import ObservationType
 from .commands import send_message, initialize_agent, clear_messages, start_message, stop_task
 from .response_type import buildSocketMessage, DevinSocketMessage, ActionMessage, ObservationMessage
 from .devin_auth import TokenStorage
-from .devin_api import DevinAPI
+from .history import MessageHistory
+from .progress_coalescer import ProgressCoalescer, ProgressEntry
+from .outbound_queue import OutboundQueue, OutboundPriority
+from .artifact_store import ArtifactStore
+from .metrics import EVENT_DECODE, AGENT_QUEUE_WAIT
+from .conversation_state import ConversationState, ConversationStateStore
+from .event_dedupe import EventDeduper
+from .agent_scheduler import AgentScheduler, AgentTicket
+from .tracing import Tracer, Span
+from .warm_pool import WarmAgentPool, WARM, WARMING
+from .event_log import EventLog
+from .chat_commands import ChatCommand, parse_chat_command, STATUS
 
-import asyncio
-
-def call_async(coro):
-    try:
-        loop = asyncio.get_running_loop()
-    except RuntimeError:
-        return asyncio.run(coro)
-    else:
-        return loop.run_until_complete(coro)
+import asyncio, time
 
 TERMINAL_STATES = [AgentState.INIT.value, AgentState.STOPPED.value, AgentState.ERROR.value, AgentState.FINISHED.value]
+# cards with these icons are batched into the live progress card instead of sent one by one
+PROGRESS_ICONS = ["Glasses", "Folder"]
+# UTF-8 bytes of agent text per card, per progress row and per notification summary;
+# longer text is cut and the full text linked from the artifact store
+CARD_TEXT_BUDGET = 8 * 1024
+PROGRESS_ENTRY_BUDGET = 1024
+SUMMARY_BUDGET = 256
+ELLIPSIS = "\u2026"
     
 class DevinConversationHandler:
     def __init__(self, 
                  context: TurnContext,
                  conversation_reference: Optional[ConversationReference], 
-                 agent_state: Optional[AgentState],
-                 app_id: str) -> None:
-        self.__context = context
+                 agent_state: Optional[str],
+                 app_id: str,
+                 progress_debounce: float = 3.0,
+                 outbound_queue_size: int = 50,
+                 original_message: Optional[str] = None,
+                 state_store: Optional[ConversationStateStore] = None,
+                 max_pending_messages: int = 20,
+                 seen_events: Iterable[str] = (),
+                 dedupe_capacity: int = 512,
+                 owner: Optional[str] = None,
+                 state_save_delay: float = 3.0) -> None:
+        # keep only what proactive sends need, not the TurnContext of the first message
+        self.__adapter = context.adapter
         self.__user_id = context.activity.from_property.aad_object_id # type: ignore
-        self.__socket = DevinSocket(self.__user_id)
+        # one socket per user, shared with the user's other conversations
+        self.__socket = DevinSocketManager.instance().acquire(self.__user_id)
         self.__conversation_reference = conversation_reference
-        self.__agent_state = agent_state or AgentState.INIT.value
+        self.__agent_state: Optional[str] = agent_state or AgentState.INIT.value
         self.__app_id = app_id
-        self.__socket.register_callback("receive", lambda _, event: self.__on_handle_assistant_message(event))
-        self.__socket.register_callback("disconnect", lambda _, event: self.__on_close_socket(event))
-        self.__socket.register_callback("connect", lambda _: self.__on_connect())
-        self.__socket.initialize()
+        # task text waiting for the agent to reach INIT; cleared once the task is started
+        self.__original_message = original_message
+        self.__state_store = state_store
+        # worker id saved with the state; released once another worker took the conversation
+        self.__owner = owner
+        self.__released = False
+        # backend the agent session lives on, to notice when the user is moved
+        self.__backend_url: Optional[str] = None
+        # user messages received before the agent state was caught up, with the time received
+        self.__pending: Deque[Tuple[str, int]] = deque()
+        self.__max_pending_messages = max_pending_messages
+        self.__ready = asyncio.Event()
+        self.__initializer: Optional[asyncio.Task] = None
+        self.__processor: Optional[asyncio.Task] = None
+        # agent events already handled, so replays never become a second card
+        self.__deduper = EventDeduper(dedupe_capacity, seen_events)
+        # saves of newly seen events are batched, at most one per `state_save_delay` seconds
+        self.__state_save_delay = state_save_delay
+        self.__state_saver: Optional[asyncio.Task] = None
+        # agent slot held by (or waited for by) this conversation's task
+        self.__ticket: Optional[AgentTicket] = None
+        self.__admission: Optional[asyncio.Task] = None
+        # delivery of the queue position card, updated in place while waiting
+        self.__queue_card: Optional[asyncio.Future] = None
+        self.__queue_updates: set = set()
+        # trace of the current task and the span of the stage it is in
+        self.__trace: Optional[Span] = None
+        self.__stage: Optional[Span] = None
+        # when initialize_agent was sent cold, and when the task began and whether it was warm
+        self.__initialize_sent: Optional[int] = None
+        self.__first_card: Optional[Tuple[int, bool]] = None
+        # recent agent events, to answer `status` and `last N` without the backend
+        self.__events = EventLog.for_conversation(conversation_reference.conversation.id if conversation_reference else None)
+        self.__task_text: Optional[str] = None
+        self.__task_started_at: Optional[float] = None
+        self.__last_activity = time.monotonic()
+        self.__outbound = OutboundQueue(
+            self.__adapter,
+            self.__conversation_reference,
+            self.__app_id,
+            max_size=outbound_queue_size,
+        )
+        self.__progress = ProgressCoalescer(
+            self.__send_progress_card,
+            self.__update_progress_card,
+            build_progress_card,
+            debounce=progress_debounce,
+        )
+        self.__callbacks = {
+            "receive": lambda _, event: self.__on_handle_assistant_message(event),
+            "disconnect": lambda socket: self.__on_close_socket(socket),
+            "connect": lambda _: self.__on_connect(),
+        }
+        for event, callback in self.__callbacks.items():
+            self.__socket.register_callback(event, callback)
+        self.__save_state()
+
+    async def initialize(self):
+        if self.__socket.is_connected():
+            # the user's socket is already open for another conversation, just catch up
+            await self.__on_connect()
+        else:
+            await self.__socket.initialize()
+
+    def start(self):
+        """Connect in the background; messages wait in the pending queue until caught up."""
+        if self.__initializer is None:
+            self.__initializer = asyncio.get_running_loop().create_task(self.initialize())
+
+    async def close(self):
+        for task in (self.__initializer, self.__processor, self.__admission, self.__state_saver, *self.__queue_updates):
+            if task is not None:
+                task.cancel()
+        self.__release_slot()
+        self.__end_trace("closed")
+        # a running task keeps its state and dedupe window for whichever worker picks it up next
+        self.__save_state()
+        self.__progress.cancel()
+        self.__events.close()
+        await self.__outbound.close()
+        for event, callback in self.__callbacks.items():
+            self.__socket.unregister_callback(event, callback)
+        await DevinSocketManager.instance().release(self.__user_id)
+
+    async def release(self):
+        """Close without saving state, because another worker now runs the conversation."""
+        self.__released = True
+        await self.close()
+
+    @property
+    def conversation_id(self) -> Optional[str]:
+        return self.__conversation_reference.conversation.id if self.__conversation_reference else None
+
+    @property
+    def last_activity(self) -> float:
+        return self.__last_activity
+
+    @property
+    def outbound(self) -> OutboundQueue:
+        return self.__outbound
+
+    @property
+    def agent_state(self) -> Optional[str]:
+        return self.__agent_state
+
+    @property
+    def deduper(self) -> EventDeduper:
+        return self.__deduper
     
     async def handle_message(self, context: TurnContext, message: str):
+        """
+        Queue a user message. It is handled in order once the agent state is known,
+        and replies are sent proactively, so the webhook returns right away.
+        """
+        self.__last_activity = time.monotonic()
+        command = parse_chat_command(message)
+        if command is not None:
+            # answered from local state right away, even while still connecting
+            await self.__reply(self.__answer_chat_command(command))
+            return
+        if len(self.__pending) >= self.__max_pending_messages:
+            await context.send_activity("Still connecting to the agent. Please wait a moment before sending more messages.")
+            return
+        self.__pending.append((message, time.perf_counter_ns()))
+        if self.__processor is None or self.__processor.done():
+            self.__processor = asyncio.get_running_loop().create_task(self.__process_pending())
+        self.start()
+
+    async def __process_pending(self):
+        await self.__ready.wait()
+        while self.__pending:
+            message, received = self.__pending.popleft()
+            try:
+                await self.__handle_pending_message(message, received)
+            except Exception as e:
+                print(f"Error handling message: {e}")
+
+    async def __handle_pending_message(self, message: str, received: Optional[int] = None):
         if (is_agent_state_command(message)):
-            await self._handle_command(context, message)
+            await self._handle_command(message)
             return
         
         if (self.__agent_state == AgentState.AWAITING_USER_INPUT.value):
             print(f"Got task message responding to user input {message}")
-            self.__socket.send(send_message(message))
+            await self.__socket.send(send_message(message))
             return
         
-        if (self.__is_running()):
-            await context.send_activity('There is already a task running. Please wait until it finishes. Or use a command to interrupt it')
+        # a task waiting for the agent to initialize counts as running too
+        if (self.__is_running() or self.__original_message is not None):
+            await self.__reply('There is already a task running. Please wait until it finishes. Or use a command to interrupt it')
             return
-        await self._handle_new_task(message)
+        await self._handle_new_task(message, received)
     
-    async def _handle_command(self, context: TurnContext, command: str):
+    async def _handle_command(self, command: str):
         print(f"Got task command {command}")
         if (command == AgentState.STOPPED.value):
-            self.__socket.send(stop_task())
-            await context.send_activity("Task stopped.")
+            self.__original_message = None
+            self.__save_state()
+            if self.__ticket is not None and not self.__ticket.granted:
+                self.__release_slot()
+                self.__end_trace("dequeued")
+                await self.__reply("Task removed from the queue.")
+                return
+            # a task stopped before the agent ran never reports a terminal state
+            if not self.__is_running():
+                self.__release_slot()
+                self.__end_trace(AgentState.STOPPED.value)
+            await self.__socket.send(stop_task())
+            await self.__reply("Task stopped.")
         else:
-            await self.__context.send_activity("There is no task running. Please start a task first.")
+            await self.__reply("There is no task running. Please start a task first.")
+
+    def __answer_chat_command(self, command: ChatCommand) -> str:
+        now = time.time()
+        if command.name == STATUS:
+            if self.__ticket is not None and not self.__ticket.granted:
+                lines = [f"Waiting for a free agent, number {self.__ticket.position} in line."]
+            elif self.__original_message is not None:
+                lines = ["Starting the agent for your task."]
+            else:
+                lines = [f"The agent is {self.__agent_state}."]
+            if self.__task_text is not None and self.__task_started_at is not None:
+                lines.append(f"Task, sent {format_age(now - self.__task_started_at)} ago: {cut_text(self.__task_text, SUMMARY_BUDGET)[0]}")
+            latest = self.__events.latest()
+            if latest is not None:
+                lines.append(f"Last event, {format_age(now - latest.at)} ago: {latest.kind} {latest.summary}".rstrip())
+            counts = self.__events.window_counts()
+            counts.pop(ObservationType.AGENT_STATE_CHANGED.value, None)
+            if counts:
+                lines.append("Recent events: " + ", ".join(f"{kind} {count}" for kind, count in sorted(counts.items(), key=lambda item: -item[1])))
+            return "\n\n".join(lines)
+        records = self.__events.last(command.count, command.kind)
+        if not records:
+            return "No agent events yet."
+        return "\n\n".join(f"{format_age(now - record.at)} ago, {record.kind}: {record.summary}".rstrip() for record in records)
+
+    async def __reply(self, text: str):
+        delivery = await self.__outbound.enqueue(lambda context: context.send_activity(text), OutboundPriority.MESSAGE)
+        self.__trace_delivery(delivery, "reply")
             
-    async def _handle_new_task(self, message: str):
+    async def _handle_new_task(self, message: str, received: Optional[int] = None):
         self.__original_message = message
-        self.__socket.send(initialize_agent())
+        self.__save_state()
+        self.__end_trace("replaced")
+        self.__trace = Tracer.instance().start_trace(
+            "task",
+            started=received,
+            user_id=self.__user_id,
+            conversation_id=self.__conversation_reference.conversation.id if self.__conversation_reference else None,
+        )
+        if received is not None:
+            # from the webhook to the agent state being known
+            self.__trace.child("connect", started=received).end()
+        WarmAgentPool.instance().record_task(self.__user_id)
+        self.__task_text = message
+        self.__task_started_at = time.time()
+        self.__first_card = (received if received is not None else time.perf_counter_ns(), False)
+        self.__next_stage("queue")
+        await self.__admit()
+
+    async def __admit(self):
+        """Request an agent slot for the task in `__original_message`; it starts once granted."""
+        # a task sent while the previous one waits or runs gives up that one's place or slot
+        if self.__admission is not None:
+            self.__admission.cancel()
+            self.__admission = None
+        self.__release_slot()
+        self.__ticket = AgentScheduler.instance().request(self.__user_id, self.__on_queue_update)
+        if self.__ticket.granted:
+            AGENT_QUEUE_WAIT.observe(0)
+            await self.__start_agent()
+            return
+        self.__admission = asyncio.get_running_loop().create_task(self.__wait_for_slot(self.__ticket))
+
+    async def __resume_pending_task(self):
+        """Queue a task restored from saved state that had not started yet, like a new one."""
+        if self.__original_message is None or self.__ticket is not None or self.__admission is not None:
+            return
+        if self.__is_working():
+            # the agent went on with something else, so the saved task would never start
+            await self.__drop_pending_task()
+            return
+        print("Resuming a task that had not started yet")
+        await self.__admit()
+
+    async def __drop_pending_task(self):
+        self.__original_message = None
+        self.__save_state()
+        await self.__reply("Your task could not be resumed after a restart. Please send it again.")
+
+    async def __wait_for_slot(self, ticket: AgentTicket):
+        try:
+            await ticket.future
+        except asyncio.CancelledError:
+            return
+        AGENT_QUEUE_WAIT.observe(time.monotonic() - ticket.queued_at)
+        print(f"Agent slot granted after {time.monotonic() - ticket.queued_at:.1f}s")
+        card, self.__queue_card = self.__queue_card, None
+        if card is not None:
+            self.__track_queue_update(self.__show_queue_status("An agent is free, starting your task.", card))
+        await self.__start_agent()
+
+    async def __start_agent(self):
+        status = WarmAgentPool.instance().claim(self.__user_id)
+        if status == WARM and self.__agent_state == AgentState.INIT.value and self.__original_message is not None:
+            # initialised after the previous task and idle since, start right away
+            if self.__trace is not None:
+                self.__trace.attributes["warm"] = True
+            if self.__first_card is not None:
+                self.__first_card = (self.__first_card[0], True)
+            await self.__start_task()
+            return
+        self.__next_stage("initialize")
+        if status == WARMING:
+            # the INIT of the pre-warm is on its way and starts the task
+            return
+        self.__initialize_sent = time.perf_counter_ns()
+        await self.__socket.send(initialize_agent())
+
+    async def __start_task(self):
+        self.__next_stage("start")
+        print("Clearing messages...")
+        await self.__socket.send(clear_messages())
+        print("Sending start message...")
+        task = self.__original_message
+        # start each task once, even if INIT is observed again (e.g. on catch up)
+        self.__original_message = None
+        self.__save_state()
+        await self.__socket.send(start_message(task))
+
+    async def __prewarm(self):
+        pool = WarmAgentPool.instance()
+        # any handler of the user may see the task end; the pool warms the agent once
+        if self.__original_message is not None or self.__ticket is not None or not pool.should_warm(self.__user_id):
+            return
+        if AgentScheduler.instance().is_waiting(self.__user_id):
+            # the next task is already in line and initialises the agent once it gets a slot
+            return
+        print("Pre-warming agent for the next task...")
+        pool.mark_warming(self.__user_id)
+        await self.__socket.send(initialize_agent())
+
+    def __on_queue_update(self, position: int, eta: float):
+        text = f"All agents are busy. Your task is number {position} in line and should start in {format_eta(eta)}."
+        if self.__queue_card is None:
+            self.__queue_card = asyncio.ensure_future(self.__send_progress_card(build_adaptive_card(text, "Clock")))
+            return
+        self.__track_queue_update(self.__show_queue_status(text, self.__queue_card))
+
+    def __track_queue_update(self, update):
+        task = asyncio.get_running_loop().create_task(update)
+        self.__queue_updates.add(task)
+        task.add_done_callback(self.__queue_updates.discard)
+
+    async def __show_queue_status(self, text: str, card: asyncio.Future):
+        try:
+            activity_id = await card
+            if activity_id is not None:
+                await self.__update_progress_card(activity_id, build_adaptive_card(text, "Clock"))
+        except Exception as e:
+            print(f"Could not update queue position: {e}")
+
+    def __release_slot(self):
+        if self.__ticket is None:
+            return
+        AgentScheduler.instance().release(self.__ticket)
+        self.__ticket = None
+
+    def __track_slot(self):
+        ticket = self.__ticket
+        if ticket is None and self.__is_working():
+            # a task taken over from another worker or from before a restart
+            self.__ticket = AgentScheduler.instance().adopt(self.__user_id)
+            return
+        if ticket is None or not ticket.granted:
+            return
+        if self.__is_working():
+            ticket.saw_running = True
+        # INIT is terminal too, but it is also the state a granted task starts from
+        elif ticket.saw_running or self.__agent_state == AgentState.ERROR.value:
+            self.__release_slot()
+
+    def __next_stage(self, name: str):
+        if self.__stage is not None:
+            self.__stage.end()
+        self.__stage = self.__trace.child(name) if self.__trace is not None else None
+
+    def __end_trace(self, outcome: str):
+        if self.__trace is None:
+            return
+        if self.__stage is not None:
+            self.__stage.end()
+            self.__stage = None
+        self.__trace.end(outcome=outcome)
+        self.__trace = None
+
+    def __track_trace(self):
+        if self.__trace is None:
+            return
+        stage = self.__stage.name if self.__stage is not None else None
+        if self.__is_running() and stage == "start":
+            self.__next_stage("run")
+        # a FINISHED caught up before the task started belongs to the previous task
+        elif self.__agent_state == AgentState.ERROR.value or (
+            self.__agent_state in (AgentState.FINISHED.value, AgentState.STOPPED.value) and stage in ("start", "run")
+        ):
+            self.__end_trace(self.__agent_state)
+
+    def __trace_delivery(self, delivery: asyncio.Future, name: str, **attributes):
+        if self.__trace is None:
+            return
+        span = self.__trace.child(name, **attributes)
+        delivery.add_done_callback(lambda future: span.end(outcome=delivery_outcome(future)))
     
-    def __on_handle_assistant_message(self, event):
+    async def __on_handle_assistant_message(self, event):
         assert isinstance(event, str)
+        self.__last_activity = time.monotonic()
+        started = time.perf_counter()
         socket_message = buildSocketMessage(event)
-        if isinstance(socket_message, ObservationMessage) and socket_message.observation == ObservationType.AGENT_STATE_CHANGED.value:
-            self._handle_assistant_state_changed(socket_message)
+        EVENT_DECODE.observe(time.perf_counter() - started)
+        is_state_change = isinstance(socket_message, ObservationMessage) and socket_message.observation == ObservationType.AGENT_STATE_CHANGED.value
+        key = EventDeduper.key(socket_message.id, socket_message.timestamp, event)
+        if key is not None:
+            if self.__deduper.seen(key):
+                return
+            # a crash then only replays the events of the last few seconds
+            self.__save_state_soon()
+        MessageHistory.instance().observe(self.__user_id, socket_message)
+        self.__record_event(socket_message)
+        if is_state_change:
+            assert isinstance(socket_message, ObservationMessage)
+            await self._handle_assistant_state_changed(socket_message)
             
         if self.__is_running() or (isinstance(socket_message, ActionMessage) and socket_message.action == ActionType.FINISH.value):
-            self._handle_assistant_message(socket_message)
+            await self._handle_assistant_message(socket_message)
         
-    def _handle_assistant_state_changed(self, socket_message: ObservationMessage):
+    def __record_event(self, socket_message: DevinSocketMessage):
+        # a short summary only, never the frame or the observation content
+        if isinstance(socket_message, ActionMessage):
+            self.__events.append(socket_message.action, socket_message.args.get('thought') or socket_message.message)
+        elif socket_message.observation == ObservationType.AGENT_STATE_CHANGED.value:
+            self.__events.append(socket_message.observation, (socket_message.extras or {}).get('agent_state') or "")
+        else:
+            self.__events.append(socket_message.observation, socket_message.message or "")
+
+    async def _handle_assistant_state_changed(self, socket_message: ObservationMessage):
         if socket_message.extras is not None and socket_message.extras.get('agent_state') is not None:
             # keep track of the agent_state
-            if self.__agent_state != socket_message.extras.get('agent_state'):
+            changed = self.__agent_state != socket_message.extras.get('agent_state')
+            if changed:
                 print(f"Agent state changed to {socket_message.extras.get('agent_state')}")
             self.__agent_state = socket_message.extras.get('agent_state')
+            self.__track_slot()
+            self.__track_trace()
             
-            if self.__agent_state == AgentState.INIT.value:
-                print("Clearing messages...")
-                self.__socket.send(clear_messages())
-                print("Sending start message...")
-                self.__socket.send(start_message(self.__original_message))
+            # a task starts once its slot is granted; an INIT before that only makes the agent warm
+            granted = self.__ticket is not None and self.__ticket.granted
+            if self.__agent_state == AgentState.INIT.value and self.__original_message is not None and granted:
+                if self.__initialize_sent is not None:
+                    WarmAgentPool.instance().observe_cold_start((time.perf_counter_ns() - self.__initialize_sent) / 1e9)
+                    self.__initialize_sent = None
+                await self.__start_task()
                 return True
-            elif self.__agent_state == AgentState.FINISHED.value or self.__agent_state == AgentState.STOPPED.value:
+            if self.__agent_state == AgentState.INIT.value:
+                WarmAgentPool.instance().mark_warm(self.__user_id)
+            if changed:
+                self.__save_state()
+            if self.__agent_state == AgentState.FINISHED.value or self.__agent_state == AgentState.STOPPED.value:
+                if changed:
+                    await self.__prewarm()
                 return True
         return False # indicate that this is not a terminal state
     
-    def _handle_assistant_message(self, socket_message: DevinSocketMessage):
-        message_to_send = None
-        if isinstance(socket_message, ActionMessage):
-            args_content = socket_message.args.get('content')
-            wait_for_response = socket_message.args.get('wait_for_response')
-            message = socket_message.message
-            thought = socket_message.args.get('thought')
-            match socket_message.action:
-                case ActionType.INIT.value:
-                    pass
-                case ActionType.MESSAGE.value:
-                    if args_content is not None:
-                        message_to_send = build_adaptive_card(args_content, "QuestionCircle" if wait_for_response else "Lightbulb")
-                case ActionType.FINISH.value:
-                    message_to_send = build_adaptive_card(message, "CheckboxChecked")
-                case ActionType.CHANGE_AGENT_STATE.value:
-                    pass
-                case _:
-                    if thought:
-                        message_to_send = build_adaptive_card(thought, "Glasses")
-        elif isinstance(socket_message, ObservationMessage) and socket_message.message is not None and socket_message.message != '':
-            message = socket_message.message
-            match socket_message.observation:
-                case ObservationType.RUN.value:
-                    pass
-                case ObservationType.AGENT_STATE_CHANGED.value:
-                    pass
-                case ObservationType.BROWSE.value:
-                    pass
-                case ObservationType.WRITE.value:
-                    message_to_send = build_adaptive_card(message, "Folder")
-                case _:
-                    if message:
-                        message_to_send = build_adaptive_card(message, "Glasses")
-
-        if message_to_send:
-            call_async(self.__context.adapter.continue_conversation(
-                self.__conversation_reference,
-                lambda context: context.send_activity(message_to_send),
-                self.__app_id,
-            ))
+    async def _handle_assistant_message(self, socket_message: DevinSocketMessage):
+        card = card_for_message(socket_message)
+        if card is None:
+            return
+        if self.__first_card is not None:
+            started, warm = self.__first_card
+            self.__first_card = None
+            WarmAgentPool.instance().observe_first_card((time.perf_counter_ns() - started) / 1e9, warm)
+        text, icon = card
+        if icon in PROGRESS_ICONS:
+            self.__progress.add(text, icon)
+            return
+        # don't hold pending progress back for the debounce interval behind this card
+        if icon == "CheckboxChecked":
+            # wait for the last batch, which goes out at PROGRESS priority, so the finished card comes last
+            try:
+                await self.__progress.reset()
+            except Exception as e:
+                print(f"Failed to flush progress card: {e}")
+        else:
+            self.__progress.flush_soon()
+        priority = OutboundPriority.QUESTION if icon == "QuestionCircle" else OutboundPriority.MESSAGE
+        activity = build_adaptive_card(text, icon)
+        # only waits for queue space, delivery happens on the conversation's outbound worker
+        delivery = await self.__outbound.enqueue(lambda context: context.send_activity(activity), priority)
+        self.__trace_delivery(delivery, "card", icon=icon)
+
+    async def __send_progress_card(self, activity: Activity) -> Optional[str]:
+        delivery = await self.__outbound.enqueue(
+            lambda context: context.send_activity(activity),
+            OutboundPriority.PROGRESS,
+        )
+        self.__trace_delivery(delivery, "progress_card")
+        response = await delivery
+        return response.id if response is not None else None
+
+    async def __update_progress_card(self, activity_id: str, activity: Activity):
+        activity.id = activity_id
+        delivery = await self.__outbound.enqueue(
+            lambda context: context.update_activity(activity),
+            OutboundPriority.PROGRESS,
+            merge_key=f"update-{activity_id}",
+        )
+        self.__trace_delivery(delivery, "progress_update")
+        await delivery
     
-    def __on_close_socket(self, event):
+    def __save_state_soon(self):
+        if self.__state_store is not None and self.__state_saver is None:
+            self.__state_saver = asyncio.get_running_loop().create_task(self.__save_state_later())
+
+    async def __save_state_later(self):
+        await asyncio.sleep(self.__state_save_delay)
+        self.__state_saver = None
+        self.__save_state()
+
+    def __save_state(self):
+        """Store what another worker needs to resume the task, or forget the conversation if there is none."""
+        if self.__state_store is None or self.__conversation_reference is None or self.__released:
+            return
+        try:
+            if not self.__is_running() and self.__original_message is None:
+                # finished or never started; a new message builds a fresh handler
+                self.__state_store.delete(self.__conversation_reference.conversation.id)
+                return
+            self.__state_store.save(ConversationState(
+                conversation_id=self.__conversation_reference.conversation.id,
+                user_id=self.__user_id,
+                agent_state=self.__agent_state,
+                original_message=self.__original_message,
+                conversation_reference=self.__conversation_reference.serialize(),
+                seen_events=self.__deduper.snapshot(),
+                owner=self.__owner,
+            ))
+        except Exception as e:
+            # state is best effort, the conversation keeps working on this worker
+            print(f"Could not save conversation state: {e}")
+
+    async def __on_close_socket(self, socket):
         print("Socket closed for agent")
         
-    def __on_connect(self):
-        token = TokenStorage().get_token(self.__user_id)
-        messages = DevinAPI.fetch_messages(token)
-        for message in messages:
-            if isinstance(message, ObservationMessage) and message.observation == ObservationType.AGENT_STATE_CHANGED.value:
-                self._handle_assistant_state_changed(message)
+    async def __on_connect(self):
+        moved = self.__backend_url is not None and self.__backend_url != self.__socket.backend_url
+        self.__backend_url = self.__socket.backend_url
+        if moved:
+            # event ids are per backend, and so are idle agents
+            self.__deduper.clear()
+            WarmAgentPool.instance().forget(self.__user_id)
+        if moved and self.__is_running():
+            # the agent session died with its backend
+            self.__agent_state = AgentState.STOPPED.value
+            self.__release_slot()
+            self.__end_trace("backend_lost")
+            self.__save_state()
+            activity = build_adaptive_card("The agent's backend became unavailable and the task was interrupted. Please send it again.", "Warning")
+            await self.__outbound.enqueue(lambda context: context.send_activity(activity), OutboundPriority.MESSAGE)
+        try:
+            token = await TokenStorage.instance().get_token(self.__user_id)
+            # only the newest agent state matters, fetched incrementally from the last cursor
+            state_message = await MessageHistory.instance().catch_up(self.__user_id, token)
+            if state_message is not None:
+                await self._handle_assistant_state_changed(state_message)
+            self.__track_slot()
+            await self.__resume_pending_task()
+        except Exception:
+            if self.__original_message is not None and self.__ticket is None:
+                await self.__drop_pending_task()
+            raise
+        finally:
+            # handle waiting messages even if catching up failed, with the state we have
+            self.__ready.set()
         
     def __is_running(self):
+        if self.__agent_state == AgentState.LOADING.value and WarmAgentPool.instance().is_warming(self.__user_id):
+            # an idle agent being pre-warmed, not a task
+            return False
         return self.__agent_state not in TERMINAL_STATES and self.__agent_state is not None
 
-def build_adaptive_card(msg: str, icon: str, is_important: Optional[bool] = None, url: Optional[str] = None) -> Activity:
-    body: List[Dict[str, Any]] = [
-        {
-            "type": "ColumnSet",
-            "columns": [
-                {
-                    "type": "Column",
-                    "width": "auto",
-                    "items": [
-                        {
-                            "type": "Icon",
-                            "name": f"{icon}",
-                            "style": "Regular",
-                            "color": "Accent",
-                        },
-                    ],
-                },
-                {
-                    "type": "Column",
-                    "width": "stretch",
-                    "items": [
-                        {
-                            "type": "TextBlock",
-                            "text": f"{msg}",
-                            "wrap": True,
-                            "fontType": "Monospace",
-                            "weight": "Lighter",
-                            "isSubtle": True,
-                        },
-                    ],
-                },
-            ],
-        },
-    ]
+    def __is_working(self):
+        # LOADING is the agent initialising, before any task was started
+        return self.__is_running() and self.__agent_state != AgentState.LOADING.value
+
+def card_for_message(socket_message: DevinSocketMessage) -> Optional[ProgressEntry]:
+    """The text and icon of the card for an agent event, or None if it gets no card."""
+    card: Optional[ProgressEntry] = None
+    if isinstance(socket_message, ActionMessage):
+        args_content = socket_message.args.get('content')
+        wait_for_response = socket_message.args.get('wait_for_response')
+        message = socket_message.message
+        thought = socket_message.args.get('thought')
+        match socket_message.action:
+            case ActionType.INIT.value:
+                pass
+            case ActionType.MESSAGE.value:
+                if args_content is not None:
+                    card = (args_content, "QuestionCircle" if wait_for_response else "Lightbulb")
+            case ActionType.FINISH.value:
+                card = (message, "CheckboxChecked")
+            case ActionType.CHANGE_AGENT_STATE.value:
+                pass
+            case _:
+                if thought:
+                    card = (thought, "Glasses")
+    elif isinstance(socket_message, ObservationMessage) and socket_message.message is not None and socket_message.message != '':
+        message = socket_message.message
+        match socket_message.observation:
+            case ObservationType.RUN.value:
+                pass
+            case ObservationType.AGENT_STATE_CHANGED.value:
+                pass
+            case ObservationType.BROWSE.value:
+                pass
+            case ObservationType.WRITE.value:
+                card = (message, "Folder")
+            case _:
+                if message:
+                    card = (message, "Glasses")
+    return card
 
+def delivery_outcome(delivery: asyncio.Future) -> str:
+    if delivery.cancelled():
+        return "cancelled"
+    if delivery.exception() is not None:
+        return "failed"
+    return "dropped" if delivery.result() is None else "delivered"
+
+def format_age(seconds: float) -> str:
+    if seconds < 60:
+        return f"{max(0, int(seconds))}s"
+    if seconds < 3600:
+        return f"{int(seconds // 60)} min"
+    return f"{seconds / 3600:.1f} h"
+
+def format_eta(seconds: float) -> str:
+    minutes = round(seconds / 60)
+    if minutes < 1:
+        return "less than a minute"
+    if minutes < 90:
+        return f"about {minutes} minute{'s' if minutes != 1 else ''}"
+    return f"about {round(minutes / 60)} hours"
+
+def cut_text(msg: str, budget: int) -> Tuple[str, bool]:
+    """Shorten `msg` to at most `budget` UTF-8 bytes, preferring a line or word break."""
+    data = msg.encode("utf-8")
+    if len(data) <= budget:
+        return msg, False
+    head = data[:max(budget - len(ELLIPSIS.encode("utf-8")), 0)].decode("utf-8", errors="ignore")
+    for separator in ("\n", " "):
+        cut = head.rfind(separator)
+        # don't give up more than a quarter of the budget for a clean break
+        if cut >= len(head) * 3 // 4:
+            head = head[:cut]
+            break
+    return head.rstrip() + ELLIPSIS, True
+
+def fit_text(msg: str, budget: int) -> Tuple[str, Optional[str]]:
+    """Cut `msg` to the budget and return a link to the full text when it was cut."""
+    text, truncated = cut_text(msg, budget)
+    store = ArtifactStore.instance()
+    if not truncated or not store.enabled:
+        return text, None
+    try:
+        return text, store.url(store.put_soon(msg))
+    except OSError as e:
+        print(f"Could not store full message: {e}")
+        return text, None
+
+def build_card_row(msg: str, icon: str, url: Optional[str] = None) -> Dict[str, Any]:
+    row: Dict[str, Any] = {
+        "type": "ColumnSet",
+        "columns": [
+            {
+                "type": "Column",
+                "width": "auto",
+                "items": [
+                    {
+                        "type": "Icon",
+                        "name": f"{icon}",
+                        "style": "Regular",
+                        "color": "Accent",
+                    },
+                ],
+            },
+            {
+                "type": "Column",
+                "width": "stretch",
+                "items": [
+                    {
+                        "type": "TextBlock",
+                        "text": f"{msg}",
+                        "wrap": True,
+                        "fontType": "Monospace",
+                        "weight": "Lighter",
+                        "isSubtle": True,
+                    },
+                ],
+            },
+        ],
+    }
     if url is not None:
-        body.append({
-            "type": "ActionSet",
-            "actions": [
-                {
-                    "type": "Action.OpenUrl",
-                    "title": "Open",
-                    "url": url,
-                },
-            ],
-        })
+        row["selectAction"] = {
+            "type": "Action.OpenUrl",
+            "url": url,
+        }
+    return row
 
+def build_card_activity(body: List[Dict[str, Any]], summary: str, is_important: Optional[bool] = None) -> Activity:
     ac = CardFactory.adaptive_card({
         "type": "AdaptiveCard",
         "body": body,
@@ -208,5 +750,45 @@ def build_adaptive_card(msg: str, icon: str, is_important: Optional[bool] = None
     return Activity(
         attachments=[ac],
         importance="High" if is_important else "Normal",
-        summary=msg,
+        summary=cut_text(summary, SUMMARY_BUDGET)[0],
     )
+
+def build_adaptive_card(msg: str, icon: str, is_important: Optional[bool] = None, url: Optional[str] = None) -> Activity:
+    text, full_text_url = fit_text(msg, CARD_TEXT_BUDGET)
+    body: List[Dict[str, Any]] = [build_card_row(text, icon)]
+
+    actions: List[Dict[str, Any]] = []
+    if url is not None:
+        actions.append({
+            "type": "Action.OpenUrl",
+            "title": "Open",
+            "url": url,
+        })
+    if full_text_url is not None:
+        actions.append({
+            "type": "Action.OpenUrl",
+            "title": "Show full text",
+            "url": full_text_url,
+        })
+    if actions:
+        body.append({
+            "type": "ActionSet",
+            "actions": actions,
+        })
+
+    return build_card_activity(body, msg, is_important)
+
+def build_progress_card(entries: List[ProgressEntry], hidden_entries: int) -> Activity:
+    body: List[Dict[str, Any]] = []
+    if hidden_entries > 0:
+        body.append({
+            "type": "TextBlock",
+            "text": f"{hidden_entries} earlier update{'s' if hidden_entries != 1 else ''}",
+            "isSubtle": True,
+            "size": "Small",
+        })
+    for msg, icon in entries:
+        text, full_text_url = fit_text(msg, PROGRESS_ENTRY_BUDGET)
+        body.append(build_card_row(text, icon, full_text_url))
+    summary = entries[-1][0] if entries else ""
+    return build_card_activity(body, summary)
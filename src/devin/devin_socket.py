@@ -1,9 +1,48 @@
-import websocket, threading, time, json
+import asyncio, json, random, time
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
 from urllib.parse import urlencode
 
+import aiohttp
+
+from .action_type import ActionType
+from .devin_api import DevinAPI
 from .devin_auth import TokenStorage
+from .backend_pool import DevinBackendPool
+from .metrics import SOCKET_CONNECT
+from .outbox import Outbox
+
+# commands that start an agent are only replayed by the process that admitted them;
+# a restarted bot would replay them without holding a slot in the AgentScheduler
+AGENT_STARTING_ACTIONS = frozenset({ActionType.INIT.value, ActionType.START.value})
+
+@dataclass
+class DevinSocketOptions:
+    # seconds between pings; a missing pong within half of this closes the connection
+    heartbeat: float = 20
+    connect_timeout: float = 60
+    reconnect_base_delay: float = 0.5
+    reconnect_max_delay: float = 30
+
+class DevinSocketStats:
+    __slots__ = ("connects", "reconnects", "failed_attempts", "last_disconnect_at",
+                 "last_recovery_seconds", "total_recovery_seconds", "dropped_pending")
+
+    def __init__(self):
+        self.connects = 0
+        self.reconnects = 0
+        self.failed_attempts = 0
+        self.last_disconnect_at: Optional[float] = None
+        self.last_recovery_seconds: Optional[float] = None
+        self.total_recovery_seconds = 0.0
+        self.dropped_pending = 0
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {name: getattr(self, name) for name in self.__slots__}
 
 class DevinSocket:
+    options = DevinSocketOptions()
+
     def __init__(self, user_id):
         self.user_id = user_id
         self.callbacks = {
@@ -11,15 +50,32 @@ class DevinSocket:
             "receive": [],
             "disconnect": [],
         }
-        self.__initializing = False
+        self.__initializing: Optional[asyncio.Future] = None
         self.__token = None
-        self.__socket = None
+        self.__socket: Optional[aiohttp.ClientWebSocketResponse] = None
+        self.__reader: Optional[asyncio.Task] = None
+        self.__reconnector: Optional[asyncio.Task] = None
         self.__is_socket_connected = False
-        self.__token_storage = TokenStorage()
+        self.__closed = False
+        # commands kept while disconnected, on disk, and sent in order after reconnect
+        self.__outbox = Outbox.for_user(user_id)
+        self.__flushing = asyncio.Lock()
+        self.__token_storage = TokenStorage.instance()
+        self.stats = DevinSocketStats()
+        self.backend_url: Optional[str] = None
+
+    @staticmethod
+    def configure(options: DevinSocketOptions):
+        DevinSocket.options = options
 
     def register_callback(self, event, callback):
+        # callbacks are coroutine functions, awaited on the event loop that owns the socket
         self.callbacks[event].append(callback)
 
+    def unregister_callback(self, event, callback):
+        if callback in self.callbacks[event]:
+            self.callbacks[event].remove(callback)
+
     def unregister_all_callbacks(self):
         print('Unregistering all callbacks...')
         self.callbacks = {
@@ -29,38 +85,121 @@ class DevinSocket:
         }
 
     def is_connected(self):
-        return self.__socket is not None and self.__is_socket_connected
-    
-    def initialize(self):
-        if self.__socket is None:
-            self.__try_initialize()
-
-    def send(self, message):
-        self.initialize()
-        
-        if self.is_connected() and self.__socket is not None:
-            msg = json.dumps(message)
+        return self.__socket is not None and not self.__socket.closed and self.__is_socket_connected
+
+    async def initialize(self):
+        if self.__reconnector is not None:
+            # a background (re)connect is already running, wait for it
+            await asyncio.shield(self.__reconnector)
+        elif self.__socket is None:
+            await self.__try_initialize()
+
+    def start(self):
+        """Connect in the background if no connection or attempt exists yet."""
+        if self.__socket is None and self.__reconnector is None and not self.__closed:
+            self.__reconnector = asyncio.get_running_loop().create_task(self.__reconnect())
+
+    @property
+    def outbox(self) -> Outbox:
+        return self.__outbox
+
+    async def send(self, message):
+        # never wait for the connection here; messages queue and replay once connected
+        msg = json.dumps(message)
+        # while older commands wait in the outbox, newer ones queue behind them
+        if self.is_connected() and self.__socket is not None and len(self.__outbox) == 0:
             print(f'Sending message to agent {msg}')
-            self.__socket.send(msg)
+            try:
+                await self.__socket.send_str(msg)
+                return
+            except (aiohttp.ClientConnectionError, ConnectionResetError, RuntimeError) as e:
+                print(f"Send failed for {self.user_id}, will retry after reconnect: {e}")
+        self.__queue_pending(msg, persist=message.get("action") not in AGENT_STARTING_ACTIONS)
+        if self.is_connected():
+            await self.__replay_pending()
+        else:
+            self.start()
+
+    async def reconnect(self):
+        """Drop the current connection; the reader reconnects, to the user's current backend."""
+        if self.__socket is not None and not self.__socket.closed:
+            await self.__socket.close()
+
+    async def close(self):
+        self.__closed = True
+        if self.__reconnector is not None:
+            self.__reconnector.cancel()
+            self.__reconnector = None
+        if self.__reader is not None:
+            self.__reader.cancel()
+            self.__reader = None
+        if self.__socket is not None:
+            await self.__socket.close()
+            self.__socket = None
+        self.__is_socket_connected = False
+        # waiting commands stay on disk for the user's next socket
+        self.__outbox.close()
+
+    def __queue_pending(self, msg: str, persist: bool = True):
+        dropped = self.__outbox.dropped
+        self.__outbox.put(msg, persist)
+        self.stats.dropped_pending += self.__outbox.dropped - dropped
+        print(f'Socket for {self.user_id} is not connected, queued message for replay')
+
+    async def __replay_pending(self):
+        # one replay at a time, so every command is sent once and in order
+        async with self.__flushing:
+            while self.is_connected() and self.__socket is not None:
+                entry = self.__outbox.peek()
+                if entry is None:
+                    break
+                seq, msg = entry
+                print(f'Replaying message to agent {msg}')
+                try:
+                    await self.__socket.send_str(msg)
+                except (aiohttp.ClientConnectionError, ConnectionResetError, RuntimeError) as e:
+                    # still in the outbox; the next connection replays it
+                    print(f"Replay failed for {self.user_id}: {e}")
+                    break
+                self.__outbox.ack(seq)
+
+    def __backoff(self, attempt: int) -> float:
+        delay = min(self.options.reconnect_max_delay, self.options.reconnect_base_delay * (2 ** attempt))
+        # full jitter so many sockets recovering from the same outage spread out
+        return random.uniform(0, delay)
 
-    def __try_initialize(self):
-        if self.__initializing:
+    async def __try_initialize(self):
+        if self.__initializing is not None:
             print("Already initializing...")
+            # concurrent callers wait for the connection attempt that is already in flight
+            await asyncio.shield(self.__initializing)
             return
-        self.__initializing = True
+        self.__initializing = asyncio.get_running_loop().create_future()
         try:
-            self.__token = self.__token_storage.get_token(self.user_id)
-            self.__initialize(self.__token)
-            
-            print('Connected!')
-        except Exception as e:
-            print(f"Connection failed for {self.user_id}. Retry... {str(e)}")
-            print(e)
-            self.__try_initialize()
+            attempt = 0
+            while not self.__closed:
+                try:
+                    self.__token = await self.__token_storage.get_token(self.user_id)
+                    await self.__initialize(self.__token)
+                    print('Connected!')
+                    break
+                except Exception as e:
+                    self.stats.failed_attempts += 1
+                    if isinstance(e, aiohttp.WSServerHandshakeError) and e.status in (401, 403):
+                        # the backend no longer accepts the token; drop the stored copy too, so
+                        # the retry asks /api/auth for a new one instead of reading it back
+                        self.__token_storage.invalidate(self.user_id, persisted=True)
+                    elif self.backend_url is not None and isinstance(e, (aiohttp.ClientConnectionError, aiohttp.WSServerHandshakeError, TimeoutError)):
+                        DevinBackendPool.instance().report_failure(self.backend_url)
+                    delay = self.__backoff(attempt)
+                    attempt += 1
+                    print(f"Connection failed for {self.user_id}. Retry in {delay:.1f}s... {str(e)}")
+                    await asyncio.sleep(delay)
         finally:
-            self.__initializing = False
+            self.__initializing.set_result(None)
+            self.__initializing = None
 
-    def __initialize(self, token: str):
+    async def __initialize(self, token: str):
         params = {
             "token": token,
         }
@@ -68,38 +207,79 @@ class DevinSocket:
         if self.user_id:
             params["uid"] = self.user_id
 
+        if self.__reader is not None:
+            self.__reader.cancel()
+            self.__reader = None
         if self.__socket:
-            self.__socket.close()
+            await self.__socket.close()
 
-        ws_url = f"ws://localhost:3001/ws?{urlencode(params)}"
+        self.backend_url = DevinAPI.base_url_for(self.user_id)
+        ws_url = f"{self.backend_url.replace('http', 'ws', 1)}/ws?{urlencode(params)}"
         self.__is_socket_connected = False
-        self.__socket = websocket.WebSocketApp(
-            ws_url, 
-            on_open=self.__on_open, 
-            on_message=self.__on_message, 
-            on_close=self.__on_close, 
-            on_error=lambda _, e: print(f"Websocket error: {e}"))
-        threading.Thread(target=self.__socket.run_forever).start()
-        
-        start_time = time.time()
-        while not self.__is_socket_connected:
-            if time.time() - start_time > 60:  # 60 seconds
-                raise TimeoutError("Connection attempt timed out after 1 minute")
-            time.sleep(0.1)
+        started = time.perf_counter()
+        try:
+            self.__socket = await asyncio.wait_for(
+                DevinAPI.session().ws_connect(ws_url, heartbeat=self.options.heartbeat),
+                timeout=self.options.connect_timeout,
+            )
+        except asyncio.TimeoutError:
+            raise TimeoutError(f"Connection attempt timed out after {self.options.connect_timeout}s")
+        SOCKET_CONNECT.observe(time.perf_counter() - started)
+        DevinBackendPool.instance().report_success(self.backend_url)
+        self.stats.connects += 1
+        if self.stats.last_disconnect_at is not None:
+            recovery = time.monotonic() - self.stats.last_disconnect_at
+            self.stats.reconnects += 1
+            self.stats.last_recovery_seconds = recovery
+            self.stats.total_recovery_seconds += recovery
+            self.stats.last_disconnect_at = None
+        # resubscribe: handlers re-sync agent state before queued commands are replayed
+        await self.__on_open(self.__socket)
+        self.__reader = asyncio.create_task(self.__read(self.__socket))
+        await self.__replay_pending()
         print("Connected socket")
-            
-    def __on_open(self, ws):
+
+    async def __read(self, ws: aiohttp.ClientWebSocketResponse):
+        try:
+            async for msg in ws:
+                if msg.type == aiohttp.WSMsgType.TEXT:
+                    await self.__on_message(ws, msg.data)
+                elif msg.type == aiohttp.WSMsgType.ERROR:
+                    print(f"Websocket error: {ws.exception()}")
+                    break
+        finally:
+            await self.__on_close(ws, ws.close_code, None)
+        if not self.__closed:
+            # the peer went away (close frame, reset or missed heartbeat), recover in the background
+            self.__reader = None
+            self.__reconnector = asyncio.create_task(self.__reconnect())
+
+    async def __reconnect(self):
+        try:
+            await self.__try_initialize()
+        finally:
+            self.__reconnector = None
+
+    async def __on_open(self, ws):
         print("Socket connected")
-        for callback in self.callbacks["connect"]:
-            callback(self)
         self.__is_socket_connected = True
-            
-    def __on_message(self, ws, message):
-        for callback in self.callbacks["receive"]:
-            callback(self, message)
-            
-    def __on_close(self, ws, status, message):
+        for callback in list(self.callbacks["connect"]):
+            try:
+                await callback(self)
+            except Exception as e:
+                print(f"Error handling socket connect: {e}")
+
+    async def __on_message(self, ws, message):
+        for callback in list(self.callbacks["receive"]):
+            try:
+                await callback(self, message)
+            except Exception as e:
+                print(f"Error handling socket message: {e}")
+
+    async def __on_close(self, ws, status, message):
         print("Socket closed", status, message)
-        for callback in self.callbacks["disconnect"]:
-            callback(self)
-        self.__is_socket_connected = False
\ No newline at end of file
+        self.__is_socket_connected = False
+        if not self.__closed and self.stats.last_disconnect_at is None:
+            self.stats.last_disconnect_at = time.monotonic()
+        for callback in list(self.callbacks["disconnect"]):
+            await callback(self)
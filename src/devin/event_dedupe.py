@@ -0,0 +1,53 @@
+import hashlib
+from collections import deque
+from typing import Any, Deque, Iterable, List, Optional, Set
+
+class EventDeduper:
+    """
+    Remembers the last `capacity` agent events of a conversation, so an event that is
+    delivered again (after a reconnect, or re-broadcast by the backend) is recognised.
+
+    Events are keyed by their backend id, or by their timestamp and a hash of the frame
+    when the backend sends no id. Events with neither are not deduplicated, because two
+    identical frames may be two real events, e.g. the same thought twice. Memory is
+    bounded by `capacity` short keys.
+    """
+
+    def __init__(self, capacity: int = 512, seen: Iterable[str] = ()):
+        self.capacity = capacity
+        self.__order: Deque[str] = deque()
+        self.__keys: Set[str] = set()
+        self.duplicates = 0
+        for key in seen:
+            self.__remember(key)
+
+    @staticmethod
+    def key(event_id: Any, timestamp: Any, frame: str) -> Optional[str]:
+        if event_id is not None:
+            return f"id:{event_id}"
+        if timestamp is None:
+            return None
+        return "h:" + hashlib.blake2b(f"{timestamp}\n{frame}".encode("utf-8"), digest_size=12).hexdigest()
+
+    def seen(self, key: str) -> bool:
+        """Return True if `key` was already seen, otherwise remember it."""
+        if key in self.__keys:
+            self.duplicates += 1
+            return True
+        self.__remember(key)
+        return False
+
+    def clear(self):
+        self.__order.clear()
+        self.__keys.clear()
+
+    def snapshot(self) -> List[str]:
+        return list(self.__order)
+
+    def __remember(self, key: str):
+        if key in self.__keys:
+            return
+        if len(self.__order) >= self.capacity:
+            self.__keys.discard(self.__order.popleft())
+        self.__order.append(key)
+        self.__keys.add(key)
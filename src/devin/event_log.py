@@ -0,0 +1,163 @@
+import hashlib, json, mmap, os, time
+from collections import Counter, deque
+from dataclasses import dataclass
+from typing import Deque, Dict, Iterator, List, Optional
+
+@dataclass
+class EventLogOptions:
+    # events kept in memory per conversation
+    capacity: int = 256
+    # characters of text kept per event
+    summary_chars: int = 200
+    # older events spill to a memory-mapped ring file here; None drops them
+    spill_directory: Optional[str] = None
+    spill_bytes: int = 1024 * 1024
+
+class EventRecord:
+    __slots__ = ("seq", "at", "kind", "summary")
+
+    def __init__(self, seq: int, at: float, kind: str, summary: str):
+        self.seq = seq
+        self.at = at
+        self.kind = kind
+        self.summary = summary
+
+    def to_json(self) -> bytes:
+        return json.dumps([self.seq, self.at, self.kind, self.summary], separators=(",", ":")).encode("utf-8")
+
+class _SpillFile:
+    """Fixed-size ring of newline separated records in a memory-mapped file."""
+
+    def __init__(self, path: str, size: int):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "wb") as file:
+            file.truncate(size)
+        self.__file = open(path, "r+b")
+        self.__map = mmap.mmap(self.__file.fileno(), size)
+        self.__position = 0
+
+    def write(self, record: bytes):
+        line = record + b"\n"
+        size = len(self.__map)
+        if len(line) > size:
+            return
+        if self.__position + len(line) > size:
+            # wrap around; clear the tail so no torn record survives there
+            self.__map[self.__position:] = b"\0" * (size - self.__position)
+            self.__position = 0
+        self.__map[self.__position:self.__position + len(line)] = line
+        self.__position += len(line)
+
+    def records(self) -> Iterator[EventRecord]:
+        """Spilled records, oldest first."""
+        # the part after the write position is older; its first line may be torn
+        for chunk in (self.__map[self.__position:], self.__map[:self.__position]):
+            for line in chunk.split(b"\n"):
+                line = line.strip(b"\0")
+                if not line:
+                    continue
+                try:
+                    seq, at, kind, summary = json.loads(line)
+                except (ValueError, TypeError):
+                    continue
+                yield EventRecord(seq, at, kind, summary)
+
+    def close(self, remove: bool = True):
+        self.__map.close()
+        self.__file.close()
+        if remove:
+            try:
+                os.unlink(self.path)
+            except OSError:
+                pass
+
+class EventLog:
+    """
+    The recent agent events of one conversation, for answering chat commands such as
+    `status` and `last N` without asking the backend.
+
+    Events are kept as short summaries in a ring buffer of `capacity` records, with an
+    index per event type. Records pushed out of the ring can spill to a memory-mapped
+    file of fixed size, so memory stays bounded either way.
+    """
+
+    options = EventLogOptions()
+
+    def __init__(self, options: Optional[EventLogOptions] = None, spill_path: Optional[str] = None):
+        self.options = options or EventLog.options
+        self.__ring: List[Optional[EventRecord]] = [None] * max(1, self.options.capacity)
+        self.__next_seq = 0
+        # event type -> seqs of that type still in the ring, oldest first
+        self.__by_kind: Dict[str, Deque[int]] = {}
+        # events of each type ever appended, including evicted ones
+        self.totals: Counter = Counter()
+        self.__spill: Optional[_SpillFile] = None
+        if spill_path is not None:
+            try:
+                self.__spill = _SpillFile(spill_path, self.options.spill_bytes)
+            except (OSError, ValueError) as e:
+                print(f"Could not create event spill file {spill_path}: {e}")
+
+    @staticmethod
+    def configure(options: EventLogOptions):
+        EventLog.options = options
+
+    @staticmethod
+    def for_conversation(conversation_id: Optional[str]) -> "EventLog":
+        directory = EventLog.options.spill_directory
+        if directory is None or conversation_id is None:
+            return EventLog()
+        name = hashlib.sha256(conversation_id.encode("utf-8")).hexdigest()[:32]
+        return EventLog(spill_path=os.path.join(directory, f"{name}.events"))
+
+    def __len__(self):
+        return min(self.__next_seq, len(self.__ring))
+
+    def append(self, kind: str, summary: str):
+        seq = self.__next_seq
+        self.__next_seq += 1
+        slot = seq % len(self.__ring)
+        evicted = self.__ring[slot]
+        if evicted is not None:
+            self.__by_kind[evicted.kind].popleft()
+            if self.__spill is not None:
+                self.__spill.write(evicted.to_json())
+        if len(summary) > self.options.summary_chars:
+            summary = summary[:self.options.summary_chars - 1] + "…"
+        self.__ring[slot] = EventRecord(seq, time.time(), kind, summary)
+        self.__by_kind.setdefault(kind, deque()).append(seq)
+        self.totals[kind] += 1
+
+    def latest(self, kind: Optional[str] = None) -> Optional[EventRecord]:
+        records = self.last(1, kind)
+        return records[0] if records else None
+
+    def last(self, count: int, kind: Optional[str] = None) -> List[EventRecord]:
+        """The newest `count` events, oldest first, optionally of one type only."""
+        if count <= 0:
+            return []
+        if kind is not None:
+            seqs = self.__by_kind.get(kind, ())
+            records = [self.__at(seq) for seq in list(seqs)[-count:]]
+        else:
+            first = max(0, self.__next_seq - min(count, len(self)))
+            records = [self.__at(seq) for seq in range(first, self.__next_seq)]
+        if len(records) < count and self.__spill is not None:
+            older = [record for record in self.__spill.records() if kind is None or record.kind == kind]
+            records = older[-(count - len(records)):] + records
+        return records
+
+    def window_counts(self) -> Dict[str, int]:
+        """Events of each type currently in the ring."""
+        return {kind: len(seqs) for kind, seqs in self.__by_kind.items() if seqs}
+
+    def close(self):
+        if self.__spill is not None:
+            self.__spill.close()
+            self.__spill = None
+
+    def __at(self, seq: int) -> EventRecord:
+        record = self.__ring[seq % len(self.__ring)]
+        assert record is not None and record.seq == seq
+        return record
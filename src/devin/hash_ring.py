@@ -0,0 +1,63 @@
+import hashlib
+from bisect import bisect
+from typing import Dict, Iterable, Iterator, List, Optional
+
+def _hash(key: str) -> int:
+    return int.from_bytes(hashlib.md5(key.encode("utf-8")).digest()[:8], "big")
+
+class HashRing:
+    """
+    Consistent hash ring. Each node owns `replicas` points on the ring, so adding or
+    removing a node only moves the keys that hashed next to its points.
+    """
+
+    def __init__(self, nodes: Iterable[str] = (), replicas: int = 100):
+        self.replicas = replicas
+        self.__points: List[int] = []
+        self.__owners: Dict[int, str] = {}
+        self.__nodes: List[str] = []
+        for node in nodes:
+            self.add(node)
+
+    @property
+    def nodes(self) -> List[str]:
+        return list(self.__nodes)
+
+    def __len__(self):
+        return len(self.__nodes)
+
+    def add(self, node: str):
+        if node in self.__nodes:
+            return
+        self.__nodes.append(node)
+        for replica in range(self.replicas):
+            point = _hash(f"{node}#{replica}")
+            self.__owners[point] = node
+        self.__points = sorted(self.__owners)
+
+    def remove(self, node: str):
+        if node not in self.__nodes:
+            return
+        self.__nodes.remove(node)
+        self.__owners = {point: owner for point, owner in self.__owners.items() if owner != node}
+        self.__points = sorted(self.__owners)
+
+    def get(self, key: str) -> Optional[str]:
+        if not self.__points:
+            return None
+        index = bisect(self.__points, _hash(key)) % len(self.__points)
+        return self.__owners[self.__points[index]]
+
+    def preference(self, key: str) -> Iterator[str]:
+        """Nodes in ring order starting at the owner of `key`, each once."""
+        if not self.__points:
+            return
+        start = bisect(self.__points, _hash(key))
+        seen = set()
+        for offset in range(len(self.__points)):
+            node = self.__owners[self.__points[(start + offset) % len(self.__points)]]
+            if node not in seen:
+                seen.add(node)
+                yield node
+                if len(seen) == len(self.__nodes):
+                    return
@@ -0,0 +1,99 @@
+from typing import Any, Dict, Optional
+
+from .devin_api import DevinAPI
+from .observation_type import ObservationType
+from .response_type import ObservationMessage, buildSocketMessageFromDict
+
+class _HistoryCursor:
+    __slots__ = ("last_id", "position", "agent_state")
+
+    def __init__(self):
+        # id of the newest event seen, when the backend tags events with ids
+        self.last_id: Any = None
+        # number of history entries consumed, for backends without ids
+        self.position = 0
+        self.agent_state: Optional[ObservationMessage] = None
+
+def _message_id(message: Dict[str, Any]) -> Any:
+    payload = message.get('payload') or {}
+    return payload.get('id', message.get('id'))
+
+class MessageHistory:
+    """
+    Per-user cursor over the backend's /api/messages history.
+
+    Catching up after a (re)connect only requests events newer than the cursor and
+    streams them, keeping just the latest AGENT_STATE_CHANGED observation. Without a
+    cursor the whole history is streamed once, still keeping only the tail state.
+    """
+
+    __instance: Optional["MessageHistory"] = None
+
+    def __init__(self) -> None:
+        self.__cursors: Dict[str, _HistoryCursor] = {}
+
+    @staticmethod
+    def instance() -> "MessageHistory":
+        if MessageHistory.__instance is None:
+            MessageHistory.__instance = MessageHistory()
+        return MessageHistory.__instance
+
+    def observe(self, user_id, socket_message) -> None:
+        """Advance the cursor with an event received live on the socket."""
+        cursor = self.__cursors.get(user_id)
+        if cursor is None:
+            # no baseline yet, the next catch up scans the full history
+            return
+        if socket_message.id is not None:
+            cursor.last_id = socket_message.id
+        if isinstance(socket_message, ObservationMessage) and socket_message.observation == ObservationType.AGENT_STATE_CHANGED.value:
+            cursor.agent_state = socket_message
+
+    def forget(self, user_id) -> None:
+        self.__cursors.pop(user_id, None)
+
+    async def catch_up(self, user_id, token) -> Optional[ObservationMessage]:
+        """Return the latest known AGENT_STATE_CHANGED observation for the user."""
+        cursor = self.__cursors.get(user_id) or _HistoryCursor()
+        after = cursor.last_id
+
+        count = 0
+        newest_id = None
+        latest_state: Optional[ObservationMessage] = None
+        latest_state_after_cursor: Optional[ObservationMessage] = None
+        async with DevinAPI.stream_messages(token, after=str(after) if after is not None else None, user_id=user_id) as stream:
+            # the backend may ignore `after`; then skip past the cursor ourselves
+            past_cursor = stream.filtered or (after is None and cursor.position == 0)
+            async for message in stream:
+                count += 1
+                message_id = _message_id(message)
+                if message_id is not None:
+                    newest_id = message_id
+                payload = message.get('payload') or {}
+                if payload.get('observation') == ObservationType.AGENT_STATE_CHANGED.value:
+                    state = buildSocketMessageFromDict(payload)
+                    if isinstance(state, ObservationMessage):
+                        latest_state = state
+                        if past_cursor:
+                            latest_state_after_cursor = state
+                if not past_cursor:
+                    if after is not None:
+                        past_cursor = message_id == after
+                    else:
+                        past_cursor = count >= cursor.position
+
+        if stream.filtered:
+            cursor.position += count
+        else:
+            cursor.position = count
+        if past_cursor:
+            new_state = latest_state_after_cursor
+        else:
+            # the cursor is gone (history was cleared), everything scanned is new
+            new_state = latest_state
+        if new_state is not None:
+            cursor.agent_state = new_state
+        if newest_id is not None:
+            cursor.last_id = newest_id
+        self.__cursors[user_id] = cursor
+        return cursor.agent_state
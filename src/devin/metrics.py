@@ -0,0 +1,115 @@
+from bisect import bisect_left
+from typing import Callable, Dict, List, Optional, Sequence, Union
+
+# seconds; covers in-process work (decode) up to slow backend round-trips
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+GaugeValue = Union[float, Dict[str, float]]
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+class Histogram:
+    """
+    Cumulative-bucket histogram. `observe` is a bisect and three additions, so it can
+    sit on hot paths; bucket totals are only summed up when scraped.
+    """
+
+    __slots__ = ("name", "help", "buckets", "counts", "sum", "count")
+
+    def __init__(self, name: str, help: str, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            cumulative += count
+            lines.append(f'{self.name}_bucket{{le="{_format_value(bound)}"}} {cumulative}')
+        lines.append(f"{self.name}_sum {_format_value(self.sum)}")
+        lines.append(f"{self.name}_count {self.count}")
+        return lines
+
+class Gauge:
+    """
+    Gauge read from a callback at scrape time, so nothing is recorded on the hot path.
+    The callback returns a number, or a dict of values keyed by the value of `label`.
+    """
+
+    __slots__ = ("name", "help", "collect", "label")
+
+    def __init__(self, name: str, help: str, collect: Callable[[], GaugeValue], label: Optional[str] = None):
+        self.name = name
+        self.help = help
+        self.collect = collect
+        self.label = label
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge"]
+        value = self.collect()
+        if isinstance(value, dict):
+            assert self.label is not None
+            for label_value, sample in sorted(value.items()):
+                lines.append(f'{self.name}{{{self.label}="{_escape(str(label_value))}"}} {_format_value(sample)}')
+        else:
+            lines.append(f"{self.name} {_format_value(value)}")
+        return lines
+
+class MetricsRegistry:
+    __instance: Optional["MetricsRegistry"] = None
+
+    def __init__(self) -> None:
+        self.__metrics: Dict[str, Union[Histogram, Gauge]] = {}
+
+    @staticmethod
+    def instance() -> "MetricsRegistry":
+        if MetricsRegistry.__instance is None:
+            MetricsRegistry.__instance = MetricsRegistry()
+        return MetricsRegistry.__instance
+
+    def histogram(self, name: str, help: str, buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        metric = self.__metrics.get(name)
+        if metric is None:
+            metric = self.__metrics[name] = Histogram(name, help, buckets)
+        assert isinstance(metric, Histogram)
+        return metric
+
+    def gauge(self, name: str, help: str, collect: Callable[[], GaugeValue], label: Optional[str] = None) -> Gauge:
+        # registering again replaces the callback, e.g. when the app is rebuilt
+        gauge = self.__metrics[name] = Gauge(name, help, collect, label)
+        return gauge
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self.__metrics.values():
+            try:
+                lines.extend(metric.render())
+            except Exception as e:
+                print(f"Could not collect metric {metric.name}: {e}")
+        return "\n".join(lines) + "\n"
+
+_registry = MetricsRegistry.instance()
+
+MESSAGE_HANDLING = _registry.histogram("bot_messages_handling_seconds", "Time to handle a POST /api/messages request.")
+SOCKET_CONNECT = _registry.histogram("devin_socket_connect_seconds", "Time to open the agent websocket.")
+FETCH_TOKEN = _registry.histogram("devin_fetch_token_seconds", "Round-trip of /api/auth.")
+FETCH_MESSAGES = _registry.histogram("devin_fetch_messages_seconds", "Round-trip of /api/messages, including streaming the body.")
+EVENT_DECODE = _registry.histogram("devin_event_decode_seconds", "Time to decode one socket event.")
+PROACTIVE_SEND = _registry.histogram("bot_proactive_send_seconds", "Time from queueing a proactive activity to its delivery.")
+AGENT_QUEUE_WAIT = _registry.histogram("devin_agent_queue_wait_seconds", "Time a task waits for a free agent slot.",
+                                       buckets=(0.1, 1, 5, 15, 30, 60, 120, 300, 600, 1800, 3600))
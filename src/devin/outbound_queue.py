@@ -0,0 +1,261 @@
+import asyncio, heapq, itertools, random, time
+from enum import IntEnum
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import aiohttp
+from botbuilder.core import TurnContext
+from botbuilder.schema import ConversationReference
+
+from .metrics import PROACTIVE_SEND
+
+class OutboundPriority(IntEnum):
+    # lower values are delivered first
+    QUESTION = 0
+    MESSAGE = 1
+    PROGRESS = 2
+
+OutboundOperation = Callable[[TurnContext], Awaitable[Any]]
+
+class OutboundQueueFull(Exception):
+    pass
+
+class _OutboundItem:
+    __slots__ = ("priority", "seq", "operation", "merge_key", "futures", "enqueued_at")
+
+    def __init__(self, priority: OutboundPriority, seq: int, operation: OutboundOperation,
+                 merge_key: Optional[str], future: asyncio.Future):
+        self.priority = priority
+        self.seq = seq
+        self.operation = operation
+        self.merge_key = merge_key
+        self.futures = [future]
+        self.enqueued_at = time.monotonic()
+
+    def __lt__(self, other: "_OutboundItem"):
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+def _status_code(error: Exception) -> Optional[int]:
+    response = getattr(error, "response", None)
+    status = getattr(response, "status_code", None) or getattr(response, "status", None)
+    return status if isinstance(status, int) else None
+
+def _is_retryable(error: Exception) -> bool:
+    if isinstance(error, (aiohttp.ClientConnectionError, asyncio.TimeoutError)):
+        return True
+    status = _status_code(error)
+    return status is not None and (status == 429 or status >= 500)
+
+def _is_client_error(error: Exception) -> bool:
+    # retrying will not change the answer, e.g. the bot was removed from the conversation
+    status = _status_code(error)
+    return status is not None and 400 <= status < 500 and status != 429
+
+class OutboundQueue:
+    """
+    Ordered, bounded delivery of proactive activities for one conversation.
+
+    Items are delivered by a single worker task in priority order (FIFO within a
+    priority). The worker drains everything queued inside one continue_conversation
+    turn, so a burst shares one connector client. When the queue is full, PROGRESS
+    items are merged or dropped; higher priorities wait for space, which pushes back
+    on the socket reader instead of growing memory.
+    """
+
+    def __init__(self,
+                 adapter: Any,
+                 conversation_reference: Optional[ConversationReference],
+                 app_id: str,
+                 max_size: int = 50,
+                 max_attempts: int = 5,
+                 retry_base_delay: float = 0.5,
+                 retry_max_delay: float = 30) -> None:
+        self.__adapter = adapter
+        self.__conversation_reference = conversation_reference
+        self.__app_id = app_id
+        self.max_size = max_size
+        self.max_attempts = max_attempts
+        self.retry_base_delay = retry_base_delay
+        self.retry_max_delay = retry_max_delay
+        self.__heap: List[_OutboundItem] = []
+        self.__by_merge_key: Dict[str, _OutboundItem] = {}
+        self.__seq = itertools.count()
+        self.__space = asyncio.Condition()
+        self.__worker: Optional[asyncio.Task] = None
+        self.__closed = False
+        self.delivered = 0
+        self.dropped = 0
+        self.merged = 0
+        self.retries = 0
+        self.failed = 0
+
+    @property
+    def depth(self) -> int:
+        return len(self.__heap)
+
+    @property
+    def lag(self) -> float:
+        """Seconds the oldest queued item has been waiting."""
+        if not self.__heap:
+            return 0.0
+        return time.monotonic() - min(item.enqueued_at for item in self.__heap)
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "depth": self.depth,
+            "lag": self.lag,
+            "delivered": self.delivered,
+            "dropped": self.dropped,
+            "merged": self.merged,
+            "retries": self.retries,
+            "failed": self.failed,
+        }
+
+    async def enqueue(self, operation: OutboundOperation, priority: OutboundPriority,
+                      merge_key: Optional[str] = None) -> asyncio.Future:
+        """
+        Queue `operation` for delivery and return a future for its result. Awaiting this
+        method only waits for queue space; await the returned future to wait for delivery.
+        """
+        if self.__closed:
+            raise OutboundQueueFull("Outbound queue is closed.")
+        future = asyncio.get_running_loop().create_future()
+        # callers may fire and forget; mark failures as retrieved so they are not reported twice
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+
+        if merge_key is not None and merge_key in self.__by_merge_key:
+            # a newer version of a still-queued activity replaces the old one in place
+            existing = self.__by_merge_key[merge_key]
+            existing.operation = operation
+            existing.futures.append(future)
+            self.merged += 1
+            return future
+
+        if len(self.__heap) >= self.max_size:
+            if priority == OutboundPriority.PROGRESS:
+                self.dropped += 1
+                future.set_result(None)
+                return future
+            if not self.__drop_lowest_priority(priority):
+                async with self.__space:
+                    await self.__space.wait_for(lambda: len(self.__heap) < self.max_size or self.__closed)
+                if self.__closed:
+                    raise OutboundQueueFull("Outbound queue is closed.")
+
+        item = _OutboundItem(priority, next(self.__seq), operation, merge_key, future)
+        heapq.heappush(self.__heap, item)
+        if merge_key is not None:
+            self.__by_merge_key[merge_key] = item
+        self.__ensure_worker()
+        return future
+
+    async def close(self):
+        self.__closed = True
+        if self.__worker is not None:
+            self.__worker.cancel()
+            self.__worker = None
+        for item in self.__heap:
+            for future in item.futures:
+                if not future.done():
+                    future.cancel()
+        self.__heap.clear()
+        self.__by_merge_key.clear()
+        async with self.__space:
+            self.__space.notify_all()
+
+    def __drop_lowest_priority(self, priority: OutboundPriority) -> bool:
+        candidates = [item for item in self.__heap if item.priority > priority]
+        if not candidates:
+            return False
+        victim = max(candidates)
+        self.__heap.remove(victim)
+        heapq.heapify(self.__heap)
+        if victim.merge_key is not None:
+            self.__by_merge_key.pop(victim.merge_key, None)
+        for future in victim.futures:
+            if not future.done():
+                future.set_result(None)
+        self.dropped += 1
+        return True
+
+    def __ensure_worker(self):
+        if self.__worker is None or self.__worker.done():
+            self.__worker = asyncio.get_running_loop().create_task(self.__run())
+
+    async def __run(self):
+        # the worker exits when the queue drains and is restarted by the next enqueue
+        failed_turns = 0
+        while self.__heap and not self.__closed:
+            try:
+                await self.__adapter.continue_conversation(
+                    self.__conversation_reference,
+                    self.__drain,
+                    self.__app_id,
+                )
+                failed_turns = 0
+            except Exception as e:
+                # connector setup failed; back off before the next turn, up to max_attempts turns
+                failed_turns += 1
+                if failed_turns >= self.max_attempts or _is_client_error(e):
+                    print(f"Outbound delivery turn failed after {failed_turns} attempt(s), dropping {len(self.__heap)} activities: {e}")
+                    await self.__fail_queued(e)
+                    return
+                print(f"Outbound delivery turn failed: {e}")
+                await asyncio.sleep(self.__backoff(failed_turns, e))
+
+    async def __fail_queued(self, error: Exception):
+        for item in self.__heap:
+            self.failed += 1
+            for future in item.futures:
+                if not future.done():
+                    future.set_exception(error)
+        self.__heap.clear()
+        self.__by_merge_key.clear()
+        async with self.__space:
+            self.__space.notify_all()
+
+    async def __drain(self, context: TurnContext):
+        while self.__heap and not self.__closed:
+            item = heapq.heappop(self.__heap)
+            if item.merge_key is not None:
+                self.__by_merge_key.pop(item.merge_key, None)
+            async with self.__space:
+                self.__space.notify_all()
+            await self.__deliver(context, item)
+
+    async def __deliver(self, context: TurnContext, item: _OutboundItem):
+        attempt = 1
+        while True:
+            try:
+                result = await item.operation(context)
+                self.delivered += 1
+                PROACTIVE_SEND.observe(time.monotonic() - item.enqueued_at)
+                for future in item.futures:
+                    if not future.done():
+                        future.set_result(result)
+                return
+            except Exception as e:
+                if attempt >= self.max_attempts or not _is_retryable(e):
+                    self.failed += 1
+                    print(f"Outbound delivery failed after {attempt} attempt(s): {e}")
+                    for future in item.futures:
+                        if not future.done():
+                            future.set_exception(e)
+                    return
+                self.retries += 1
+                await asyncio.sleep(self.__backoff(attempt, e))
+                attempt += 1
+
+    def __backoff(self, attempt: int, error: Optional[Exception] = None) -> float:
+        retry_after = None
+        response = getattr(error, "response", None)
+        headers = getattr(response, "headers", None)
+        if headers is not None:
+            retry_after = headers.get("Retry-After")
+        if retry_after is not None:
+            try:
+                return min(self.retry_max_delay, float(retry_after))
+            except ValueError:
+                pass
+        delay = min(self.retry_max_delay, self.retry_base_delay * (2 ** (attempt - 1)))
+        # full jitter
+        return random.uniform(0, delay)
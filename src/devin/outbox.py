@@ -0,0 +1,170 @@
+import hashlib, json, os, tempfile, time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import IO, Optional, Tuple
+
+@dataclass
+class OutboxOptions:
+    # None keeps the outbox in memory only
+    directory: Optional[str] = "outbox"
+    # commands waiting per user; the oldest is dropped beyond this
+    max_entries: int = 100
+    # the log is compacted to the commands still waiting once it grows past this
+    max_bytes: int = 256 * 1024
+    # commands older than this are stale by the time the backend is back, e.g. after a restart
+    max_age: float = 60 * 60
+    # fsync every record; off by default, a flushed write survives a crash of the bot
+    fsync: bool = False
+
+class Outbox:
+    """
+    Commands for one user's agent that could not be sent yet, in order.
+
+    Backed by an append-only log of `put` and `ack` records, so commands survive a
+    restart of the bot. Commands put with `persist=False` are kept in memory only, for
+    commands that must not be replayed by a bot that no longer knows why they were
+    sent. A command is acked once the socket has written it; the log is
+    compacted to the unacked commands when it grows past `max_bytes` and removed when
+    nothing is waiting, so disk use stays bounded.
+    """
+
+    options = OutboxOptions()
+
+    def __init__(self, path: Optional[str], options: Optional[OutboxOptions] = None):
+        self.options = options or Outbox.options
+        self.path = path
+        # seq -> (command, queued at, written to the log)
+        self.__entries: "OrderedDict[int, Tuple[str, float, bool]]" = OrderedDict()
+        self.__next_seq = 1
+        self.__file: Optional[IO[str]] = None
+        self.__size = 0
+        self.dropped = 0
+        if path is not None and os.path.exists(path):
+            try:
+                self.__load(path)
+            except OSError as e:
+                print(f"Could not read outbox {path}: {e}")
+
+    @staticmethod
+    def configure(options: OutboxOptions):
+        Outbox.options = options
+
+    @staticmethod
+    def for_user(user_id) -> "Outbox":
+        directory = Outbox.options.directory
+        if directory is None:
+            return Outbox(None)
+        name = hashlib.sha256(str(user_id).encode("utf-8")).hexdigest()[:32]
+        return Outbox(os.path.join(directory, f"{name}.log"))
+
+    def __len__(self):
+        return len(self.__entries)
+
+    def put(self, command: str, persist: bool = True) -> int:
+        """Queue `command` and return its sequence number."""
+        seq = self.__next_seq
+        self.__next_seq += 1
+        while len(self.__entries) >= self.options.max_entries:
+            self.__drop_oldest()
+        now = time.time()
+        self.__entries[seq] = (command, now, persist)
+        if persist:
+            self.__append({"op": "put", "seq": seq, "at": now, "command": command})
+        return seq
+
+    def peek(self) -> Optional[Tuple[int, str]]:
+        """The oldest command still waiting, skipping ones that went stale."""
+        while self.__entries:
+            seq, (command, at, _) = next(iter(self.__entries.items()))
+            if time.time() - at <= self.options.max_age:
+                return seq, command
+            self.__drop_oldest()
+        return None
+
+    def ack(self, seq: int):
+        entry = self.__entries.pop(seq, None)
+        if entry is None:
+            return
+        if not self.__entries:
+            self.__remove()
+        elif entry[2]:
+            self.__append({"op": "ack", "seq": seq})
+
+    def close(self):
+        if self.__file is not None:
+            self.__file.close()
+            self.__file = None
+
+    def __drop_oldest(self):
+        seq, (_, _, persisted) = self.__entries.popitem(last=False)
+        self.dropped += 1
+        if persisted:
+            self.__append({"op": "ack", "seq": seq})
+
+    def __append(self, record):
+        if self.path is None:
+            return
+        line = json.dumps(record, separators=(",", ":")) + "\n"
+        try:
+            if self.__file is None:
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                self.__file = open(self.path, "a", encoding="utf-8")
+                self.__size = self.__file.tell()
+            self.__file.write(line)
+            self.__file.flush()
+            if self.options.fsync:
+                os.fsync(self.__file.fileno())
+            self.__size += len(line)
+            if self.__size > self.options.max_bytes:
+                self.__compact()
+        except OSError as e:
+            # the command is still queued in memory, only durability is lost
+            print(f"Could not write outbox {self.path}: {e}")
+
+    def __compact(self):
+        assert self.path is not None
+        self.close()
+        directory = os.path.dirname(self.path) or "."
+        fd, temp_path = tempfile.mkstemp(dir=directory, prefix=".outbox-")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as file:
+                for seq, (command, at, persisted) in self.__entries.items():
+                    if not persisted:
+                        continue
+                    file.write(json.dumps({"op": "put", "seq": seq, "at": at, "command": command}, separators=(",", ":")) + "\n")
+            os.replace(temp_path, self.path)
+        except OSError:
+            os.unlink(temp_path)
+            raise
+        self.__size = os.path.getsize(self.path)
+
+    def __remove(self):
+        self.close()
+        self.__size = 0
+        if self.path is not None:
+            try:
+                os.unlink(self.path)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                print(f"Could not remove outbox {self.path}: {e}")
+
+    def __load(self, path: str):
+        with open(path, encoding="utf-8") as file:
+            for line in file:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # a record cut short by a crash
+                    continue
+                seq = record.get("seq", 0)
+                self.__next_seq = max(self.__next_seq, seq + 1)
+                if record.get("op") == "put":
+                    self.__entries[seq] = (record["command"], record.get("at", 0), True)
+                elif record.get("op") == "ack":
+                    self.__entries.pop(seq, None)
+        # sequence numbers restart from the log, so write only what is still waiting
+        if self.__entries:
+            self.__compact()
+        else:
+            self.__remove()
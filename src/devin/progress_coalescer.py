@@ -0,0 +1,110 @@
+import asyncio
+from typing import Awaitable, Callable, List, Optional, Set, Tuple
+
+from botbuilder.schema import Activity
+
+ProgressEntry = Tuple[str, str]  # (message, icon)
+
+class ProgressCoalescer:
+    """
+    Batches low-priority progress updates for one conversation into a single live card.
+
+    The first flush sends the card; later flushes edit it in place. Flushes happen at most
+    once per `debounce` seconds, so a burst of agent events costs one Teams call per
+    interval instead of one per event.
+    """
+
+    def __init__(self,
+                 send: Callable[[Activity], Awaitable[Optional[str]]],
+                 update: Callable[[str, Activity], Awaitable[None]],
+                 render: Callable[[List[ProgressEntry], int], Activity],
+                 debounce: float = 3.0,
+                 max_entries: int = 8) -> None:
+        self.__send = send
+        self.__update = update
+        self.__render = render
+        self.debounce = debounce
+        self.max_entries = max_entries
+        self.__entries: List[ProgressEntry] = []
+        self.__hidden_entries = 0
+        # entries added so far, to tell which ones a flush rendered
+        self.__added = 0
+        self.__dirty = False
+        self.__live_activity_id: Optional[str] = None
+        self.__timer: Optional[asyncio.Task] = None
+        self.__background: Set[asyncio.Task] = set()
+        self.__lock = asyncio.Lock()
+
+    def add(self, message: str, icon: str):
+        self.__entries.append((message, icon))
+        self.__added += 1
+        if len(self.__entries) > self.max_entries:
+            self.__hidden_entries += len(self.__entries) - self.max_entries
+            del self.__entries[:-self.max_entries]
+        self.__dirty = True
+        if self.__timer is None:
+            self.__timer = asyncio.get_running_loop().create_task(self.__flush_later())
+
+    async def flush(self):
+        if self.__timer is not None:
+            self.__timer.cancel()
+            self.__timer = None
+        async with self.__lock:
+            await self.__flush_locked()
+
+    async def reset(self):
+        """Flush pending updates and start a new live card for the next batch."""
+        if self.__timer is not None:
+            self.__timer.cancel()
+            self.__timer = None
+        async with self.__lock:
+            rendered = await self.__flush_locked()
+            # entries added while the card was being sent belong to the next card
+            unrendered = self.__added - rendered
+            self.__entries = self.__entries[-unrendered:] if unrendered else []
+            self.__hidden_entries = max(0, unrendered - len(self.__entries))
+            self.__live_activity_id = None
+            self.__dirty = unrendered > 0
+            if self.__dirty and self.__timer is None:
+                self.__timer = asyncio.get_running_loop().create_task(self.__flush_later())
+
+    async def __flush_locked(self) -> int:
+        """Send or edit the live card; returns how many entries had been added when it was rendered."""
+        rendered = self.__added
+        if not self.__dirty:
+            return rendered
+        self.__dirty = False
+        card = self.__render(list(self.__entries), self.__hidden_entries)
+        if self.__live_activity_id is None:
+            self.__live_activity_id = await self.__send(card)
+        else:
+            await self.__update(self.__live_activity_id, card)
+        return rendered
+
+    def flush_soon(self):
+        """Flush without waiting for the debounce interval or for delivery."""
+        self.__run_in_background(self.flush())
+
+    def cancel(self):
+        if self.__timer is not None:
+            self.__timer.cancel()
+            self.__timer = None
+        for task in self.__background:
+            task.cancel()
+
+    def __run_in_background(self, coro: Awaitable[None]):
+        task = asyncio.ensure_future(self.__log_errors(coro))
+        self.__background.add(task)
+        task.add_done_callback(self.__background.discard)
+
+    @staticmethod
+    async def __log_errors(coro: Awaitable[None]):
+        try:
+            await coro
+        except Exception as e:
+            print(f"Failed to flush progress card: {e}")
+
+    async def __flush_later(self):
+        await asyncio.sleep(self.debounce)
+        self.__timer = None
+        await self.__log_errors(self.flush())
@@ -1,28 +1,45 @@
 import json
-from typing import Dict, Union, Any
+from json.decoder import scanstring  # type: ignore[attr-defined]
+from typing import Dict, Optional, Tuple, Union, Any
 
 class ActionMessage:
-    def __init__(self, action: str, args: Dict[str, str] | None, message: str | None):
+    __slots__ = ("id", "timestamp", "action", "args", "message")
+
+    def __init__(self, action: str, args: Dict[str, str] | None, message: str | None, id: Any = None, timestamp: Any = None):
+        self.id = id
+        self.timestamp = timestamp
         self.action = action
         self.args = args or {}
         self.message = message or ""
-        
-    def __getattribute__(self, name: str) -> Any:
-        return super().__getattribute__(name)
 
 class ObservationMessage:
-    def __init__(self, observation: str, 
-                 content: str | None, 
-                 extras: Dict[str, str] | None, 
-                 message: str | None):
+    __slots__ = ("id", "timestamp", "observation", "extras", "message", "_content", "_raw", "_content_span")
+
+    def __init__(self, observation: str,
+                 content: str | None,
+                 extras: Dict[str, str] | None,
+                 message: str | None,
+                 id: Any = None,
+                 timestamp: Any = None):
+        self.id = id
+        self.timestamp = timestamp
         self.observation = observation
-        self.content = content
         self.extras = extras
         self.message = message
+        self._content = content
+        # when decoded from a socket frame, content stays in the frame until first read
+        self._raw: Optional[str] = None
+        self._content_span: Optional[Tuple[int, int]] = None
         # self.screenshot = screenshot # Not needed for this app
-        
-    def __getattribute__(self, name: str) -> Any:
-        return super().__getattribute__(name)
+
+    @property
+    def content(self) -> str | None:
+        if self._content_span is not None and self._raw is not None:
+            start, end = self._content_span
+            self._content = json.loads(self._raw[start:end])
+            self._raw = None
+            self._content_span = None
+        return self._content
 
 DevinSocketMessage = Union[ActionMessage, ObservationMessage]
 
@@ -33,7 +50,9 @@ def buildSocketMessageFromDict(jsonObj: Dict[str, Any]) -> DevinSocketMessage:
         return ActionMessage(
             action=action,
             args=jsonObj.get('args'),
-            message=jsonObj.get('message')
+            message=jsonObj.get('message'),
+            id=jsonObj.get('id'),
+            timestamp=jsonObj.get('timestamp'),
         )
     else:
         observation = jsonObj.get('observation')
@@ -42,9 +61,114 @@ def buildSocketMessageFromDict(jsonObj: Dict[str, Any]) -> DevinSocketMessage:
             observation=observation,
             content=jsonObj.get('content'),
             extras=jsonObj.get('extras'),
-            message=jsonObj.get('message')
+            message=jsonObj.get('message'),
+            id=jsonObj.get('id'),
+            timestamp=jsonObj.get('timestamp'),
         )
 
+_decoder = json.JSONDecoder()
+_WHITESPACE = " \t\n\r"
+# top-level string fields the handler never needs decoded up front
+_LAZY_KEYS = frozenset(("content",))
+# shorter strings are cheaper to decode than to keep the frame alive for
+_LAZY_MIN_LENGTH = 256
+# top-level fields that are never read (e.g. base64 screenshots of BROWSE observations)
+_SKIPPED_KEYS = frozenset(("screenshot",))
+# escaped quotes stepped over in Python before handing a string to the C scanner
+_MAX_ESCAPED_QUOTES = 4
+
+class _Span:
+    __slots__ = ("start", "end")
+
+    def __init__(self, start: int, end: int):
+        self.start = start
+        self.end = end
+
+def _skip_ws(s: str, pos: int) -> int:
+    while s[pos] in _WHITESPACE:
+        pos += 1
+    return pos
+
+def _string_end(s: str, pos: int) -> int:
+    # pos is at the opening quote; find the closing one without building the string
+    end = pos
+    for _ in range(_MAX_ESCAPED_QUOTES):
+        end = s.index('"', end + 1)
+        backslashes = 0
+        i = end - 1
+        while s[i] == '\\':
+            backslashes += 1
+            i -= 1
+        if backslashes % 2 == 0:
+            return end + 1
+    # quote-heavy text is walked faster by the C scanner, its copy is dropped right away
+    return scanstring(s, pos + 1)[1]
+
+def _end_of_object(s: str, pos: int) -> int:
+    # pos is at the closing brace; like json.loads, only whitespace may follow it
+    if s[pos + 1:].strip(_WHITESPACE):
+        raise ValueError("extra data after the object")
+    return pos + 1
+
+def _scan_object(s: str) -> Dict[str, Any]:
+    """
+    Decode the top level of a JSON object, leaving large string fields as spans into `s`.
+    """
+    fields: Dict[str, Any] = {}
+    pos = _skip_ws(s, 0)
+    if s[pos] != '{':
+        raise ValueError("not an object")
+    pos = _skip_ws(s, pos + 1)
+    if s[pos] == '}':
+        _end_of_object(s, pos)
+        return fields
+    while True:
+        if s[pos] != '"':
+            raise ValueError("expected key")
+        key, pos = scanstring(s, pos + 1)
+        pos = _skip_ws(s, pos)
+        if s[pos] != ':':
+            raise ValueError("expected ':'")
+        pos = _skip_ws(s, pos + 1)
+        if (key in _LAZY_KEYS or key in _SKIPPED_KEYS) and s[pos] == '"':
+            end = _string_end(s, pos)
+            if key in _SKIPPED_KEYS:
+                pass
+            elif end - pos >= _LAZY_MIN_LENGTH:
+                fields[key] = _Span(pos, end)
+            else:
+                fields[key] = scanstring(s, pos + 1)[0]
+            pos = end
+        else:
+            fields[key], pos = _decoder.raw_decode(s, pos)
+        pos = _skip_ws(s, pos)
+        if s[pos] == ',':
+            pos = _skip_ws(s, pos + 1)
+        elif s[pos] == '}':
+            _end_of_object(s, pos)
+            return fields
+        else:
+            raise ValueError("expected ',' or '}'")
+
 def buildSocketMessage(jsonStr: str) -> DevinSocketMessage:
-    jsonObj = json.loads(jsonStr)
-    return buildSocketMessageFromDict(jsonObj)
\ No newline at end of file
+    if len(jsonStr) < _LAZY_MIN_LENGTH:
+        # nothing in the frame is worth deferring, the C decoder is fastest
+        return buildSocketMessageFromDict(json.loads(jsonStr))
+    try:
+        fields = _scan_object(jsonStr)
+    except (ValueError, IndexError):
+        # let the regular decoder report malformed frames
+        return buildSocketMessageFromDict(json.loads(jsonStr))
+
+    if 'action' in fields:
+        return buildSocketMessageFromDict(fields)
+
+    content = fields.get('content')
+    span = content if isinstance(content, _Span) else None
+    if span is not None:
+        fields['content'] = None
+    socket_message = buildSocketMessageFromDict(fields)
+    if span is not None and isinstance(socket_message, ObservationMessage):
+        socket_message._raw = jsonStr
+        socket_message._content_span = (span.start, span.end)
+    return socket_message
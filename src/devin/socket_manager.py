@@ -0,0 +1,91 @@
+import asyncio
+from typing import Dict, Optional, Set
+
+from .devin_socket import DevinSocket
+from .devin_auth import TokenStorage
+from .backend_pool import DevinBackendPool
+from .history import MessageHistory
+
+class SocketLimitExceeded(Exception):
+    pass
+
+class _SharedSocket:
+    __slots__ = ("socket", "ref_count")
+
+    def __init__(self, socket: DevinSocket):
+        self.socket = socket
+        self.ref_count = 0
+
+class DevinSocketManager:
+    """
+    Keeps one DevinSocket per user, shared by every conversation handler of that user.
+
+    Handlers `acquire` the socket and register their own callbacks on it, so inbound
+    events fan out to all of them. The socket is closed when the last handler releases
+    it. At most `max_sockets` sockets are open at once.
+    """
+
+    __instance: Optional["DevinSocketManager"] = None
+
+    def __init__(self, max_sockets: int = 1000) -> None:
+        self.max_sockets = max_sockets
+        self.__sockets: Dict[str, _SharedSocket] = {}
+        self.__reconnecting: Set[asyncio.Task] = set()
+        DevinBackendPool.instance().add_listener(self.__on_backend_moved)
+
+    @staticmethod
+    def instance() -> "DevinSocketManager":
+        if DevinSocketManager.__instance is None:
+            DevinSocketManager.__instance = DevinSocketManager()
+        return DevinSocketManager.__instance
+
+    @staticmethod
+    def configure(max_sockets: int):
+        DevinSocketManager.instance().max_sockets = max_sockets
+
+    def acquire(self, user_id) -> DevinSocket:
+        shared = self.__sockets.get(user_id)
+        if shared is None:
+            if len(self.__sockets) >= self.max_sockets:
+                raise SocketLimitExceeded(f"Too many open agent connections ({self.max_sockets}).")
+            shared = _SharedSocket(DevinSocket(user_id))
+            self.__sockets[user_id] = shared
+        shared.ref_count += 1
+        return shared.socket
+
+    async def release(self, user_id):
+        shared = self.__sockets.get(user_id)
+        if shared is None:
+            return
+        shared.ref_count -= 1
+        if shared.ref_count <= 0:
+            del self.__sockets[user_id]
+            await shared.socket.close()
+
+    def __on_backend_moved(self, user_id, old_url: str, new_url: str):
+        # the token, history cursor and agent session belong to the old backend
+        TokenStorage.instance().invalidate(user_id, persisted=True)
+        MessageHistory.instance().forget(user_id)
+        shared = self.__sockets.get(user_id)
+        if shared is not None and shared.socket.backend_url == old_url:
+            task = asyncio.get_running_loop().create_task(shared.socket.reconnect())
+            self.__reconnecting.add(task)
+            task.add_done_callback(self.__reconnecting.discard)
+
+    def stats(self) -> Dict[str, float]:
+        sockets = [shared.socket for shared in self.__sockets.values()]
+        return {
+            "open_sockets": len(sockets),
+            "connected_sockets": sum(1 for socket in sockets if socket.is_connected()),
+            "max_sockets": self.max_sockets,
+            "subscribers": sum(shared.ref_count for shared in self.__sockets.values()),
+            "reconnects": sum(socket.stats.reconnects for socket in sockets),
+            "recovery_seconds": sum(socket.stats.total_recovery_seconds for socket in sockets),
+            "outbox_commands": sum(len(socket.outbox) for socket in sockets),
+            "outbox_dropped": sum(socket.stats.dropped_pending for socket in sockets),
+        }
+
+    async def close(self):
+        sockets = [shared.socket for shared in self.__sockets.values()]
+        self.__sockets.clear()
+        await asyncio.gather(*(socket.close() for socket in sockets), return_exceptions=True)
@@ -0,0 +1,135 @@
+import json, logging, os, queue, secrets, time
+from dataclasses import dataclass
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import Any, Dict, Optional
+
+# spans are timed with the monotonic clock and exported in wall clock time
+_WALL_OFFSET_NS = time.time_ns() - time.perf_counter_ns()
+
+@dataclass
+class TracerOptions:
+    # None disables export; spans are still created but cost only a few objects
+    directory: Optional[str] = "traces"
+    filename: str = "spans.jsonl"
+    max_bytes: int = 10 * 1024 * 1024
+    backups: int = 5
+
+class Span:
+    """
+    One timed stage of a task. Exported as a JSON line when ended, with the field
+    names of OTLP spans, so the files can also be loaded into OpenTelemetry tooling.
+    """
+    __slots__ = ("trace_id", "span_id", "parent_id", "name", "started", "ended", "attributes", "__tracer")
+
+    def __init__(self, tracer: "Tracer", name: str, trace_id: str, parent_id: Optional[str],
+                 started: Optional[int], attributes: Dict[str, Any]):
+        self.__tracer = tracer
+        self.trace_id = trace_id
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.name = name
+        self.started = started if started is not None else time.perf_counter_ns()
+        self.ended: Optional[int] = None
+        self.attributes = attributes
+
+    def child(self, name: str, started: Optional[int] = None, **attributes) -> "Span":
+        return Span(self.__tracer, name, self.trace_id, self.span_id, started, attributes)
+
+    def end(self, **attributes):
+        if self.ended is not None:
+            return
+        self.ended = time.perf_counter_ns()
+        self.attributes.update(attributes)
+        self.__tracer.export(self)
+
+    @property
+    def duration(self) -> Optional[float]:
+        if self.ended is None:
+            return None
+        return (self.ended - self.started) / 1e9
+
+    def to_dict(self) -> Dict[str, Any]:
+        assert self.ended is not None
+        return {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "parentSpanId": self.parent_id,
+            "name": self.name,
+            "startTimeUnixNano": self.started + _WALL_OFFSET_NS,
+            "endTimeUnixNano": self.ended + _WALL_OFFSET_NS,
+            "attributes": self.attributes,
+        }
+
+class Tracer:
+    """
+    Creates task traces and appends finished spans to a rotating JSONL file. Spans are
+    handed to a QueueListener thread, so the event loop never waits on the file.
+    """
+
+    __instance: Optional["Tracer"] = None
+    options = TracerOptions()
+
+    def __init__(self, options: Optional[TracerOptions] = None) -> None:
+        self.options = options or Tracer.options
+        self.__handler: Optional[QueueHandler] = None
+        self.__listener: Optional[QueueListener] = None
+        self.exported = 0
+
+    @staticmethod
+    def instance() -> "Tracer":
+        if Tracer.__instance is None:
+            Tracer.__instance = Tracer()
+        return Tracer.__instance
+
+    @staticmethod
+    def configure(options: TracerOptions):
+        if Tracer.__instance is not None:
+            Tracer.__instance.close()
+        Tracer.options = options
+        Tracer.__instance = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.options.directory is not None
+
+    def start_trace(self, name: str, started: Optional[int] = None, **attributes) -> Span:
+        """Start the root span of a new trace; `started` is a perf_counter_ns() value."""
+        return Span(self, name, secrets.token_hex(16), None, started, attributes)
+
+    def export(self, span: Span):
+        if not self.enabled:
+            return
+        handler = self.__handler
+        if handler is None:
+            try:
+                handler = self.__open()
+            except OSError as e:
+                print(f"Could not export span {span.name}: {e}")
+                return
+        # write errors are reported by the file handler on the listener thread
+        handler.emit(logging.makeLogRecord({"msg": json.dumps(span.to_dict(), separators=(",", ":"), default=str)}))
+        self.exported += 1
+
+    def close(self):
+        """Stop the listener once the queued spans are written."""
+        if self.__listener is not None:
+            self.__listener.stop()
+            for handler in self.__listener.handlers:
+                handler.close()
+            self.__listener = None
+            self.__handler = None
+
+    def __open(self) -> QueueHandler:
+        assert self.options.directory is not None
+        os.makedirs(self.options.directory, exist_ok=True)
+        file_handler = RotatingFileHandler(
+            os.path.join(self.options.directory, self.options.filename),
+            maxBytes=self.options.max_bytes,
+            backupCount=self.options.backups,
+            encoding="utf-8",
+        )
+        records: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+        self.__listener = QueueListener(records, file_handler)
+        self.__listener.start()
+        self.__handler = QueueHandler(records)
+        return self.__handler
@@ -0,0 +1,152 @@
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+WARM = "warm"
+WARMING = "warming"
+
+@dataclass
+class WarmPoolOptions:
+    enabled: bool = False
+    # most agents kept initialised and idle at once
+    max_warm: int = 10
+    # users who started a task this recently are kept warm, most recent first
+    demand_window: float = 15 * 60
+    # an idle agent older than this is assumed to have been reclaimed by the backend
+    warm_ttl: float = 10 * 60
+
+class _Average:
+    __slots__ = ("count", "total")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+
+    def add(self, value: float):
+        self.count += 1
+        self.total += value
+
+    @property
+    def value(self) -> float:
+        return self.total / self.count if self.count else float("nan")
+
+class WarmAgentPool:
+    """
+    Keeps the agents of recently active users initialised and idle, so their next task
+    starts with a single start message instead of waiting for the agent to initialise.
+
+    An agent is re-initialised right after a task ends, for users among the
+    `target_size()` most recently active ones; the target follows how many users
+    started a task within `demand_window`. Agent sessions are per user, so the pool is
+    keyed by user and shared by all of a user's conversations.
+    """
+
+    __instance: Optional["WarmAgentPool"] = None
+    options = WarmPoolOptions()
+
+    def __init__(self, options: Optional[WarmPoolOptions] = None) -> None:
+        self.options = options or WarmAgentPool.options
+        # user -> time of their last task, oldest first
+        self.__demand: "OrderedDict[str, float]" = OrderedDict()
+        # user -> (WARM or WARMING, since)
+        self.__agents: Dict[str, Tuple[str, float]] = {}
+        self.hits = 0
+        self.misses = 0
+        self.__cold_start = _Average()
+        self.__first_card_cold = _Average()
+        self.__first_card_warm = _Average()
+
+    @staticmethod
+    def instance() -> "WarmAgentPool":
+        if WarmAgentPool.__instance is None:
+            WarmAgentPool.__instance = WarmAgentPool()
+        return WarmAgentPool.__instance
+
+    @staticmethod
+    def configure(options: WarmPoolOptions):
+        WarmAgentPool.options = options
+        WarmAgentPool.__instance = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.options.enabled
+
+    def record_task(self, user_id):
+        key = str(user_id)
+        self.__demand[key] = time.monotonic()
+        self.__demand.move_to_end(key)
+        self.__expire_demand()
+
+    def target_size(self) -> int:
+        self.__expire_demand()
+        return min(self.options.max_warm, len(self.__demand))
+
+    def should_warm(self, user_id) -> bool:
+        key = str(user_id)
+        if not self.enabled or key in self.__agents or key not in self.__demand:
+            return False
+        size = self.target_size()
+        return size > 0 and key in list(self.__demand)[-size:]
+
+    def mark_warming(self, user_id):
+        self.__agents[str(user_id)] = (WARMING, time.monotonic())
+
+    def mark_warm(self, user_id):
+        key = str(user_id)
+        entry = self.__agents.get(key)
+        if entry is not None and entry[0] == WARMING:
+            self.__agents[key] = (WARM, time.monotonic())
+
+    def is_warming(self, user_id) -> bool:
+        entry = self.__agents.get(str(user_id))
+        return entry is not None and entry[0] == WARMING
+
+    def claim(self, user_id) -> Optional[str]:
+        """Take the user's agent for a new task; returns WARM, WARMING or None."""
+        if not self.enabled:
+            return None
+        entry = self.__agents.pop(str(user_id), None)
+        status = entry[0] if entry is not None else None
+        if status == WARM and time.monotonic() - entry[1] > self.options.warm_ttl: # type: ignore
+            status = None
+        if status == WARM:
+            self.hits += 1
+        else:
+            self.misses += 1
+        return status
+
+    def forget(self, user_id):
+        self.__agents.pop(str(user_id), None)
+
+    def observe_cold_start(self, seconds: float):
+        """Time from initialize_agent to the agent reporting INIT."""
+        self.__cold_start.add(seconds)
+
+    def observe_first_card(self, seconds: float, warm: bool):
+        """Time from the user's message to the first card of the task."""
+        (self.__first_card_warm if warm else self.__first_card_cold).add(seconds)
+
+    def stats(self) -> Dict[str, float]:
+        claims = self.hits + self.misses
+        return {
+            "warm": sum(1 for status, _ in self.__agents.values() if status == WARM),
+            "warming": sum(1 for status, _ in self.__agents.values() if status == WARMING),
+            "target": self.target_size(),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / claims if claims else float("nan"),
+            "cold_start_seconds": self.__cold_start.value,
+            "first_card_cold_seconds": self.__first_card_cold.value,
+            "first_card_warm_seconds": self.__first_card_warm.value,
+            "first_card_saved_seconds": self.__first_card_cold.value - self.__first_card_warm.value,
+        }
+
+    def __expire_demand(self):
+        horizon = time.monotonic() - self.options.demand_window
+        while self.__demand:
+            key, at = next(iter(self.__demand.items()))
+            if at >= horizon:
+                break
+            del self.__demand[key]
+            self.__agents.pop(key, None)
@@ -0,0 +1,205 @@
+"""
+Copyright (c) Microsoft Corporation. All rights reserved.
+Licensed under the MIT License.
+
+Description: run several bot workers behind a router that sends every
+conversation to a stable owner worker
+
+    python launcher.py --workers 4
+    python launcher.py --workers 2 --node http://localhost:4100
+
+Each conversation id is mapped to a worker by consistent hashing, so adding or
+removing a worker only moves a small share of conversations. Workers keep
+conversation state in CONVERSATION_STATE_DB, so when a worker is down the next
+worker on the ring takes its conversations over, and a restarted worker resumes
+its running conversations.
+
+All workers must run on this host: the state database is a SQLite file in WAL
+mode, which cannot be shared over a network filesystem. --node adds workers
+started separately on this host, e.g. under another service manager.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+from typing import Dict, List, Optional
+from urllib.parse import urlparse
+
+import aiohttp
+from aiohttp import web
+
+from config import Config, load_environment
+from devin.hash_ring import HashRing
+
+# workers share a local SQLite state database, so they must all run on this host
+LOCAL_HOSTS = {"localhost", "127.0.0.1", "::1"}
+
+# request headers that belong to the hop to the router, not to the worker
+HOP_HEADERS = {"host", "content-length", "connection", "keep-alive", "transfer-encoding"}
+
+
+class Worker:
+    def __init__(self, url: str, port: int, nodes: List[str]):
+        self.url = url
+        self.port = port
+        self.nodes = nodes
+        self.process: Optional[subprocess.Popen] = None
+
+    def start(self):
+        env = {
+            **os.environ,
+            "PORT": str(self.port),
+            "WORKER_ID": self.url,
+            "WORKER_NODES": ",".join(self.nodes),
+            # takeover needs state every worker can read
+            "CONVERSATION_STATE_BACKEND": os.environ.get("CONVERSATION_STATE_BACKEND", "sqlite"),
+        }
+        self.process = subprocess.Popen([sys.executable, "app.py"], env=env, cwd=os.path.dirname(os.path.abspath(__file__)))
+        print(f"Started worker {self.url} (pid {self.process.pid})")
+
+    def stop(self):
+        if self.process is not None and self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+
+
+class Router:
+    def __init__(self, nodes: List[str], probe_interval: float = 5, timeout: float = 30):
+        self.nodes = nodes
+        self.probe_interval = probe_interval
+        self.timeout = timeout
+        # conversations of a node that is down fall through to the next node on the ring
+        self.ring = HashRing(nodes)
+        self.__down: Dict[str, float] = {}
+        self.__session: Optional[aiohttp.ClientSession] = None
+        self.__prober: Optional[asyncio.Task] = None
+
+    def session(self) -> aiohttp.ClientSession:
+        if self.__session is None:
+            self.__session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=self.timeout))
+        return self.__session
+
+    def mark_down(self, node: str):
+        if node not in self.__down:
+            print(f"Worker {node} is not reachable, routing its conversations elsewhere")
+        self.__down[node] = time.monotonic()
+        self.ring.remove(node)
+
+    def mark_up(self, node: str):
+        if self.__down.pop(node, None) is not None:
+            print(f"Worker {node} is back")
+        self.ring.add(node)
+
+    async def forward(self, req: web.Request, key: str) -> web.Response:
+        body = await req.read()
+        headers = {name: value for name, value in req.headers.items() if name.lower() not in HOP_HEADERS}
+        for _ in range(len(self.nodes)):
+            node = self.ring.get(key)
+            if node is None:
+                break
+            try:
+                async with self.session().request(req.method, f"{node}{req.path_qs}", data=body, headers=headers) as response:
+                    return web.Response(
+                        status=response.status,
+                        body=await response.read(),
+                        headers={name: value for name, value in response.headers.items() if name.lower() not in HOP_HEADERS},
+                    )
+            except aiohttp.ClientConnectionError:
+                self.mark_down(node)
+        raise web.HTTPServiceUnavailable(text="No worker available.")
+
+    async def on_messages(self, req: web.Request) -> web.Response:
+        try:
+            activity = json.loads(await req.read())
+            conversation_id = activity["conversation"]["id"]
+        except (ValueError, KeyError, TypeError):
+            raise web.HTTPBadRequest()
+        return await self.forward(req, conversation_id)
+
+    async def on_other(self, req: web.Request) -> web.Response:
+        return await self.forward(req, req.path)
+
+    async def __probe_forever(self):
+        while True:
+            await asyncio.sleep(self.probe_interval)
+            for node in list(self.__down):
+                try:
+                    async with self.session().get(f"{node}/metrics") as response:
+                        if response.status == 200:
+                            self.mark_up(node)
+                except (aiohttp.ClientError, asyncio.TimeoutError):
+                    pass
+
+    async def on_startup(self, _app: web.Application):
+        self.__prober = asyncio.create_task(self.__probe_forever())
+
+    async def on_cleanup(self, _app: web.Application):
+        if self.__prober is not None:
+            self.__prober.cancel()
+        if self.__session is not None:
+            await self.__session.close()
+
+    def create_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post("/api/messages", self.on_messages)
+        app.router.add_get("/artifacts/{digest}", self.on_other)
+        app.on_startup.append(self.on_startup)
+        app.on_cleanup.append(self.on_cleanup)
+        return app
+
+
+async def supervise(workers: List[Worker], restart_delay: float):
+    # restart workers that exit; their running conversations resume on start
+    while True:
+        await asyncio.sleep(restart_delay)
+        for worker in workers:
+            if worker.process is not None and worker.process.poll() is not None:
+                print(f"Worker {worker.url} exited with {worker.process.returncode}, restarting")
+                worker.start()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="local worker processes")
+    parser.add_argument("--worker-base-port", type=int, default=4000)
+    parser.add_argument("--node", action="append", default=[], help="url of a worker started separately on this host")
+    parser.add_argument("--restart-delay", type=float, default=1)
+    args = parser.parse_args()
+    for node in args.node:
+        if urlparse(node).hostname not in LOCAL_HOSTS:
+            parser.error(f"--node {node} is not on this host; workers share a local state database")
+    # workers inherit the environment, including .env
+    load_environment()
+
+    local = [(f"http://localhost:{args.worker_base_port + i}", args.worker_base_port + i) for i in range(args.workers)]
+    nodes = [url for url, _ in local] + args.node
+    workers = [Worker(url, port, nodes) for url, port in local]
+    for worker in workers:
+        worker.start()
+
+    router = Router(nodes)
+    app = router.create_app()
+
+    async def start_supervisor(_app: web.Application):
+        _app[supervisor] = asyncio.create_task(supervise(workers, args.restart_delay))
+
+    async def stop_workers(_app: web.Application):
+        _app[supervisor].cancel()
+        for worker in workers:
+            worker.stop()
+
+    supervisor = web.AppKey("supervisor", asyncio.Task)
+    app.on_startup.append(start_supervisor)
+    app.on_cleanup.append(stop_workers)
+    web.run_app(app, host="localhost", port=Config.PORT)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Copyright (c) Microsoft Corporation. All rights reserved.
+Licensed under the MIT License.
+
+Description: summarise the task traces written to TRACE_DIR
+
+    python trace_report.py
+    python trace_report.py traces --since 60 --json
+
+Every task is one trace: a `task` span from the Teams message to the end of
+the run, with a child span per stage (connect, queue, initialize, start, run)
+and per outbound card. The report shows p50/p95 per stage, so a slow start can
+be pinned on the stage that caused it.
+"""
+
+import argparse
+import glob
+import json
+import os
+import time
+from collections import Counter, defaultdict
+from typing import Any, Dict, Iterator, List
+
+# stages in the order a task goes through them; other spans are listed after these
+STAGES = ["task", "connect", "queue", "initialize", "start", "run"]
+
+
+def read_spans(directory: str) -> Iterator[Dict[str, Any]]:
+    # current files and their rotated backups (spans.jsonl.1, ...)
+    for filename in sorted(glob.glob(os.path.join(directory, "*.jsonl*"))):
+        with open(filename, encoding="utf-8") as file:
+            for line in file:
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    # a line cut short by a crash mid-write
+                    continue
+
+
+def span_key(span: Dict[str, Any]) -> str:
+    icon = span.get("attributes", {}).get("icon")
+    return f"{span['name']}[{icon}]" if icon else span["name"]
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def summarise(spans: Iterator[Dict[str, Any]], since: float = 0) -> Dict[str, Any]:
+    durations: Dict[str, List[float]] = defaultdict(list)
+    outcomes: Dict[str, Counter] = defaultdict(Counter)
+    for span in spans:
+        if span["endTimeUnixNano"] / 1e9 < since:
+            continue
+        key = span_key(span)
+        durations[key].append((span["endTimeUnixNano"] - span["startTimeUnixNano"]) / 1e6)
+        outcome = span.get("attributes", {}).get("outcome")
+        if outcome is not None:
+            outcomes[key][outcome] += 1
+    order = sorted(durations, key=lambda key: (STAGES.index(key) if key in STAGES else len(STAGES), key))
+    return {
+        key: {
+            "count": len(durations[key]),
+            "p50_ms": percentile(durations[key], 0.5),
+            "p95_ms": percentile(durations[key], 0.95),
+            "max_ms": max(durations[key]),
+            "outcomes": dict(outcomes[key]),
+        }
+        for key in order
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("directory", nargs="?", default=os.environ.get("TRACE_DIR") or "traces")
+    parser.add_argument("--since", type=float, default=0, help="only spans that ended in the last N minutes")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args()
+
+    since = time.time() - args.since * 60 if args.since > 0 else 0
+    report = summarise(read_spans(args.directory), since)
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+    if not report:
+        print(f"No spans in {args.directory}")
+        return
+    print(f"{'span':<28}{'count':>8}{'p50_ms':>12}{'p95_ms':>12}{'max_ms':>12}  outcomes")
+    for key, stats in report.items():
+        outcomes = ", ".join(f"{outcome}={count}" for outcome, count in stats["outcomes"].items())
+        print(f"{key:<28}{stats['count']:>8}{stats['p50_ms']:>12.1f}{stats['p95_ms']:>12.1f}{stats['max_ms']:>12.1f}  {outcomes}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,8 @@
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def workdir(tmp_path, monkeypatch):
+    # each test gets fresh token, outbox and state files
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
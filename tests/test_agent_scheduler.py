@@ -0,0 +1,69 @@
+import asyncio
+
+from devin.agent_scheduler import AgentScheduler, AgentSchedulerOptions
+from devin.backend_pool import DevinBackendPool
+
+
+def scheduler(max_running: int, max_running_per_backend: int = 10) -> AgentScheduler:
+    DevinBackendPool.configure(["http://backend"])
+    return AgentScheduler(AgentSchedulerOptions(max_running=max_running, max_running_per_backend=max_running_per_backend))
+
+
+async def test_grants_up_to_max_running():
+    agents = scheduler(max_running=2)
+    tickets = [agents.request(f"user-{i}") for i in range(3)]
+    assert [ticket.granted for ticket in tickets] == [True, True, False]
+    assert agents.stats()["queued"] == 1
+
+    agents.release(tickets[0])
+    assert tickets[2].granted
+    assert await asyncio.wait_for(tickets[2].future, 1) is tickets[2]
+    assert agents.stats()["completed"] == 1
+
+
+async def test_caps_runs_per_backend():
+    agents = scheduler(max_running=5, max_running_per_backend=1)
+    first, second = agents.request("a"), agents.request("b")
+    assert first.granted and first.backend_url == "http://backend"
+    assert not second.granted
+
+
+async def test_users_take_turns_for_free_slots():
+    agents = scheduler(max_running=1)
+    running = agents.request("busy")
+    queued = [agents.request("busy"), agents.request("busy")]
+    other = agents.request("other")
+
+    agents.release(running)
+    assert queued[0].granted and not other.granted
+    agents.release(queued[0])
+    # the user who queued many tasks waits for the others' turn
+    assert other.granted and not queued[1].granted
+
+
+async def test_waiting_ticket_is_told_its_position():
+    agents = scheduler(max_running=1)
+    agents.request("a")
+    updates = []
+    agents.request("b", on_update=lambda position, eta: updates.append((position, eta)))
+    assert updates == [(1, agents.options.expected_run_seconds)]
+
+
+async def test_release_of_waiting_ticket_cancels_it():
+    agents = scheduler(max_running=1)
+    agents.request("a")
+    waiting = agents.request("b")
+    assert agents.is_waiting("b")
+
+    agents.release(waiting)
+    assert not agents.is_waiting("b")
+    assert waiting.future.cancelled()
+    assert agents.stats()["running"] == 1
+
+
+async def test_adopt_counts_a_running_agent_once():
+    agents = scheduler(max_running=2)
+    ticket = agents.adopt("a")
+    assert ticket.granted and ticket.saw_running
+    assert agents.adopt("a") is ticket
+    assert agents.stats()["running"] == 1
@@ -0,0 +1,38 @@
+from devin.event_dedupe import EventDeduper
+
+
+def test_key_prefers_the_event_id():
+    assert EventDeduper.key(7, "2024-01-01T00:00:00", "{}") == "id:7"
+
+
+def test_key_without_id_uses_timestamp_and_frame():
+    key = EventDeduper.key(None, "2024-01-01T00:00:00", '{"action": "run"}')
+    assert key == EventDeduper.key(None, "2024-01-01T00:00:00", '{"action": "run"}')
+    assert key != EventDeduper.key(None, "2024-01-01T00:00:01", '{"action": "run"}')
+    assert key != EventDeduper.key(None, "2024-01-01T00:00:00", '{"action": "read"}')
+
+
+def test_events_without_id_or_timestamp_are_not_keyed():
+    assert EventDeduper.key(None, None, '{"action": "think"}') is None
+
+
+def test_seen_counts_duplicates():
+    deduper = EventDeduper()
+    assert not deduper.seen("id:1")
+    assert deduper.seen("id:1")
+    assert deduper.duplicates == 1
+
+
+def test_oldest_keys_are_forgotten_past_capacity():
+    deduper = EventDeduper(capacity=2)
+    for key in ("id:1", "id:2", "id:3"):
+        deduper.seen(key)
+    assert deduper.snapshot() == ["id:2", "id:3"]
+    assert not deduper.seen("id:1")
+
+
+def test_snapshot_restores_the_window():
+    deduper = EventDeduper(seen=["id:1", "id:2"])
+    assert deduper.seen("id:2")
+    deduper.clear()
+    assert deduper.snapshot() == []
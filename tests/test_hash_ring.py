@@ -0,0 +1,39 @@
+from devin.hash_ring import HashRing
+
+KEYS = [f"user-{i}" for i in range(500)]
+
+
+def test_empty_ring_has_no_owner():
+    ring = HashRing()
+    assert ring.get("user") is None
+    assert list(ring.preference("user")) == []
+
+
+def test_keys_spread_over_all_nodes():
+    ring = HashRing(["a", "b", "c"])
+    owners = {ring.get(key) for key in KEYS}
+    assert owners == {"a", "b", "c"}
+
+
+def test_removing_a_node_moves_only_its_keys():
+    ring = HashRing(["a", "b", "c"])
+    before = {key: ring.get(key) for key in KEYS}
+    ring.remove("c")
+    for key, owner in before.items():
+        if owner != "c":
+            assert ring.get(key) == owner
+
+
+def test_preference_starts_at_the_owner_and_lists_each_node_once():
+    ring = HashRing(["a", "b", "c"])
+    for key in KEYS[:50]:
+        order = list(ring.preference(key))
+        assert order[0] == ring.get(key)
+        assert sorted(order) == ["a", "b", "c"]
+
+
+def test_adding_a_node_twice_is_ignored():
+    ring = HashRing(["a"])
+    ring.add("a")
+    assert ring.nodes == ["a"]
+    assert len(ring) == 1
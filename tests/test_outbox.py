@@ -0,0 +1,75 @@
+import os
+
+from devin.outbox import Outbox, OutboxOptions
+
+
+def test_commands_are_replayed_in_order_until_acked(workdir):
+    outbox = Outbox(str(workdir / "user.log"))
+    first, second = outbox.put("one"), outbox.put("two")
+    assert outbox.peek() == (first, "one")
+    outbox.ack(first)
+    assert outbox.peek() == (second, "two")
+    outbox.ack(second)
+    assert outbox.peek() is None
+    assert len(outbox) == 0
+
+
+def test_waiting_commands_survive_a_restart(workdir):
+    path = str(workdir / "user.log")
+    outbox = Outbox(path)
+    outbox.ack(outbox.put("sent"))
+    outbox.put("waiting")
+    outbox.close()
+
+    restored = Outbox(path)
+    assert len(restored) == 1
+    seq, command = restored.peek()
+    assert command == "waiting"
+    # sequence numbers continue after the ones in the log
+    assert restored.put("next") > seq
+
+
+def test_unpersisted_commands_stay_in_memory(workdir):
+    path = str(workdir / "user.log")
+    outbox = Outbox(path)
+    outbox.put("start", persist=False)
+    outbox.put("message")
+    assert len(outbox) == 2
+    outbox.close()
+
+    restored = Outbox(path)
+    assert [restored.peek()[1]] == ["message"]
+    assert len(restored) == 1
+
+
+def test_log_is_removed_once_nothing_waits(workdir):
+    path = str(workdir / "user.log")
+    outbox = Outbox(path)
+    outbox.ack(outbox.put("one"))
+    assert not os.path.exists(path)
+
+
+def test_oldest_command_is_dropped_when_full(workdir):
+    outbox = Outbox(str(workdir / "user.log"), OutboxOptions(max_entries=2))
+    for command in ("one", "two", "three"):
+        outbox.put(command)
+    assert outbox.dropped == 1
+    assert outbox.peek()[1] == "two"
+
+
+def test_stale_commands_are_skipped(workdir):
+    outbox = Outbox(str(workdir / "user.log"), OutboxOptions(max_age=-1))
+    outbox.put("stale")
+    assert outbox.peek() is None
+    assert outbox.dropped == 1
+
+
+def test_log_is_compacted_to_waiting_commands(workdir):
+    path = str(workdir / "user.log")
+    outbox = Outbox(path, OutboxOptions(max_bytes=1024))
+    outbox.put("waiting")
+    for i in range(100):
+        outbox.ack(outbox.put(f"command {i}"))
+    assert os.path.getsize(path) <= 1024
+    outbox.close()
+    assert Outbox(path).peek()[1] == "waiting"
@@ -0,0 +1,76 @@
+import asyncio
+
+from devin.progress_coalescer import ProgressCoalescer
+
+
+class Cards:
+    """Records the cards a coalescer sends and edits; rendered cards are the entry messages."""
+
+    def __init__(self):
+        self.sent = []
+        self.updated = []
+        self.release = asyncio.Event()
+        self.release.set()
+
+    async def send(self, card):
+        await self.release.wait()
+        self.sent.append(card)
+        return f"activity-{len(self.sent)}"
+
+    async def update(self, activity_id, card):
+        self.updated.append((activity_id, card))
+
+    @staticmethod
+    def render(entries, hidden):
+        return [message for message, _ in entries]
+
+    def coalescer(self) -> ProgressCoalescer:
+        return ProgressCoalescer(self.send, self.update, self.render, debounce=60)
+
+
+async def test_flushes_edit_the_live_card():
+    cards = Cards()
+    progress = cards.coalescer()
+    progress.add("one", "")
+    await progress.flush()
+    progress.add("two", "")
+    await progress.flush()
+    assert cards.sent == [["one"]]
+    assert cards.updated == [("activity-1", ["one", "two"])]
+    progress.cancel()
+
+
+async def test_reset_starts_a_new_card():
+    cards = Cards()
+    progress = cards.coalescer()
+    progress.add("one", "")
+    await progress.reset()
+    progress.add("two", "")
+    await progress.flush()
+    assert cards.sent == [["one"], ["two"]]
+    assert cards.updated == []
+    progress.cancel()
+
+
+async def test_reset_keeps_entries_added_while_the_card_is_sent():
+    cards = Cards()
+    progress = cards.coalescer()
+    progress.add("one", "")
+    cards.release.clear()
+    reset = asyncio.create_task(progress.reset())
+    await asyncio.sleep(0)
+    progress.add("late", "")
+    cards.release.set()
+    await reset
+
+    await progress.flush()
+    assert cards.sent == [["one"], ["late"]]
+    progress.cancel()
+
+
+async def test_reset_without_pending_entries_sends_nothing():
+    cards = Cards()
+    progress = cards.coalescer()
+    await progress.reset()
+    await progress.flush()
+    assert cards.sent == []
@@ -0,0 +1,53 @@
+import json
+
+import pytest
+
+from devin.response_type import ActionMessage, ObservationMessage, buildSocketMessage
+
+
+def observation(content: str, **fields) -> str:
+    return json.dumps({"id": 3, "observation": "run", "content": content, "extras": {"exit_code": 0},
+                       "message": "Command ran", "timestamp": "2024-01-01T00:00:00", **fields})
+
+
+def test_small_frames_are_decoded_eagerly():
+    message = buildSocketMessage(json.dumps({"id": 1, "action": "run", "args": {"command": "ls"}, "timestamp": "t"}))
+    assert isinstance(message, ActionMessage)
+    assert (message.id, message.action, message.args, message.timestamp) == (1, "run", {"command": "ls"}, "t")
+
+
+def test_large_content_is_decoded_on_first_read():
+    content = "line\n" * 200
+    message = buildSocketMessage(observation(content))
+    assert isinstance(message, ObservationMessage)
+    assert message._content_span is not None
+    assert (message.id, message.extras, message.message) == (3, {"exit_code": 0}, "Command ran")
+    assert message.content == content
+    assert message._raw is None
+
+
+def test_content_with_many_escaped_quotes():
+    content = 'say "hi" ' * 100 + "\\"
+    assert buildSocketMessage(observation(content)).content == content
+
+
+def test_screenshots_are_not_kept():
+    message = buildSocketMessage(observation("page", screenshot="data:image/png;base64," + "A" * 1000))
+    assert message.content == "page"
+    assert not hasattr(message, "screenshot")
+
+
+def test_large_action_frames_match_the_regular_decoder():
+    frame = json.dumps({"id": 2, "action": "write", "args": {"path": "a.py", "content": "x = 1\n" * 100}})
+    message = buildSocketMessage(frame)
+    assert isinstance(message, ActionMessage)
+    assert message.args == json.loads(frame)["args"]
+
+
+@pytest.mark.parametrize("frame", [
+    observation("x" * 300)[:-1],
+    observation("x" * 300) + " {}",
+])
+def test_malformed_frames_raise(frame):
+    with pytest.raises(ValueError):
+        buildSocketMessage(frame)
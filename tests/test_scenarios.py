@@ -0,0 +1,108 @@
+"""
+End-to-end checks of recovery paths against in-process stand-in backends. Each test
+drives the bot's own socket and handler code.
+"""
+
+import argparse
+import asyncio
+import time
+from typing import Callable
+
+import aiohttp
+import jwt
+from aiohttp import web
+
+from benchmarks import load_test
+from benchmarks.corpus import build_events
+from benchmarks.stand_in_backend import StandInBackend
+from devin.backend_pool import DevinBackendPool, DevinBackendPoolOptions
+from devin.devin_api import DevinAPI
+from devin.devin_auth import SqlitePersistentTokenStorage, TokenStorage
+from devin.devin_socket import DevinSocket
+
+
+async def serve(backend: StandInBackend, port: int) -> web.AppRunner:
+    runner = web.AppRunner(backend.create_app())
+    await runner.setup()
+    await web.TCPSite(runner, "localhost", port).start()
+    return runner
+
+
+async def wait_until(condition: Callable[[], bool], timeout: float, what: str):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError(f"timed out waiting until {what}")
+        await asyncio.sleep(0.01)
+
+
+async def test_rejected_token_is_replaced(monkeypatch, unused_tcp_port):
+    """A stored token the backend rejects is replaced through /api/auth, not retried forever."""
+    # signed with another key, e.g. before the backend rotated its secret; still looks valid locally
+    stale = jwt.encode({"sid": "stale"}, "a-key-the-backend-does-not-know-0123456789", algorithm="HS256")
+    storage = SqlitePersistentTokenStorage("tokens.db")
+    storage.save_token("user", stale)
+    monkeypatch.setattr(TokenStorage, "_TokenStorage__instance", TokenStorage(storage))
+
+    backend = StandInBackend()
+    runner = await serve(backend, unused_tcp_port)
+    DevinBackendPool.configure([f"http://localhost:{unused_tcp_port}"])
+    socket = DevinSocket("user")
+    try:
+        await asyncio.wait_for(socket.initialize(), timeout=10)
+        assert socket.is_connected(), "socket did not connect"
+        assert socket.stats.failed_attempts == 1
+        assert backend.auth_calls == 1
+    finally:
+        await socket.close()
+        await DevinAPI.close()
+        await runner.cleanup()
+        storage.close()
+
+
+async def test_users_follow_backend_health(unused_tcp_port_factory):
+    """Users of a dead backend move to a live one, stay put while none is alive, and return once one recovers."""
+    ports = [unused_tcp_port_factory(), unused_tcp_port_factory()]
+    urls = [f"http://localhost:{port}" for port in ports]
+    runners = [await serve(StandInBackend(), port) for port in ports]
+    pool = DevinBackendPool(urls, DevinBackendPoolOptions(probe_interval=0.02, probe_timeout=1, failure_threshold=2))
+    users = [f"user-{i}" for i in range(20)]
+    async with aiohttp.ClientSession() as session:
+        pool.start(lambda: session)
+        try:
+            placed = {user: pool.backend_for(user) for user in users}
+            assert set(placed.values()) == set(urls), f"users were not spread: {placed}"
+
+            await runners[0].cleanup()
+            await wait_until(lambda: not pool.stats()[urls[0]]["healthy"], 5, "the first backend is drained")
+            assert all(pool.backend_for(user) == urls[1] for user in users), "users stayed on the dead backend"
+            moves = pool.moves
+
+            await runners[1].cleanup()
+            await wait_until(lambda: not pool.stats()[urls[1]]["healthy"], 5, "the second backend is drained")
+            assert all(pool.backend_for(user) == urls[1] for user in users), "users moved while no backend was alive"
+            assert pool.moves == moves, f"{pool.moves - moves} moves between dead backends"
+
+            runners[0] = await serve(StandInBackend(), ports[0])
+            await wait_until(lambda: bool(pool.stats()[urls[0]]["healthy"]), 5, "the first backend recovers")
+            assert all(pool.backend_for(user) == urls[0] for user in users), "users did not move to the recovered backend"
+        finally:
+            await pool.close()
+            for runner in runners:
+                await runner.cleanup()
+
+
+async def test_queued_tasks_start_warm(unused_tcp_port):
+    """With warm agents and fewer slots than users, every task still finishes and queued tasks start warm."""
+    backend = StandInBackend(replay=build_events(40), rate=100, mark=True, init_delay=0.5)
+    runner = await serve(backend, unused_tcp_port)
+    args = argparse.Namespace(
+        port=unused_tcp_port, users=2, conversations=1, tasks=3, think_time=0.3, warm=True,
+        max_running_agents=1, progress_debounce=3.0, trace_dir=None, timeout=60,
+    )
+    try:
+        report = await load_test.run(args)
+    finally:
+        await runner.cleanup()
+    assert report["timed_out"] == 0, f"{report['timed_out']} conversations timed out"
+    assert report["warm_hit_pct"] > 0, "no task started on a warm agent"